@@ -0,0 +1,87 @@
+# api/chunking.py - Découpage des documents longs en chunks bornés en tokens
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Champs du parent recopiés sur chaque chunk (filtres, facettes)
+INHERITED_FIELDS = ("muscle_groups", "difficulty", "equipment", "category", "importance")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def chunk_text(text: str, count_tokens: Callable[[str], int], max_tokens: int = 128,
+               overlap_words: int = 8) -> List[str]:
+    """Regroupe des phrases entières jusqu'à max_tokens ; une phrase trop longue est coupée par mots"""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def _flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(" ".join(current))
+        current, current_tokens = [], 0
+
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            _flush()
+            words = sentence.split()
+            window: List[str] = []
+            for word in words:
+                window.append(word)
+                if count_tokens(" ".join(window)) <= max_tokens:
+                    continue
+                window.pop()
+                # Fenêtre vide : le mot seul dépasse max_tokens, il formera son propre chunk
+                if window:
+                    chunks.append(" ".join(window))
+                # Recouvrement réduit jusqu'à ce que la nouvelle fenêtre tienne dans max_tokens
+                overlap = window[-overlap_words:] if overlap_words else []
+                while overlap and count_tokens(" ".join(overlap + [word])) > max_tokens:
+                    overlap = overlap[1:]
+                window = overlap + [word]
+            if window:
+                current, current_tokens = window, count_tokens(" ".join(window))
+            continue
+
+        # +1 : espace de jonction entre phrases
+        if current and current_tokens + tokens + 1 > max_tokens:
+            _flush()
+        current.append(sentence)
+        current_tokens += tokens + (1 if current_tokens else 0)
+
+    _flush()
+    return chunks
+
+
+def chunk_document(document: Dict[str, Any], count_tokens: Callable[[str], int],
+                   max_tokens: int = 128, tokenizer: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Chunks d'un document validé, avec référence au parent et longueur en tokens
+
+    Un document qui tient dans un chunk garde son identifiant. `tokenizer` identifie
+    le tokenizer de count_tokens (voir context_packing.tokenizer_id).
+    """
+    parts = chunk_text(document["content"], count_tokens, max_tokens) or [document["content"]]
+    single = len(parts) == 1
+    chunks = []
+    for index, content in enumerate(parts):
+        chunk = {
+            "id": document["id"] if single else f"{document['id']}#{index}",
+            "title": document["title"],
+            "content": content,
+        }
+        for field in INHERITED_FIELDS:
+            if field in document:
+                chunk[field] = document[field]
+        chunk["parent_id"] = document["id"]
+        chunk["chunk_index"] = index
+        chunk["token_length"] = count_tokens(content)
+        if tokenizer:
+            chunk["tokenizer"] = tokenizer
+        chunks.append(chunk)
+    return chunks
@@ -0,0 +1,66 @@
+# api/coalescing.py - Regroupement (single-flight) des requêtes identiques en cours
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def request_key(question: str, model: str, profile: Optional[Dict] = None, session_id: Optional[str] = None) -> str:
+    """Clé d'identité d'une requête : question normalisée + modèle + profil (+ session)"""
+    normalized = ' '.join(question.lower().split())
+    payload = json.dumps(
+        {"q": normalized, "m": model, "p": profile or {}, "s": session_id},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Une seule génération par clé : les doublons attendent le même résultat
+
+    Contrairement à un cache, rien n'est conservé une fois la génération terminée ;
+    seules les requêtes arrivées pendant qu'elle est en cours sont regroupées.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0,
+            'max_waiters': 0
+        }
+        self._waiters: Dict[str, int] = {}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Exécute fn() ou rejoint l'exécution en cours ; retourne (résultat, regroupé)"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            self.stats['max_waiters'] = max(self.stats['max_waiters'], self._waiters[key])
+            # shield : l'annulation d'un client ne doit pas annuler la génération partagée
+            return await asyncio.shield(task), True
+
+        self.stats['leaders'] += 1
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        self._waiters[key] = 0
+        task.add_done_callback(lambda _: self._release(key, task))
+        return await asyncio.shield(task), False
+
+    def _release(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            self._waiters.pop(key, None)
+        # Marquer l'exception comme lue si plus personne n'attend
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats['leaders'] + self.stats['coalesced']
+        return {
+            **self.stats,
+            'in_flight': len(self._in_flight),
+            'coalesced_ratio': round(self.stats['coalesced'] / total, 4) if total else 0.0
+        }
@@ -15,17 +15,74 @@ class Settings:
         
         # Modèle - Chemin vers votre modèle DistilGPT-2
         self.model_path = os.getenv("MODEL_PATH", "./models/coach-sportif-french")
+        self.models_dir = os.getenv("MODELS_DIR", "./models")  # Seul dossier accepté pour un rechargement
         self.model_device = os.getenv("MODEL_DEVICE", "auto")
         
         # RAG
         self.enable_rag = os.getenv("ENABLE_RAG", "true").lower() == "true"
         self.rag_top_k = int(os.getenv("RAG_TOP_K", "3"))
+        self.corpus_path = os.getenv("CORPUS_PATH", "./data/corpus")
+        self.rag_batch_size = int(os.getenv("RAG_BATCH_SIZE", "256"))
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        self.index_dir = os.getenv("INDEX_DIR", "./data/index")
+        self.corpus_source_path = os.getenv("CORPUS_SOURCE_PATH", "./data/sources")  # Documents longs avant découpage
+        self.chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", "0"))  # 0 = nombre de CPU
+        self.exercise_store_dir = os.getenv("EXERCISE_STORE_DIR", "./data/store")
+        self.corpus_changelog_path = os.getenv("CORPUS_CHANGELOG_PATH", "./data/corpus_changes.jsonl")
+        self.admin_token = os.getenv("ADMIN_TOKEN", "")
+        # Développement local uniquement : routes /admin ouvertes sans jeton
+        self.admin_auth_disabled = os.getenv("ADMIN_AUTH_DISABLED", "false").lower() == "true"
+        self.rag_index_type = os.getenv("RAG_INDEX_TYPE", "flat")  # flat, sq_fp16, pq, opq, ivf_flat, ivf_pq, hnsw
+        self.rag_rerank_factor = int(os.getenv("RAG_RERANK_FACTOR", "0"))  # 0 = pas de re-classement exact
+        self.rag_shards = int(os.getenv("RAG_SHARDS", "0"))  # 0/1 = index unique dans le processus
+        self.rag_shard_timeout_ms = float(os.getenv("RAG_SHARD_TIMEOUT_MS", "200"))
+        self.index_snapshot_dir = os.getenv("INDEX_SNAPSHOT_DIR", "")  # Dossier partagé entre réplicas ("" = désactivé)
+        self.index_snapshot_poll_seconds = float(os.getenv("INDEX_SNAPSHOT_POLL_SECONDS", "5"))
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, int8, onnx
+        self.embedding_onnx_path = os.getenv("EMBEDDING_ONNX_PATH", "./models/minilm-onnx/model.onnx")
+        self.embedding_threads = int(os.getenv("EMBEDDING_THREADS", "0"))
+        self.rag_pca_dim = int(os.getenv("RAG_PCA_DIM", "0"))  # 0 = vecteurs complets
+        self.embedding_parity_required = os.getenv("EMBEDDING_PARITY_REQUIRED", "true").lower() == "true"
+        self.eval_queries_path = os.getenv("EVAL_QUERIES_PATH", "./data/eval/retrieval_queries.jsonl")
+        self.rag_cascade = os.getenv("RAG_CASCADE", "true").lower() == "true"  # BM25 avant la recherche dense
+        self.lexical_min_coverage = float(os.getenv("LEXICAL_MIN_COVERAGE", "0.6"))
+        self.lexical_min_margin = float(os.getenv("LEXICAL_MIN_MARGIN", "1.5"))
+        self.embed_batch_max_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+        self.embed_batch_max_wait_ms = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+        self.retrieval_cache_embeddings = int(os.getenv("RETRIEVAL_CACHE_EMBEDDINGS", "4096"))
+        self.retrieval_cache_results = int(os.getenv("RETRIEVAL_CACHE_RESULTS", "8192"))
+        self.search_max_candidates = int(os.getenv("SEARCH_MAX_CANDIDATES", "500"))  # Profondeur parcourable par curseur
+        self.search_cursor_ttl_seconds = float(os.getenv("SEARCH_CURSOR_TTL_SECONDS", "300"))
+        self.search_cursor_max = int(os.getenv("SEARCH_CURSOR_MAX", "1024"))
         
         # Génération
         self.max_new_tokens = int(os.getenv("MAX_NEW_TOKENS", "150"))
         self.temperature = float(os.getenv("TEMPERATURE", "0.7"))
         self.top_p = float(os.getenv("TOP_P", "0.9"))
         
+        # Conversations (historique côté serveur + cache KV)
+        self.conversation_window_tokens = int(os.getenv("CONVERSATION_WINDOW_TOKENS", "768"))
+        self.conversation_memory_mb = int(os.getenv("CONVERSATION_MEMORY_MB", "512"))
+        self.conversation_max_sessions = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+        
+        # Ordonnancement des générations
+        self.scheduler_workers = int(os.getenv("SCHEDULER_WORKERS", "2"))
+        self.scheduler_cost_weight = float(os.getenv("SCHEDULER_COST_WEIGHT", "1.0"))
+        self.scheduler_predictor_decay = float(os.getenv("SCHEDULER_PREDICTOR_DECAY", "0.995"))  # Oubli par génération observée
+        self.generation_log_path = os.getenv("GENERATION_LOG_PATH", "./logs/generations.jsonl")
+        # Taille bornée des journaux JSONL : fichier courant + LOG_BACKUPS fichiers tournés
+        self.log_max_bytes = int(float(os.getenv("LOG_MAX_MB", "50")) * 1024 * 1024)
+        self.log_backups = int(os.getenv("LOG_BACKUPS", "3"))
+        
+        # Banque de réponses aux questions fréquentes (scripts/build_faq_bank.py)
+        self.faq_bank_enabled = os.getenv("FAQ_BANK_ENABLED", "true").lower() == "true"
+        self.faq_bank_path = os.getenv("FAQ_BANK_PATH", "./data/faq/faq_bank.npz")
+        self.faq_min_similarity = float(os.getenv("FAQ_MIN_SIMILARITY", "0.9"))  # Cosinus question / centre du cluster
+        self.faq_cluster_similarity = float(os.getenv("FAQ_CLUSTER_SIMILARITY", "0.88"))
+        self.faq_reload_seconds = float(os.getenv("FAQ_RELOAD_SECONDS", "60"))
+        self.question_log_path = os.getenv("QUESTION_LOG_PATH", "./logs/questions.jsonl")
+        
         # Logs
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
 
@@ -0,0 +1,62 @@
+# api/context_packing.py - Sélection des documents de contexte sous un budget de tokens
+
+from pathlib import Path
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+# Valeur minimale d'un document : à budget égal, en inclure un de plus reste préférable
+_MIN_VALUE = 1e-6
+
+
+def tokenizer_id(name_or_path: Optional[str]) -> Optional[str]:
+    """Identifiant comparable d'un tokenizer : chemin absolu s'il est local, sinon son nom"""
+    if not name_or_path:
+        return None
+    path = Path(name_or_path)
+    return str(path.resolve()) if path.exists() else str(name_or_path)
+
+
+def document_cost(document: Mapping[str, Any], prefix: str, count_tokens: Callable[[str], int],
+                  serving_tokenizer: Optional[str] = None) -> int:
+    """Tokens d'une ligne de contexte : contenu + préfixe + saut de ligne
+
+    La longueur précalculée à l'ingestion (chunks) n'est reprise que si elle a été comptée
+    avec le tokenizer du modèle servi ; sinon le contenu est recompté.
+    """
+    token_length = document.get("token_length")
+    if token_length is None or serving_tokenizer is None or document.get("tokenizer") != serving_tokenizer:
+        return count_tokens(prefix + document["content"]) + 1
+    return int(token_length) + count_tokens(prefix) + 1
+
+
+def document_value(document: Mapping[str, Any]) -> float:
+    """Valeur d'un document : cosinus dense, sinon part de la requête couverte (cascade lexicale seule)"""
+    for field in ("relevance_score", "lexical_score"):
+        if document.get(field) is not None:
+            return float(document[field])
+    return 1.0
+
+
+def pack_context(documents: Sequence[Mapping[str, Any]], budget: int,
+                 cost_fn: Callable[[Mapping[str, Any]], int]) -> Tuple[List[Mapping[str, Any]], int]:
+    """Sous-ensemble de documents de score total maximal tenant dans le budget (sac à dos 0/1)
+
+    Les documents ne sont jamais tronqués : un document trop long est écarté.
+    Retourne les documents retenus dans l'ordre de pertinence et leur coût total.
+    """
+    if budget <= 0 or not documents:
+        return [], 0
+
+    costs = [cost_fn(document) for document in documents]
+    # best[c] : (valeur, indices retenus) de coût total <= c
+    best: List[Tuple[float, Tuple[int, ...]]] = [(0.0, ())] * (budget + 1)
+    for row, (document, cost) in enumerate(zip(documents, costs)):
+        if cost > budget:
+            continue
+        value = max(document_value(document), 0.0) + _MIN_VALUE
+        for capacity in range(budget, cost - 1, -1):
+            candidate = best[capacity - cost][0] + value
+            if candidate > best[capacity][0]:
+                best[capacity] = (candidate, best[capacity - cost][1] + (row,))
+
+    chosen = best[budget][1]
+    return [documents[row] for row in chosen], sum(costs[row] for row in chosen)
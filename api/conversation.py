@@ -0,0 +1,154 @@
+# api/conversation.py - Sessions de conversation côté serveur avec réutilisation du cache KV
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_cache_bytes(past_key_values: Any) -> int:
+    """Taille mémoire approximative d'un cache KV (DynamicCache ou tuples legacy)"""
+    if past_key_values is None:
+        return 0
+
+    tensors = []
+    if hasattr(past_key_values, 'key_cache') and hasattr(past_key_values, 'value_cache'):
+        tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+    else:
+        for layer in past_key_values:
+            tensors.extend(layer)
+
+    return sum(t.numel() * t.element_size() for t in tensors if hasattr(t, 'numel'))
+
+
+class ConversationSession:
+    """Historique tokenisé d'une conversation et cache KV associé"""
+
+    def __init__(self, session_id: str, model_key: str, model_version: Optional[str]):
+        self.session_id = session_id
+        self.model_key = model_key
+        self.model_version = model_version
+        self.token_ids: List[int] = []
+        self.turns: List[Tuple[str, str]] = []  # (prompt du tour, réponse générée)
+        self.past_key_values: Any = None
+        self.kv_bytes = 0
+        self.last_access = time.time()
+        self.lock = threading.Lock()
+        self.stats = {
+            'turns': 0,
+            'prefill_tokens': 0,
+            'reused_tokens': 0,
+            'window_resets': 0
+        }
+
+    def reset_cache(self):
+        self.token_ids = []
+        self.past_key_values = None
+        self.kv_bytes = 0
+
+    def bind(self, model_key: str, model_version: Optional[str]):
+        """Rattache la session au modèle qui va générer (à appeler sous self.lock)
+
+        Le cache KV et l'historique ne sont valables que pour la version qui les a produits :
+        ils sont effacés si le modèle ou sa version a changé.
+        """
+        if self.model_key != model_key or self.model_version != model_version:
+            self.model_key = model_key
+            self.model_version = model_version
+            self.turns = []
+            self.reset_cache()
+
+    def cached_length(self) -> int:
+        """Nombre de tokens couverts par le cache KV"""
+        if self.past_key_values is None:
+            return 0
+        if hasattr(self.past_key_values, 'get_seq_length'):
+            return int(self.past_key_values.get_seq_length())
+        return int(self.past_key_values[0][0].shape[-2])
+
+
+class ConversationStore:
+    """Sessions actives, bornées en nombre et en mémoire KV (éviction LRU)"""
+
+    def __init__(self, window_tokens: int = 768, memory_budget_mb: int = 512, max_sessions: int = 1000,
+                 idle_timeout: int = 1800):
+        self.window_tokens = window_tokens
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'created': 0,
+            'evicted': 0,
+            'expired': 0
+        }
+
+    def get_or_create(self, session_id: str, model_key: str, model_version: Optional[str]) -> ConversationSession:
+        """Session existante ou nouvelle (le changement de modèle est traité par bind, sous le verrou de la session)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConversationSession(session_id, model_key, model_version)
+                self._sessions[session_id] = session
+                self.stats['created'] += 1
+
+            session.last_access = time.time()
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return session
+
+    def update(self, session: ConversationSession):
+        """Met à jour la mémoire occupée par la session puis applique le budget"""
+        session.kv_bytes = estimate_cache_bytes(session.past_key_values)
+        session.last_access = time.time()
+        with self._lock:
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+            self._evict(keep=session.session_id)
+
+    def turn_count(self, session_id: Optional[str]) -> int:
+        """Tours déjà générés dans la session (0 si elle n'existe pas)"""
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            return len(session.turns) if session is not None else 0
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _total_bytes(self) -> int:
+        return sum(s.kv_bytes for s in self._sessions.values())
+
+    def _evict(self, keep: Optional[str] = None):
+        """Éviction LRU : sessions inactives, puis nombre, puis budget mémoire"""
+        now = time.time()
+        for session_id in [sid for sid, s in self._sessions.items()
+                           if sid != keep and now - s.last_access > self.idle_timeout]:
+            del self._sessions[session_id]
+            self.stats['expired'] += 1
+
+        while len(self._sessions) > self.max_sessions or self._total_bytes() > self.memory_budget:
+            victim = next((sid for sid in self._sessions if sid != keep), None)
+            if victim is None:
+                break
+            del self._sessions[victim]
+            self.stats['evicted'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            prefill = sum(s.stats['prefill_tokens'] for s in sessions)
+            reused = sum(s.stats['reused_tokens'] for s in sessions)
+            return {
+                **self.stats,
+                'active_sessions': len(sessions),
+                'kv_memory_mb': round(self._total_bytes() / (1024 * 1024), 2),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 2),
+                'window_tokens': self.window_tokens,
+                'prefill_tokens': prefill,
+                'reused_tokens': reused
+            }
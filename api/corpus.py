@@ -0,0 +1,226 @@
+# api/corpus.py - Chargement en flux et validation du corpus d'exercices (JSONL / Parquet)
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CORPUS_EXTENSIONS = (".jsonl", ".ndjson", ".parquet")
+
+# Schéma : champ -> types acceptés
+REQUIRED_FIELDS = {
+    "title": str,
+    "content": str,
+}
+OPTIONAL_FIELDS = {
+    "id": (int, str),
+    "muscle_groups": list,
+    "difficulty": str,
+    "equipment": str,
+    "category": str,
+    "importance": str,
+    # Tokenizer ayant compté token_length (documents découpés)
+    "tokenizer": str,
+    # Documents découpés (scripts/ingest_corpus.py) : parent, rang et longueur en tokens
+    "parent_id": (int, str),
+    "chunk_index": int,
+    "token_length": int,
+}
+
+
+class CorpusValidationError(ValueError):
+    """Document du corpus non conforme au schéma"""
+
+
+class DocumentConflictError(ValueError):
+    """Ajout d'un document déjà présent, ou modification d'un document absent"""
+
+
+def stable_document_id(title: str, content: str) -> str:
+    """Identifiant stable dérivé du contenu (documents sans id explicite)"""
+    digest = hashlib.sha1(f"{title}\n{content}".encode("utf-8")).hexdigest()
+    return f"doc-{digest[:12]}"
+
+
+def content_hash(document: Dict[str, Any]) -> str:
+    """Empreinte du contenu d'un document (détection des modifications)"""
+    payload = json.dumps(dict(document), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def validate_document(raw: Any, source: str = "<inline>") -> Dict[str, Any]:
+    """Valide un document brut et retourne sa forme normalisée"""
+    if not isinstance(raw, dict):
+        raise CorpusValidationError(f"{source}: objet attendu, reçu {type(raw).__name__}")
+
+    document: Dict[str, Any] = {}
+
+    for field, expected in REQUIRED_FIELDS.items():
+        value = raw.get(field)
+        if not isinstance(value, expected) or not value.strip():
+            raise CorpusValidationError(f"{source}: champ obligatoire '{field}' manquant ou vide")
+        document[field] = value.strip()
+
+    for field, expected in OPTIONAL_FIELDS.items():
+        value = raw.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise CorpusValidationError(f"{source}: type invalide pour '{field}'")
+        if field == "muscle_groups":
+            if not all(isinstance(muscle, str) for muscle in value):
+                raise CorpusValidationError(f"{source}: 'muscle_groups' doit être une liste de chaînes")
+            value = [muscle.strip() for muscle in value if muscle.strip()]
+        document[field] = value
+
+    if "id" not in document:
+        document["id"] = stable_document_id(document["title"], document["content"])
+
+    # Ordre des champs stable : id en premier
+    return {"id": document.pop("id"), **document}
+
+
+def resolve_corpus_paths(corpus_path: Union[str, Path]) -> List[Path]:
+    """Fichiers du corpus : un fichier unique ou tous les fichiers d'un dossier (ordre stable)"""
+    path = Path(corpus_path)
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.suffix.lower() in CORPUS_EXTENSIONS)
+    return []
+
+
+def _iter_jsonl(path: Path) -> Iterator[tuple]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            source = f"{path.name}:{line_number}"
+            try:
+                yield source, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield source, CorpusValidationError(f"{source}: JSON invalide ({e.msg})")
+
+
+def _iter_parquet(path: Path, batch_size: int) -> Iterator[tuple]:
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError(f"pyarrow requis pour lire {path.name}")
+    parquet_file = pq.ParquetFile(path)
+    row = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        for record in batch.to_pylist():
+            row += 1
+            yield f"{path.name}:{row}", record
+
+
+def iter_corpus(paths: Iterable[Path], batch_size: int = 1024, strict: bool = False,
+                stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """Documents validés, lus en flux (une ligne / un lot Parquet à la fois)
+
+    Les documents invalides ou en double sont ignorés (ou lèvent une erreur si strict).
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"valid": 0, "invalid": 0, "duplicates": 0})
+    seen_ids = set()
+
+    for path in paths:
+        records = _iter_parquet(path, batch_size) if path.suffix.lower() == ".parquet" else _iter_jsonl(path)
+        for source, raw in records:
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                document = validate_document(raw, source)
+            except CorpusValidationError as e:
+                stats["invalid"] += 1
+                if strict:
+                    raise
+                logger.warning(f"⚠️ Document ignoré: {e}")
+                continue
+
+            if document["id"] in seen_ids:
+                stats["duplicates"] += 1
+                if strict:
+                    raise CorpusValidationError(f"{source}: id en double '{document['id']}'")
+                logger.warning(f"⚠️ Id en double ignoré: {document['id']} ({source})")
+                continue
+
+            seen_ids.add(document["id"])
+            stats["valid"] += 1
+            yield document
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Découpe un itérable en lots de taille bornée"""
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def document_text(document: Dict[str, Any]) -> str:
+    """Texte indexé pour la recherche sémantique"""
+    return f"{document['title']} {document['content']}"
+
+
+def append_changes(path: Union[str, Path], changes: Iterable[Dict[str, Any]]):
+    """Ajoute des opérations au journal des modifications à chaud (upsert / delete)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_changes(path: Union[str, Path], offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """Opérations écrites à partir de l'octet offset ; retourne (opérations, offset de fin)
+
+    Seules les lignes complètes sont lues : une écriture en cours sera relue au prochain appel.
+    """
+    path = Path(path)
+    if not path.exists():
+        return [], 0
+    changes: List[Dict[str, Any]] = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                change = json.loads(line)
+            except ValueError:
+                change = None
+            if not isinstance(change, dict):
+                logger.warning(f"⚠️ Modification ignorée: {path.name} (octet {offset - len(line)})")
+                continue
+            changes.append(change)
+    return changes, offset
+
+
+def rewrite_changes(path: Union[str, Path], changes: Iterable[Dict[str, Any]]):
+    """Remplace atomiquement le journal (compaction)"""
+    path = Path(path)
+    tmp_path = path.parent / f".{path.name}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
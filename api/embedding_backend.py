@@ -0,0 +1,191 @@
+# api/embedding_backend.py - Encodeurs de requêtes accélérés (int8 / ONNX Runtime) et contrôle de parité
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+PARITY_DIR = "parity"
+
+
+def encoder_id(model_name: str, backend: str = "torch", pca_dim: int = 0) -> str:
+    """Identifiant d'un encodeur ; le modèle seul pour l'encodeur d'origine (builds existants inchangés)"""
+    parts = [model_name]
+    if backend != "torch":
+        parts.append(backend)
+    if pca_dim:
+        parts.append(f"pca{pca_dim}")
+    return "|".join(parts)
+
+
+class OnnxEncoder:
+    """MiniLM exporté en ONNX, exécuté par ONNX Runtime (mean pooling comme sentence-transformers)"""
+
+    def __init__(self, model_name: str, onnx_path: Path, max_length: int = 128, threads: int = 0):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime requis pour EMBEDDING_BACKEND=onnx")
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = max_length
+
+    def encode(self, texts: Sequence[str], batch_size: int = 64, show_progress_bar: bool = False) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(list(texts[start:start + batch_size]), padding=True, truncation=True,
+                                     max_length=self.max_length, return_tensors="np")
+            inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            hidden = self.session.run(None, inputs)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        return np.concatenate(batches).astype(np.float32)
+
+
+def export_onnx(model_name: str, onnx_path: Path, quantize: bool = True) -> Path:
+    """Exporte le transformer de l'encodeur en ONNX (axes batch/séquence dynamiques), quantifié int8 si demandé"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    onnx_path = Path(onnx_path)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    encoder = SentenceTransformer(model_name, device="cpu")
+    transformer = encoder[0].auto_model.eval()
+    dummy = encoder.tokenizer(["export"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ("input_ids", "attention_mask", "last_hidden_state")}
+
+    raw_path = onnx_path.with_suffix(".fp32.onnx") if quantize else onnx_path
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(raw_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(raw_path), str(onnx_path), weight_type=QuantType.QInt8)
+        raw_path.unlink()
+
+    logger.info(f"📦 Encodeur exporté en ONNX: {onnx_path}")
+    return onnx_path
+
+
+def load_encoder(model_name: str, backend: str = "torch", onnx_path: str = "", threads: int = 0):
+    """Encodeur exposant encode(texts, batch_size=..., show_progress_bar=...) comme SentenceTransformer"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu: {backend} (attendu: {', '.join(EMBEDDING_BACKENDS)})")
+
+    if backend == "onnx":
+        if not onnx_path or not Path(onnx_path).exists():
+            raise RuntimeError(f"Modèle ONNX introuvable: {onnx_path} (voir scripts/check_encoder_parity.py --export-onnx)")
+        return OnnxEncoder(model_name, Path(onnx_path), threads=threads)
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    # int8 : quantification dynamique des couches linéaires (CPU)
+    import torch
+    encoder = SentenceTransformer(model_name, device="cpu")
+    torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return encoder
+
+
+# === PARITÉ DE RAPPEL ===
+
+def parity_report_path(index_dir: Path, encoder_key: str) -> Path:
+    digest = hashlib.sha1(encoder_key.encode("utf-8")).hexdigest()[:12]
+    return Path(index_dir) / PARITY_DIR / f"{digest}.json"
+
+
+def parity_passed(index_dir: Path, encoder_key: str) -> bool:
+    """Vrai si un rapport de parité validé existe pour cet encodeur"""
+    path = parity_report_path(index_dir, encoder_key)
+    if not path.exists():
+        return False
+    try:
+        report = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return False
+    return report.get("encoder") == encoder_key and report.get("passed") is True
+
+
+def load_eval_queries(path: Path) -> List[Dict[str, Any]]:
+    """Requêtes étiquetées : une ligne JSON {query, relevant_ids}"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                queries.append({"query": record["query"], "relevant_ids": list(record["relevant_ids"])})
+    return queries
+
+
+def evaluate_retrieval(encode_fn: Callable[[List[str]], np.ndarray], documents: Sequence[Dict[str, Any]],
+                       queries: Sequence[Dict[str, Any]], index_factory: Callable[[np.ndarray], Any],
+                       k: int = 3) -> Dict[str, Any]:
+    """Rappel@k et MRR d'un encodeur sur les requêtes étiquetées, latence d'encodage par requête"""
+    from .corpus import document_text
+
+    doc_vectors = np.ascontiguousarray(encode_fn([document_text(doc) for doc in documents]), dtype=np.float32)
+    faiss.normalize_L2(doc_vectors)
+    index = index_factory(doc_vectors)
+    doc_ids = [doc["id"] for doc in documents]
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(np.asarray(encode_fn([query["query"]]), dtype=np.float32)[0])
+        latencies.append(time.perf_counter() - start)
+    query_vectors = np.ascontiguousarray(np.stack(query_vectors))
+    faiss.normalize_L2(query_vectors)
+
+    k = min(k, len(documents))
+    _, found = index.search(query_vectors, k)
+
+    recall, reciprocal_rank = 0.0, 0.0
+    for row, query in enumerate(queries):
+        relevant = set(query["relevant_ids"])
+        ranked = [doc_ids[idx] for idx in found[row] if idx >= 0]
+        recall += len(relevant & set(ranked)) / min(k, len(relevant))
+        reciprocal_rank += next((1.0 / (rank + 1) for rank, doc_id in enumerate(ranked) if doc_id in relevant), 0.0)
+
+    latencies.sort()
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(recall / len(queries), 4),
+        "mrr": round(reciprocal_rank / len(queries), 4),
+        "encode_latency_ms_p50": round(1000 * latencies[len(latencies) // 2], 3),
+        "encode_latency_ms_avg": round(1000 * sum(latencies) / len(latencies), 3)
+    }
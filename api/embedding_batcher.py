@@ -0,0 +1,108 @@
+# api/embedding_batcher.py - Micro-batching des encodages de requêtes concurrentes
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Regroupe les requêtes arrivées dans une courte fenêtre en un seul appel d'encodage
+
+    Le premier texte d'un lot ouvre une fenêtre de max_wait_ms ; tout ce qui arrive
+    avant son expiration (jusqu'à max_batch_size) est encodé dans le même appel,
+    puis chaque appelant reçoit sa ligne.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'max_batch_size': 0,
+            'total_wait': 0.0,
+            'busy_time': 0.0,
+            'errors': 0
+        }
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Vecteur d'un texte (bloquant, encodé avec les requêtes concurrentes)"""
+        return self.submit(text).result()
+
+    def encode_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Vecteurs de plusieurs textes (matrice n × d)"""
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [item[0] for item in batch]
+            started = time.monotonic()
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.monotonic()
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['items'] += len(batch)
+                self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+                self.stats['total_wait'] += sum(started - enqueued for _, _, enqueued in batch)
+                self.stats['busy_time'] += finished - started
+
+            for row, (_, future, _) in enumerate(batch):
+                future.set_result(vectors[row])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        return {
+            'batches': stats['batches'],
+            'items': stats['items'],
+            'errors': stats['errors'],
+            'avg_batch_size': round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0.0,
+            'max_batch_size': stats['max_batch_size'],
+            'avg_wait_ms': round(1000 * stats['total_wait'] / stats['items'], 3) if stats['items'] else 0.0,
+            'encoder_utilization': round(stats['busy_time'] / elapsed, 4),
+            'queue_depth': self._queue.qsize(),
+            'config': {'max_batch_size': self.max_batch_size, 'max_wait_ms': self.max_wait * 1000}
+        }
@@ -0,0 +1,423 @@
+# api/exercise_store.py - Stockage colonnaire (NumPy, mmap) du corpus d'exercices
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+import numpy as np
+
+from .corpus import content_hash
+from .lexical_index import build_postings
+
+logger = logging.getLogger(__name__)
+
+STORE_MANIFEST = "store.json"
+STORE_FORMAT = 3
+
+# Ordre des champs identique à celui de corpus.validate_document
+TEXT_FIELDS = ("title", "content")
+MULTI_FIELDS = ("muscle_groups",)
+CATEGORICAL_FIELDS = ("difficulty", "equipment", "category", "importance", "tokenizer")
+# Champs des chunks : identifiant du parent (comme id) et entiers (-1 si absent)
+REFERENCE_FIELDS = ("parent_id",)
+INT_FIELDS = ("chunk_index", "token_length")
+
+
+def corpus_fingerprint(paths: Sequence[Path]) -> str:
+    """Empreinte des fichiers du corpus (chemin, taille, date de modification)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = Path(path).stat()
+        digest.update(f"{Path(path).resolve()}\n{stat.st_size}\n{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _TextColumn:
+    """Chaînes UTF-8 concaténées + offsets (n + 1)"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.offsets: List[int] = [0]
+
+    def append(self, text: str):
+        encoded = text.encode("utf-8")
+        self.parts.append(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+
+    def arrays(self, name: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{name}.data": np.frombuffer(b"".join(self.parts), dtype=np.uint8),
+            f"{name}.offsets": np.asarray(self.offsets, dtype=np.int64)
+        }
+
+
+class _Dictionary:
+    """Encodage par dictionnaire : valeur -> code entier"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class RowView(Mapping):
+    """Vue en lecture seule d'une ligne du store (décodage champ par champ, sans copie du document)
+
+    `extra` superpose des valeurs calculées (ex. relevance_score) sans toucher au store.
+    """
+
+    __slots__ = ("_store", "_position", "_extra")
+
+    def __init__(self, store: "ExerciseStore", position: int, extra: Optional[Dict[str, Any]] = None):
+        self._store = store
+        self._position = position
+        self._extra = extra
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    def __getitem__(self, key: str) -> Any:
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return self._store.value(self._position, key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._store.fields_present(self._position)
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def with_values(self, **extra) -> "RowView":
+        return RowView(self._store, self._position, {**(self._extra or {}), **extra})
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class ExerciseStore:
+    """Corpus en colonnes NumPy : textes en offsets, catégories encodées par dictionnaire
+
+    Les colonnes sont écrites en .npy et rouvertes en mmap : le corpus n'est pas
+    reparsé au démarrage et les pages sont partagées entre workers. Les modifications
+    à chaud (ajouts, remplacements) vivent dans une surcouche de documents, les
+    suppressions dans un ensemble de positions ; les positions ne sont jamais réutilisées.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]],
+                 manifest: Optional[Dict[str, Any]] = None, directory: Optional[Path] = None):
+        self.arrays = arrays
+        self.dictionaries = dictionaries
+        self.manifest = manifest or {}
+        self.directory = directory
+        self._count = len(arrays["id.offsets"]) - 1
+        self._positions: Optional[Dict[Any, int]] = None
+        self._overlay: Dict[int, Dict[str, Any]] = {}
+        self._appended = 0
+        self._deleted: Set[int] = set()
+
+    # === CONSTRUCTION ===
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "ExerciseStore":
+        """Encode des documents validés (lus en flux) en colonnes"""
+        text_columns = {field: _TextColumn() for field in ("id",) + REFERENCE_FIELDS + TEXT_FIELDS}
+        is_int: Dict[str, List[bool]] = {field: [] for field in ("id",) + REFERENCE_FIELDS}
+        reference_present: Dict[str, List[bool]] = {field: [] for field in REFERENCE_FIELDS}
+        int_values: Dict[str, List[int]] = {field: [] for field in INT_FIELDS}
+        dictionaries = {field: _Dictionary() for field in MULTI_FIELDS + CATEGORICAL_FIELDS}
+        categorical_codes: Dict[str, List[int]] = {field: [] for field in CATEGORICAL_FIELDS}
+        multi_codes: Dict[str, List[int]] = {field: [] for field in MULTI_FIELDS}
+        multi_offsets: Dict[str, List[int]] = {field: [0] for field in MULTI_FIELDS}
+        multi_present: Dict[str, List[bool]] = {field: [] for field in MULTI_FIELDS}
+        hashes: List[str] = []
+
+        for document in documents:
+            hashes.append(content_hash(document))
+            doc_id = document["id"]
+            is_int["id"].append(isinstance(doc_id, int))
+            text_columns["id"].append(str(doc_id))
+            for field in REFERENCE_FIELDS:
+                reference = document.get(field)
+                reference_present[field].append(reference is not None)
+                is_int[field].append(isinstance(reference, int))
+                text_columns[field].append("" if reference is None else str(reference))
+            for field in INT_FIELDS:
+                int_values[field].append(document.get(field, -1))
+            for field in TEXT_FIELDS:
+                text_columns[field].append(document[field])
+            for field in MULTI_FIELDS:
+                values = document.get(field)
+                multi_present[field].append(values is not None)
+                multi_codes[field].extend(dictionaries[field].encode(value) for value in values or [])
+                multi_offsets[field].append(len(multi_codes[field]))
+            for field in CATEGORICAL_FIELDS:
+                value = document.get(field)
+                categorical_codes[field].append(-1 if value is None else dictionaries[field].encode(value))
+
+        arrays: Dict[str, np.ndarray] = {"content_hash": np.asarray(hashes, dtype="S40")}
+        for field, flags in is_int.items():
+            arrays[f"{field}.is_int"] = np.asarray(flags, dtype=bool)
+        for field, present in reference_present.items():
+            arrays[f"{field}.present"] = np.asarray(present, dtype=bool)
+        for field, values in int_values.items():
+            arrays[field] = np.asarray(values, dtype=np.int32)
+        for field, column in text_columns.items():
+            arrays.update(column.arrays(field))
+        for field in MULTI_FIELDS:
+            arrays[f"{field}.codes"] = np.asarray(multi_codes[field], dtype=np.int32)
+            arrays[f"{field}.offsets"] = np.asarray(multi_offsets[field], dtype=np.int64)
+            arrays[f"{field}.present"] = np.asarray(multi_present[field], dtype=bool)
+        for field in CATEGORICAL_FIELDS:
+            arrays[f"{field}.codes"] = np.asarray(categorical_codes[field], dtype=np.int32)
+
+        return cls(arrays, {field: dictionary.values for field, dictionary in dictionaries.items()})
+
+    def save(self, directory: Path, manifest: Optional[Dict[str, Any]] = None):
+        """Écrit les colonnes (.npy) et le manifeste ; remplacement atomique du dossier"""
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = directory.parent / f".{directory.name}.tmp-{os.getpid()}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        for name, array in self.arrays.items():
+            np.save(tmp_dir / f"{name}.npy", array)
+        manifest = {
+            **(manifest or {}),
+            "format": STORE_FORMAT,
+            "count": self._count,
+            "dictionaries": self.dictionaries,
+            "columns": sorted(self.arrays),
+            "created_at": datetime.now().isoformat()
+        }
+        with open(tmp_dir / STORE_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if directory.exists():
+            # Ancien store écarté par renommage : les lecteurs voient l'ancien dossier ou le nouveau
+            stale_dir = directory.parent / f".{directory.name}.stale-{os.getpid()}"
+            try:
+                os.replace(directory, stale_dir)
+                shutil.rmtree(stale_dir, ignore_errors=True)
+            except OSError:
+                pass
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Un autre processus a publié son store entre-temps : on garde le sien
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not (directory / STORE_MANIFEST).exists():
+                raise
+            logger.info(f"📂 Store d'exercices déjà publié par un autre processus: {directory}")
+
+    @classmethod
+    def open(cls, directory: Path) -> Optional["ExerciseStore"]:
+        """Ouvre un store existant en mmap, ou None s'il est absent ou illisible"""
+        directory = Path(directory)
+        manifest_path = directory / STORE_MANIFEST
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") != STORE_FORMAT:
+                return None
+            arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in manifest["columns"]}
+            return cls(arrays, manifest["dictionaries"], manifest, directory)
+        except Exception as e:
+            logger.warning(f"⚠️ Store d'exercices illisible {directory}: {e}")
+            return None
+
+    @classmethod
+    def load_or_build(cls, directory: Path, paths: Sequence[Path],
+                      documents_fn: Callable[[], Iterable[Dict[str, Any]]]) -> "ExerciseStore":
+        """Store correspondant aux fichiers du corpus ; le reconstruit s'ils ont changé"""
+        fingerprint = corpus_fingerprint(paths)
+        store = cls.open(directory)
+        if store is not None and store.manifest.get("fingerprint") == fingerprint:
+            logger.info(f"📂 Store d'exercices ouvert en mmap: {len(store)} documents")
+            return store
+
+        store = cls.from_documents(documents_fn())
+        # Postings BM25 écrits avec les colonnes : la cascade lexicale ne retokenise pas au démarrage
+        store.arrays.update(build_postings(store))
+        store.save(directory, {"fingerprint": fingerprint})
+        store = cls.open(directory)
+        if store is None:
+            raise RuntimeError(f"Store d'exercices illisible après écriture: {directory}")
+        return store
+
+    # === MODIFICATIONS À CHAUD ===
+
+    @property
+    def base_count(self) -> int:
+        """Documents des colonnes persistées (hors ajouts à chaud)"""
+        return self._count
+
+    def append(self, document: Dict[str, Any]) -> int:
+        position = self._count + self._appended
+        self._overlay[position] = document
+        self._appended += 1
+        self._index_positions()[document["id"]] = position
+        return position
+
+    def replace(self, position: int, document: Dict[str, Any]):
+        self._overlay[position] = document
+
+    def delete(self, position: int):
+        self._index_positions().pop(self.value(position, "id"), None)
+        self._deleted.add(position)
+        self._overlay.pop(position, None)
+
+    def is_deleted(self, position: int) -> bool:
+        return position in self._deleted
+
+    def modified_positions(self) -> List[int]:
+        """Positions ajoutées, remplacées ou supprimées depuis l'écriture des colonnes"""
+        return sorted(set(self._overlay) | self._deleted)
+
+    @property
+    def live_count(self) -> int:
+        return self._count + self._appended - len(self._deleted)
+
+    # === LECTURE ===
+
+    def __len__(self) -> int:
+        """Nombre de positions (supprimées comprises) : borne des identifiants de l'index"""
+        return self._count + self._appended
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [RowView(self, position) for position in range(*item.indices(len(self)))]
+        position = int(item)
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return RowView(self, position)
+
+    def __iter__(self) -> Iterator[RowView]:
+        """Documents vivants, dans l'ordre des positions"""
+        for position in range(len(self)):
+            if position not in self._deleted:
+                yield RowView(self, position)
+
+    def _text(self, field: str, position: int) -> str:
+        offsets = self.arrays[f"{field}.offsets"]
+        start, end = int(offsets[position]), int(offsets[position + 1])
+        return bytes(self.arrays[f"{field}.data"][start:end]).decode("utf-8")
+
+    def value(self, position: int, field: str) -> Any:
+        document = self._overlay.get(position)
+        if document is not None:
+            return document[field]
+        if field == "id" or field in REFERENCE_FIELDS:
+            if field != "id" and not self.arrays[f"{field}.present"][position]:
+                raise KeyError(field)
+            doc_id = self._text(field, position)
+            return int(doc_id) if self.arrays[f"{field}.is_int"][position] else doc_id
+        if field in TEXT_FIELDS:
+            return self._text(field, position)
+        if field in MULTI_FIELDS:
+            if not self.arrays[f"{field}.present"][position]:
+                raise KeyError(field)
+            offsets = self.arrays[f"{field}.offsets"]
+            codes = self.arrays[f"{field}.codes"][int(offsets[position]):int(offsets[position + 1])]
+            return [self.dictionaries[field][code] for code in codes]
+        if field in CATEGORICAL_FIELDS:
+            code = int(self.arrays[f"{field}.codes"][position])
+            if code < 0:
+                raise KeyError(field)
+            return self.dictionaries[field][code]
+        if field in INT_FIELDS:
+            value = int(self.arrays[field][position])
+            if value < 0:
+                raise KeyError(field)
+            return value
+        raise KeyError(field)
+
+    def fields_present(self, position: int) -> Iterator[str]:
+        document = self._overlay.get(position)
+        if document is not None:
+            yield from document
+            return
+        yield "id"
+        yield from TEXT_FIELDS
+        for field in MULTI_FIELDS:
+            if self.arrays[f"{field}.present"][position]:
+                yield field
+        for field in CATEGORICAL_FIELDS:
+            if self.arrays[f"{field}.codes"][position] >= 0:
+                yield field
+        for field in REFERENCE_FIELDS:
+            if self.arrays[f"{field}.present"][position]:
+                yield field
+        for field in INT_FIELDS:
+            if self.arrays[field][position] >= 0:
+                yield field
+
+    def content_hashes(self) -> List[str]:
+        """Empreintes de contenu calculées à l'écriture (évite de redécoder le corpus)"""
+        return [digest.decode("ascii") for digest in self.arrays["content_hash"]]
+
+    def content_hash_at(self, position: int) -> str:
+        """Empreinte du contenu actuel d'une position (document remplacé à chaud compris)"""
+        document = self._overlay.get(position)
+        if document is not None:
+            return content_hash(document)
+        return self.arrays["content_hash"][position].decode("ascii")
+
+    def _index_positions(self) -> Dict[Any, int]:
+        if self._positions is None:
+            self._positions = {self.value(position, "id"): position for position in range(self._count)}
+        return self._positions
+
+    def position(self, doc_id: Any) -> Optional[int]:
+        """Position d'un document vivant par identifiant (table construite au premier appel)"""
+        return self._index_positions().get(doc_id)
+
+    def facet_positions(self, field: str) -> Dict[str, np.ndarray]:
+        """Positions des documents par valeur d'un champ catégoriel (calcul vectorisé)"""
+        codes = np.asarray(self.arrays[f"{field}.codes"])
+        if field in MULTI_FIELDS:
+            lengths = np.diff(np.asarray(self.arrays[f"{field}.offsets"]))
+            owners = np.repeat(np.arange(self._count), lengths)
+        else:
+            owners = np.arange(self._count)
+        return {
+            value: np.unique(owners[codes == code])
+            for code, value in enumerate(self.dictionaries[field])
+        }
+
+    def nbytes(self) -> int:
+        return int(sum(array.nbytes for array in self.arrays.values()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'documents': self.live_count,
+            'overlay_documents': len(self._overlay),
+            'deleted_documents': len(self._deleted),
+            'column_bytes': self.nbytes(),
+            'bytes_per_document': round(self.nbytes() / self._count, 1) if self._count else 0.0,
+            'memory_mapped': self.directory is not None,
+            'dictionary_sizes': {field: len(values) for field, values in self.dictionaries.items()}
+        }
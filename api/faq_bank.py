@@ -0,0 +1,288 @@
+# api/faq_bank.py - Banque de réponses aux questions fréquentes, construite hors ligne depuis le trafic
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .jsonl_log import RotatingJsonlLog
+from .retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+FAQ_BANK_FORMAT = 1
+# Réponses rejetées à la vérification : trop courtes ou trop répétitives
+MIN_ANSWER_CHARS = 40
+MIN_DISTINCT_WORD_RATIO = 0.4
+# Variantes de formulation gardées par cluster (diagnostic)
+SAMPLE_QUESTIONS = 5
+
+
+# === JOURNAL DES QUESTIONS ===
+
+class QuestionLog(RotatingJsonlLog):
+    """Journal JSONL borné des questions reçues (servies par la banque ou générées)
+
+    Les entrées sont écrites par le thread de journalisation du scheduler, hors des requêtes.
+    """
+
+    @staticmethod
+    def entry(question: str, model_key: str, faq_cluster: Optional[int] = None, turn: int = 0) -> Dict[str, Any]:
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'question': question,
+            'model': model_key,
+            'faq_cluster': faq_cluster,
+            # Rang du tour dans une conversation (0 = première question, ou requête sans session)
+            'turn': turn
+        }
+
+
+def iter_logged_questions(paths: Sequence[Path], since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Entrées des journaux portant une question, éventuellement depuis une date"""
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict) or not entry.get('question'):
+                    continue
+                if since is not None:
+                    try:
+                        if datetime.fromisoformat(entry['timestamp']) < since:
+                            continue
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                yield entry
+
+
+def mine_questions(entries: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fréquence de chaque question normalisée (par modèle) et part du trafic déjà servie par la banque
+
+    Les questions de suivi d'une conversation dépendent des tours précédents : elles sont ignorées.
+    """
+    counts: Counter = Counter()
+    phrasings: Dict[str, Counter] = {}
+    models: Dict[str, Counter] = {}
+    total = served = 0
+    for entry in entries:
+        if entry.get('turn', 0):
+            continue
+        question = entry['question']
+        key = normalize_query(question)
+        counts[key] += 1
+        phrasings.setdefault(key, Counter())[question.strip()] += 1
+        if entry.get('model'):
+            models.setdefault(key, Counter())[entry['model']] += 1
+        total += 1
+        if entry.get('faq_cluster') is not None:
+            served += 1
+    return {
+        'counts': counts,
+        # Formulation la plus fréquente de chaque question normalisée
+        'phrasings': {key: variants.most_common(1)[0][0] for key, variants in phrasings.items()},
+        'models': models,
+        'total': total,
+        'served': served
+    }
+
+
+# === CONSTRUCTION ===
+
+def cluster_questions(embeddings: np.ndarray, weights: Sequence[int], threshold: float) -> List[List[int]]:
+    """Regroupement glouton par leader : questions parcourues par fréquence décroissante,
+    chacune rejoint le premier cluster dont le centre est assez proche (cosinus), sinon en crée un
+
+    Les embeddings sont normalisés ; retourne les indices des questions de chaque cluster.
+    """
+    order = np.argsort(-np.asarray(weights, dtype=np.float64), kind="stable")
+    dimension = embeddings.shape[1]
+    sums = np.zeros((max(len(order), 1), dimension), dtype=np.float32)
+    centers = np.zeros_like(sums)
+    clusters: List[List[int]] = []
+
+    for i in order:
+        vector = embeddings[i]
+        if clusters:
+            scores = centers[:len(clusters)] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                clusters[best].append(int(i))
+                sums[best] += weights[i] * vector
+                centers[best] = sums[best] / max(np.linalg.norm(sums[best]), 1e-12)
+                continue
+        sums[len(clusters)] = weights[i] * vector
+        centers[len(clusters)] = vector
+        clusters.append([int(i)])
+    return clusters
+
+
+def vet_answer(result: Dict[str, Any]) -> Optional[str]:
+    """Motif de rejet d'une réponse générée pour la banque, ou None si elle est retenue"""
+    if result.get('model_used', '').startswith('fallback_'):
+        return "réponse de secours"
+    if not result.get('generated_tokens'):
+        return "aucun token généré"
+    response = result.get('response') or ''
+    if len(response) < MIN_ANSWER_CHARS:
+        return "réponse trop courte"
+    words = response.lower().split()
+    if not words or len(set(words)) / len(words) < MIN_DISTINCT_WORD_RATIO:
+        return "réponse répétitive"
+    return None
+
+
+def save_bank(path: Path, centroids: np.ndarray, entries: List[Dict[str, Any]], metadata: Dict[str, Any]):
+    """Écrit la banque (centres + entrées) puis la publie par renommage atomique"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps({**metadata, 'format': FAQ_BANK_FORMAT, 'entries': entries}, ensure_ascii=False)
+    tmp_path = path.parent / f".{path.name}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, centroids=np.ascontiguousarray(centroids, dtype=np.float32), bank=np.array(payload))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# === SERVICE ===
+
+class FAQBank:
+    """Centres des clusters de questions fréquentes et réponses vérifiées par modèle
+
+    Une entrée n'est servie que si les documents ayant servi de contexte à ses réponses
+    sont toujours présents et inchangés dans le corpus (voir revalidate).
+    """
+
+    def __init__(self, centroids: np.ndarray, entries: List[Dict[str, Any]], metadata: Dict[str, Any]):
+        self.centroids = centroids
+        self.entries = entries
+        self.metadata = metadata
+        self.valid = np.ones(len(entries), dtype=bool)
+
+    @classmethod
+    def load(cls, path: Path) -> "FAQBank":
+        with np.load(path, allow_pickle=False) as data:
+            centroids = np.ascontiguousarray(data['centroids'], dtype=np.float32)
+            payload = json.loads(str(data['bank']))
+        if payload.get('format') != FAQ_BANK_FORMAT:
+            raise ValueError(f"format de banque {payload.get('format')} non supporté")
+        entries = payload.pop('entries')
+        return cls(centroids, entries, payload)
+
+    def revalidate(self, store) -> int:
+        """Désactive les entrées dont un document source a été modifié ou supprimé"""
+        valid = np.ones(len(self.entries), dtype=bool)
+        for i, entry in enumerate(self.entries):
+            for doc_id, digest in entry['sources']:
+                position = store.position(doc_id)
+                if position is None or store.content_hash_at(position) != digest:
+                    valid[i] = False
+                    break
+        self.valid = valid
+        return int(valid.sum())
+
+    def lookup(self, embedding: np.ndarray, model_key: str, min_similarity: float,
+               admissible: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Entrée la plus proche ayant une réponse pour ce modèle ; retourne (entrée, similarité)"""
+        if not len(self.entries):
+            return None
+        scores = self.centroids @ embedding
+        for i in np.argsort(-scores)[:SAMPLE_QUESTIONS]:
+            if scores[i] < min_similarity:
+                break
+            entry = self.entries[i]
+            if not self.valid[i] or model_key not in entry['answers']:
+                continue
+            if admissible is not None and not admissible(entry):
+                continue
+            return entry, float(scores[i])
+        return None
+
+
+class FAQBankLoader:
+    """Banque active, rechargée quand le fichier publié change (reconstruction périodique)"""
+
+    def __init__(self, path: Path, encoder_key: str, min_similarity: float = 0.9, check_seconds: float = 60):
+        self.path = Path(path)
+        self.encoder_key = encoder_key
+        self.min_similarity = min_similarity
+        self.check_seconds = check_seconds
+        self.bank: Optional[FAQBank] = None
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'hits_by_model': {}, 'reloads': 0, 'last_error': None}
+
+    def current(self, store) -> Optional[FAQBank]:
+        """Banque à jour (le fichier est vérifié au plus toutes les check_seconds)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self.bank
+        with self._lock:
+            if now < self._next_check:
+                return self.bank
+            self._next_check = now + self.check_seconds
+            try:
+                mtime = self.path.stat().st_mtime
+            except OSError:
+                return self.bank
+            if mtime == self._mtime:
+                return self.bank
+            self._mtime = mtime
+            try:
+                bank = FAQBank.load(self.path)
+                if bank.metadata.get('encoder') != self.encoder_key:
+                    raise ValueError(f"encodeur {bank.metadata.get('encoder')} != {self.encoder_key}")
+                valid = bank.revalidate(store)
+                self.bank = bank
+                self.stats['reloads'] += 1
+                self.stats['last_error'] = None
+                logger.info(f"💡 Banque FAQ chargée: {valid}/{len(bank.entries)} entrées valides "
+                            f"(construite le {bank.metadata.get('built_at')})")
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                logger.error(f"❌ Banque FAQ illisible: {e}")
+        return self.bank
+
+    def revalidate(self, store):
+        bank = self.bank
+        if bank is not None:
+            bank.revalidate(store)
+
+    def record(self, model_key: str, hit: bool):
+        with self._lock:
+            self.stats['lookups'] += 1
+            if hit:
+                self.stats['hits'] += 1
+                hits_by_model = self.stats['hits_by_model']
+                hits_by_model[model_key] = hits_by_model.get(model_key, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        bank = self.bank
+        with self._lock:
+            lookups, hits = self.stats['lookups'], self.stats['hits']
+            stats = {**self.stats, 'hits_by_model': dict(self.stats['hits_by_model'])}
+        return {
+            **stats,
+            'path': str(self.path),
+            'loaded': bank is not None,
+            'built_at': bank.metadata.get('built_at') if bank else None,
+            'entries': len(bank.entries) if bank else 0,
+            'valid_entries': int(bank.valid.sum()) if bank else 0,
+            'offline_coverage': bank.metadata.get('coverage') if bank else None,
+            'min_similarity': self.min_similarity,
+            # Part des requêtes servies par la banque depuis le démarrage
+            'coverage': round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -2,13 +2,17 @@
 
 import os
 import logging
+import threading
+import time
 import torch
 import numpy as np
 from datetime import datetime
-from typing import List, Dict, Optional, Any, Literal
+from typing import List, Dict, Optional, Any, Iterator, Literal, Tuple
 from pathlib import Path
 from enum import Enum
 import re
+from concurrent.futures import Future
+from itertools import islice
 
 # Imports IA
 from transformers import (
@@ -22,8 +26,36 @@ try:
 except ImportError:
     RAG_AVAILABLE = False
 
+from .model_router import ModelRouter
+from .model_registry import ModelRegistry, ModelHandle
+from .conversation import ConversationStore, ConversationSession
+from .scheduler import GenerationScheduler, OutputLengthPredictor
+from .jsonl_log import RotatingJsonlLog
+from .corpus import (iter_corpus, resolve_corpus_paths, validate_document, document_text, append_changes, content_hash,
+                     iter_batches, read_changes, rewrite_changes, DocumentConflictError)
+from .index_store import IndexStore
+from .vector_index import index_builders
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_backend import encoder_id, load_encoder, parity_passed
+from .retrieval_cache import RetrievalCache
+from .metadata_index import MetadataIndex
+from .faq_bank import FAQBankLoader, QuestionLog
+from .metrics import FirstTokenStreamer, ServiceMetrics, StageTimings
+from .profile_filters import cache_signature, common_profiles, profile_constraints, relaxations
+from .exercise_store import ExerciseStore
+from .live_index import LiveIndex
+from .sharded_index import ShardedIndex
+from .search_cursors import SearchCursorCache
+from .index_snapshots import INDEX_SUBDIR, STORE_SUBDIR, SnapshotWatcher, read_current, snapshot_directory
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .context_packing import document_cost, pack_context, tokenizer_id
+from .config import get_settings
+
 logger = logging.getLogger(__name__)
 
+# En dessous de ce nombre de documents filtrés, score exact plutôt que recherche ANN filtrée
+EXACT_FILTER_MAX_CANDIDATES = 4096
+
 class ModelType(str, Enum):
     """Types de modèles disponibles"""
     LOCAL_DISTILGPT2 = "local_distilgpt2"
@@ -40,40 +72,88 @@ class FitnessCoachService:
         self.initialization_time = None
         self.initialization_error = None
         
-        # Modèles disponibles
-        self.models = {}
-        self.tokenizers = {}
+        # Modèles disponibles (versions chargées gérées par le registre)
+        self.model_registry = ModelRegistry(on_free=self._on_model_freed)
+        self._reload_lock = threading.Lock()
+        self.reload_status = {}
         self.model_configs = {
             ModelType.LOCAL_DISTILGPT2: {
                 "name": "DistilGPT-2 Fine-tuné Local",
                 "description": "Votre modèle DistilGPT-2 fine-tuné français",
                 "path": str(self.local_model_path),
                 "is_local": True,
-                "loaded": False
+                "loaded": False,
+                "version": None
             },
             ModelType.PLAYPART_TRAINER: {
                 "name": "PlayPart AI Personal Trainer",
                 "description": "Modèle GPT-2 spécialisé fitness de HuggingFace",
                 "path": "Lukamac/PlayPart-AI-Personal-Trainer",
                 "is_local": False,
-                "loaded": False
+                "loaded": False,
+                "version": None
             }
         }
         
-        # Modèle actuel
+        # Modèle par défaut (les sessions peuvent choisir le leur sans le modifier)
         self.current_model = ModelType.LOCAL_DISTILGPT2
         
+        # Routage automatique (model_type=auto)
+        self.model_router = ModelRouter()
+        
+        # Sessions de conversation (historique + cache KV)
+        settings = get_settings()
+        self.conversations = ConversationStore(
+            window_tokens=settings.conversation_window_tokens,
+            memory_budget_mb=settings.conversation_memory_mb,
+            max_sessions=settings.conversation_max_sessions
+        )
+        
         # Composants RAG
         self.embedding_model = None
+        self.embedding_backend = "torch"
+        self.pca_dim = 0
+        self.embedding_batcher = None
+        self.retrieval_cache = RetrievalCache(
+            max_embeddings=settings.retrieval_cache_embeddings,
+            max_results=settings.retrieval_cache_results
+        )
+        self.search_cursors = SearchCursorCache(
+            ttl_seconds=settings.search_cursor_ttl_seconds,
+            max_entries=settings.search_cursor_max
+        )
         self.faiss_index = None
+        self.document_embeddings = None
+        self.live_index = None
+        self.sharded_index = None
+        # Banque FAQ (chargée avec l'encodeur) ; le journal des questions sert à la construire
+        self.faq_bank = None
+        self.question_log = QuestionLog(Path(settings.question_log_path), max_bytes=settings.log_max_bytes,
+                                        backups=settings.log_backups)
+        self._corpus_lock = threading.RLock()
+        self.corpus_version = 0
+        self.index_build = None
+        # Version d'index active : clé du build local ou version de snapshot publiée
+        self.index_version = None
+        self.snapshot_watcher = None
+        self.snapshot_status = {'active_version': None, 'loaded_at': None, 'swaps': 0, 'last_error': None}
+        # Compteur de bascule (impair pendant une bascule) : les recherches concurrentes recommencent
+        self._swap_generation = 0
         self.rag_enabled = False
-        self.exercise_database = []
+        self.exercise_database = ExerciseStore.from_documents([])
+        self.metadata_index = MetadataIndex()
+        self.lexical_index = None
+        self.cascade_stats = {'lexical': 0, 'dense': 0, 'fusion': 0}
+        self.profile_stats = {'filtered': 0, 'relaxed': 0, 'unconstrained': 0}
         
-        # Statistiques
+        # Statistiques (compteurs) et histogrammes de latence par étape (/metrics)
+        self._stats_lock = threading.Lock()
+        self.metrics = ServiceMetrics()
         self.stats = {
             'total_requests': 0,
             'successful_requests': 0,
             'fallback_requests': 0,
+            'faq_answers': 0,
             'average_response_time': 0.0,
             'last_request_time': None,
             'model_usage': {model.value: 0 for model in ModelType}
@@ -83,6 +163,8 @@ class FitnessCoachService:
         self.generation_configs = {
             ModelType.LOCAL_DISTILGPT2: {
                 'max_new_tokens': 150,
+                'prompt_tokens': 400,  # Budget du prompt (gabarit + contexte), la question n'est jamais coupée
+                'context_candidates': 6,
                 'temperature': 0.7,
                 'do_sample': True,
                 'top_p': 0.9,
@@ -92,6 +174,8 @@ class FitnessCoachService:
             },
             ModelType.PLAYPART_TRAINER: {
                 'max_new_tokens': 60,
+                'prompt_tokens': 200,
+                'context_candidates': 3,
                 'temperature': 0.5,
                 'do_sample': True,
                 'top_p': 0.7,
@@ -105,6 +189,26 @@ class FitnessCoachService:
             }
         }
         
+        # Ordonnancement par coût attendu devant les workers de génération
+        generation_log = RotatingJsonlLog(Path(settings.generation_log_path), max_bytes=settings.log_max_bytes,
+                                          backups=settings.log_backups)
+        predictor = OutputLengthPredictor(
+            {model.value: cfg['max_new_tokens'] for model, cfg in self.generation_configs.items()},
+            decay=settings.scheduler_predictor_decay
+        )
+        learned = predictor.warm_start(generation_log.files())
+        if learned:
+            logger.info(f"📈 Prédicteur de coût initialisé sur {learned} générations")
+        self.scheduler = GenerationScheduler(
+            predictor,
+            workers=settings.scheduler_workers,
+            cost_weight=settings.scheduler_cost_weight,
+            log=generation_log
+        )
+        self.model_router.queue_depth_fn = self.scheduler.queued_for
+        self.scheduler.wait_observer = self.metrics.observe_queue_wait
+        self._register_metrics()
+        
         # Initialiser
         self._load_exercise_database()
         self._initialize_service()
@@ -131,6 +235,9 @@ class FitnessCoachService:
                 logger.info("📊 Chargement du système RAG...")
                 self._load_rag()
             
+            # Modifications du corpus faites à chaud avant le redémarrage
+            self._replay_corpus_changes()
+            
             # Charger tous les modèles disponibles
             logger.info("🤖 Chargement de tous les modèles...")
             
@@ -159,66 +266,75 @@ class FitnessCoachService:
             logger.error(f"❌ {error_msg}")
             self.initialization_error = error_msg
     
-    def _load_model(self, model_type: ModelType) -> bool:
-        """Charge un modèle spécifique avec gestion d'erreurs améliorée"""
+    def _load_model(self, model_type: ModelType, model_path: Optional[str] = None, version: Optional[str] = None) -> bool:
+        """Charge un modèle spécifique et publie la nouvelle version dans le registre"""
         try:
             config = self.model_configs[model_type]
             logger.info(f"🤖 Chargement {config['name']}...")
             
             if model_type == ModelType.LOCAL_DISTILGPT2:
-                success = self._load_local_distilgpt2()
+                loaded = self._load_local_distilgpt2(Path(model_path) if model_path else self.local_model_path)
             elif model_type == ModelType.PLAYPART_TRAINER:
-                success = self._load_playpart_trainer()
+                loaded = self._load_playpart_trainer()
             else:
                 logger.error(f"❌ Type de modèle inconnu: {model_type}")
                 return False
             
-            if success:
-                logger.info(f"✅ {config['name']} chargé avec succès")
-            else:
+            if loaded is None:
                 logger.error(f"❌ Échec du chargement de {config['name']}")
+                return False
+            
+            model, tokenizer, default_version = loaded
+            handle = self.model_registry.publish(model_type.value, model, tokenizer, version or default_version)
+            config["loaded"] = True
+            config["version"] = handle.version
+            if model_path:
+                config["path"] = str(model_path)
             
-            return success
+            logger.info(f"✅ {config['name']} chargé avec succès (version {handle.version})")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Erreur chargement {model_type}: {e}")
-            self.model_configs[model_type]["loaded"] = False
+            self.model_configs[model_type]["loaded"] = self.model_registry.is_loaded(model_type.value)
             return False
     
-    def _load_local_distilgpt2(self) -> bool:
+    def _on_model_freed(self, handle: ModelHandle):
+        """Libère la mémoire GPU d'une version retirée"""
+        if self.device.type == "cuda":
+            handle.model = None
+            torch.cuda.empty_cache()
+    
+    def _load_local_distilgpt2(self, model_path: Path):
         """Charge votre modèle DistilGPT-2 local"""
         try:
-            if not self.local_model_path.exists():
-                logger.warning(f"⚠️ Modèle local non trouvé: {self.local_model_path}")
-                return False
+            if not model_path.exists():
+                logger.warning(f"⚠️ Modèle local non trouvé: {model_path}")
+                return None
             
             # Tokenizer
-            tokenizer = AutoTokenizer.from_pretrained(str(self.local_model_path))
+            tokenizer = AutoTokenizer.from_pretrained(str(model_path))
             if tokenizer.pad_token is None:
                 tokenizer.pad_token = tokenizer.eos_token
                 tokenizer.pad_token_id = tokenizer.eos_token_id
             
             # Modèle
             model = AutoModelForCausalLM.from_pretrained(
-                str(self.local_model_path),
+                str(model_path),
                 torch_dtype=torch.float16 if self.device.type == "cuda" else torch.float32,
             )
             model.to(self.device)
             model.eval()
             
-            # Sauvegarder
-            self.models[ModelType.LOCAL_DISTILGPT2] = model
-            self.tokenizers[ModelType.LOCAL_DISTILGPT2] = tokenizer
-            self.model_configs[ModelType.LOCAL_DISTILGPT2]["loaded"] = True
-            
-            return True
+            # Version par défaut : nom du dossier + date de modification
+            version = f"{model_path.name}@{datetime.fromtimestamp(model_path.stat().st_mtime).strftime('%Y%m%d%H%M%S')}"
+            return model, tokenizer, version
             
         except Exception as e:
             logger.error(f"❌ Erreur DistilGPT-2 local: {e}")
-            self.model_configs[ModelType.LOCAL_DISTILGPT2]["loaded"] = False
-            return False
+            return None
     
-    def _load_playpart_trainer(self) -> bool:
+    def _load_playpart_trainer(self):
         """Charge le modèle PlayPart AI Personal Trainer avec gestion d'erreurs renforcée"""
         try:
             logger.info("📥 Téléchargement PlayPart AI Personal Trainer...")
@@ -229,10 +345,10 @@ class FitnessCoachService:
                 response = requests.get("https://huggingface.co", timeout=10)
                 if response.status_code != 200:
                     logger.error("❌ Pas de connexion à HuggingFace")
-                    return False
+                    return None
             except:
                 logger.error("❌ Problème de connexion réseau")
-                return False
+                return None
             
             # Tokenizer GPT-2 standard
             tokenizer = GPT2Tokenizer.from_pretrained(
@@ -257,22 +373,62 @@ class FitnessCoachService:
             model.to(self.device)
             model.eval()
             
-            # Sauvegarder
-            self.models[ModelType.PLAYPART_TRAINER] = model
-            self.tokenizers[ModelType.PLAYPART_TRAINER] = tokenizer
-            self.model_configs[ModelType.PLAYPART_TRAINER]["loaded"] = True
-            
-            return True
+            return model, tokenizer, "hub"
             
         except Exception as e:
             logger.error(f"❌ Erreur PlayPart Trainer: {e}")
-            self.model_configs[ModelType.PLAYPART_TRAINER]["loaded"] = False
-            return False
+            return None
     
-    def switch_model(self, model_type: ModelType) -> Dict[str, Any]:
-        """Change le modèle actuel"""
+    def reload_model(self, model_type: ModelType, model_path: Optional[str] = None,
+                     version: Optional[str] = None) -> Dict[str, Any]:
+        """Charge une nouvelle version en arrière-plan puis l'active atomiquement
+        
+        Lève ValueError si model_path sort du dossier des modèles (MODELS_DIR).
+        """
+        if model_path:
+            models_dir = Path(get_settings().models_dir).resolve()
+            resolved = Path(model_path).resolve()
+            if resolved != models_dir and models_dir not in resolved.parents:
+                raise ValueError(f"Chemin de modèle hors de {models_dir}")
+            model_path = str(resolved)
+        
+        with self._reload_lock:
+            status = self.reload_status.get(model_type.value)
+            if status and status['state'] == 'loading':
+                return {"success": False, "message": f"Rechargement de {model_type.value} déjà en cours", **status}
+            
+            status = {
+                'state': 'loading',
+                'requested_version': version,
+                'path': model_path or self.model_configs[model_type]['path'],
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None
+            }
+            self.reload_status[model_type.value] = status
+        
+        def _reload():
+            success = self._load_model(model_type, model_path=model_path, version=version)
+            with self._reload_lock:
+                status['state'] = 'active' if success else 'failed'
+                status['finished_at'] = datetime.now().isoformat()
+                status['active_version'] = self.model_registry.get_version(model_type.value)
+        
+        threading.Thread(target=_reload, name=f"reload-{model_type.value}", daemon=True).start()
+        
+        return {"success": True, "message": f"Rechargement de {model_type.value} lancé en arrière-plan", **status}
+    
+    def resolve_model(self, model_type: Optional[ModelType] = None, session_id: Optional[str] = None) -> ModelType:
+        """Modèle explicite, sinon celui de la session, sinon le modèle par défaut"""
+        if model_type:
+            return model_type
+        session_model = self.model_registry.get_session_model(session_id)
+        return ModelType(session_model) if session_model else self.current_model
+    
+    def switch_model(self, model_type: ModelType, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Change le modèle d'une session ; sans session, change le modèle par défaut de tous
+        les clients (réservé à l'administration, voir set_default_model)"""
         try:
-            logger.info(f"🔄 Changement vers {model_type}")
+            logger.info(f"🔄 Changement vers {model_type}" + (f" (session {session_id})" if session_id else " (défaut)"))
             
             # Vérifier si le modèle est déjà chargé
             if not self.model_configs[model_type]["loaded"]:
@@ -282,12 +438,15 @@ class FitnessCoachService:
                     return {
                         "success": False,
                         "message": f"Impossible de charger {model_type}",
-                        "current_model": self.current_model
+                        "current_model": self.resolve_model(session_id=session_id)
                     }
             
-            # Changer le modèle actuel
-            old_model = self.current_model
-            self.current_model = model_type
+            # Changer le modèle de la session, ou le modèle par défaut
+            old_model = self.resolve_model(session_id=session_id)
+            if session_id:
+                self.model_registry.set_session_model(session_id, model_type.value)
+            else:
+                self.current_model = model_type
             
             config = self.model_configs[model_type]
             
@@ -306,14 +465,18 @@ class FitnessCoachService:
             return {
                 "success": False,
                 "message": str(e),
-                "current_model": self.current_model
+                "current_model": self.resolve_model(session_id=session_id)
             }
     
-    def get_available_models(self) -> Dict[str, Any]:
+    def set_default_model(self, model_type: ModelType) -> Dict[str, Any]:
+        """Change le modèle par défaut des sessions sans modèle choisi"""
+        return self.switch_model(model_type, session_id=None)
+    
+    def get_available_models(self, session_id: Optional[str] = None) -> Dict[str, Any]:
         """Retourne la liste des modèles disponibles"""
         return {
             "models": self.model_configs,
-            "current_model": self.current_model,
+            "current_model": self.resolve_model(session_id=session_id),
             "device": str(self.device)
         }
     
@@ -322,124 +485,742 @@ class FitnessCoachService:
         try:
             logger.info("📊 Chargement RAG...")
             
-            self.embedding_model = SentenceTransformer(
-                "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+            settings = get_settings()
+            self.embedding_backend, self.pca_dim = self._select_encoder()
+            self.embedding_model = load_encoder(
+                settings.embedding_model, self.embedding_backend,
+                onnx_path=settings.embedding_onnx_path, threads=settings.embedding_threads
             )
+            logger.info(f"🔤 Encodeur: {encoder_id(settings.embedding_model, self.embedding_backend, self.pca_dim)}")
+            if settings.faq_bank_enabled:
+                self.faq_bank = FAQBankLoader(
+                    Path(settings.faq_bank_path),
+                    encoder_id(settings.embedding_model, self.embedding_backend, self.pca_dim),
+                    min_similarity=settings.faq_min_similarity,
+                    check_seconds=settings.faq_reload_seconds
+                )
+            self.retrieval_cache.invalidate(embeddings=True)
             
-            self._build_faiss_index()
+            # Requêtes concurrentes encodées par lots
+            self.embedding_batcher = EmbeddingBatcher(
+                lambda texts: self.embedding_model.encode(texts, batch_size=len(texts), show_progress_bar=False),
+                max_batch_size=settings.embed_batch_max_size,
+                max_wait_ms=settings.embed_batch_max_wait_ms
+            )
+            
+            # Snapshot publié dans le dossier partagé, sinon build local
+            if not self._load_current_snapshot():
+                self._build_faiss_index()
+            if self.live_index is None:
+                # Corpus initial vide : les documents ajoutés à chaud vont dans le delta
+                self.live_index = LiveIndex()
             
             self.rag_enabled = True
             logger.info("✅ RAG activé")
+            self._start_snapshot_watcher()
             
         except Exception as e:
             logger.error(f"⚠️ RAG non disponible: {e}")
             self.rag_enabled = False
     
+    def _select_encoder(self):
+        """Backend et PCA configurés, si un contrôle de parité de rappel les a validés"""
+        settings = get_settings()
+        backend, pca_dim = settings.embedding_backend, settings.rag_pca_dim
+        if backend == "torch" and not pca_dim:
+            return backend, pca_dim
+        
+        encoder_key = encoder_id(settings.embedding_model, backend, pca_dim)
+        if settings.embedding_parity_required and not parity_passed(Path(settings.index_dir), encoder_key):
+            logger.warning(
+                f"⚠️ Encodeur {encoder_key} sans contrôle de parité validé "
+                f"(scripts/check_encoder_parity.py) : encodeur d'origine utilisé"
+            )
+            return "torch", 0
+        return backend, pca_dim
+    
     def _load_exercise_database(self):
-        """Base d'exercices pour RAG - Adaptée pour les deux modèles"""
-        self.exercise_database = [
-            {
-                "id": 1,
-                "title": "Push-ups technique",
-                "content": "Perfect push-ups require proper form: hands shoulder-width apart, body straight, controlled movement down and up. Start with 3 sets of 8-12 reps for beginners. Focus on quality over quantity.",
-                "muscle_groups": ["chest", "triceps", "shoulders"],
-                "difficulty": "beginner",
-                "equipment": "none"
-            },
-            {
-                "id": 2,
-                "title": "Squat fundamentals", 
-                "content": "Squats target quads and glutes effectively. Feet shoulder-width apart, sit back like sitting in chair, keep back straight. 3 sets of 12-20 reps. Great compound exercise.",
-                "muscle_groups": ["quadriceps", "glutes", "calves"],
-                "difficulty": "beginner",
-                "equipment": "none"
-            },
-            {
-                "id": 3,
-                "title": "Upper body strength",
-                "content": "Build upper body with compound movements: push-ups, pull-ups, dips. Progressive overload principle applies. Focus on form first, then increase intensity.",
-                "muscle_groups": ["chest", "back", "arms", "shoulders"],
-                "difficulty": "intermediate", 
-                "equipment": "pull-up bar"
-            },
-            {
-                "id": 4,
-                "title": "Nutrition basics",
-                "content": "Post-workout nutrition: consume 20-25g protein within 30 minutes. Stay hydrated with 2-3L daily. Balanced diet with complex carbohydrates and healthy fats.",
-                "category": "nutrition",
-                "importance": "high"
-            },
-            {
-                "id": 5,
-                "title": "Recovery essentials",
-                "content": "Recovery is crucial for progress: 7-9 hours sleep nightly, post-workout stretching, active rest between intense sessions. Listen to your body signals.",
-                "category": "recovery",
-                "importance": "critical"
-            }
-        ]
+        """Ouvre le corpus d'exercices en colonnes (mmap) ; le reconstruit depuis JSONL / Parquet si besoin"""
+        settings = get_settings()
+        paths = resolve_corpus_paths(settings.corpus_path)
+        corpus_stats = {}
+        
+        if not paths:
+            logger.warning(f"⚠️ Aucun fichier de corpus trouvé: {settings.corpus_path}")
+            self.exercise_database = ExerciseStore.from_documents([])
+        else:
+            self.exercise_database = ExerciseStore.load_or_build(
+                Path(settings.exercise_store_dir),
+                paths,
+                lambda: iter_corpus(paths, batch_size=settings.rag_batch_size, stats=corpus_stats)
+            )
+        
+        self.metadata_index = MetadataIndex.from_store(self.exercise_database)
+        self._warm_profile_masks(self.metadata_index)
+        if settings.rag_cascade:
+            self.lexical_index = BM25Index.from_store(
+                self.exercise_database,
+                min_coverage=settings.lexical_min_coverage,
+                min_margin=settings.lexical_min_margin
+            )
+        
+        if corpus_stats:
+            logger.info(
+                f"📚 Corpus: {corpus_stats['valid']} documents ({len(paths)} fichiers, "
+                f"{corpus_stats['invalid']} invalides, {corpus_stats['duplicates']} doublons)"
+            )
     
     def _build_faiss_index(self):
-        """Construit index FAISS pour recherche sémantique"""
+        """Ouvre l'index persistant (mmap) du corpus ; ne ré-encode que les documents nouveaux ou modifiés"""
         if not self.embedding_model:
             return
         
+        if not self.exercise_database:
+            logger.warning("⚠️ Corpus vide : pas d'index FAISS")
+            return
+        
         try:
-            texts = [f"{item['title']} {item['content']}" for item in self.exercise_database]
-            embeddings = self.embedding_model.encode(texts, show_progress_bar=False)
+            settings = get_settings()
+            store = IndexStore(
+                Path(settings.index_dir),
+                encoder_id(settings.embedding_model, self.embedding_backend),
+                settings.rag_index_type,
+                pca_dim=self.pca_dim
+            )
+            index_factory, report_fn = index_builders(settings.rag_index_type, self.pca_dim)
             
-            dimension = embeddings.shape[1]
-            self.faiss_index = faiss.IndexFlatIP(dimension)
+            build = store.load_or_build(
+                self.exercise_database,
+                encode_fn=lambda texts: self.embedding_model.encode(texts, batch_size=64, show_progress_bar=False),
+                index_factory=index_factory,
+                batch_size=settings.rag_batch_size,
+                report_fn=report_fn,
+                doc_hashes=self.exercise_database.content_hashes()
+            )
+            
+            self.index_build = build
+            self.index_version = build.key
+            self.faiss_index = build.index
+            self.document_embeddings = build.embeddings
             
-            faiss.normalize_L2(embeddings)
-            self.faiss_index.add(embeddings.astype('float32'))
+            # Recherche répartie sur des processus locaux (un index mappé par shard)
+            base = build.index
+            if settings.rag_shards > 1:
+                if self.sharded_index is not None:
+                    self.sharded_index.close()
+                self.sharded_index = ShardedIndex.start(build, settings.rag_shards, settings.rag_index_type,
+                                                        self.pca_dim, timeout_ms=settings.rag_shard_timeout_ms)
+                base = self.sharded_index
+                logger.info(f"🧩 {settings.rag_shards} shards démarrés (délai {settings.rag_shard_timeout_ms} ms)")
+            self.live_index = LiveIndex(base, len(build.doc_ids), build.embeddings)
+            self.retrieval_cache.invalidate()
             
-            logger.info(f"✅ Index FAISS: {self.faiss_index.ntotal} documents")
+            logger.info(f"✅ Index FAISS: {self.faiss_index.ntotal} documents (build {build.key})")
             
         except Exception as e:
             logger.error(f"❌ Erreur FAISS: {e}")
             self.faiss_index = None
+            self.live_index = None
+    
+    # === SNAPSHOTS D'INDEX PARTAGÉS ===
+    
+    def _load_current_snapshot(self) -> bool:
+        """Active la version publiée au démarrage (sans ré-encoder le corpus localement)"""
+        settings = get_settings()
+        if not settings.index_snapshot_dir:
+            return False
+        manifest = read_current(Path(settings.index_snapshot_dir))
+        if manifest is None:
+            logger.info(f"ℹ️ Aucun snapshot publié dans {settings.index_snapshot_dir} : build local")
+            return False
+        try:
+            return self._activate_snapshot(manifest, replay_changes=False)
+        except Exception as e:
+            # Snapshot inutilisable (shards, fichiers) : le build local prend le relais
+            self.snapshot_status['last_error'] = f"{manifest.get('version')}: {e}"
+            logger.error(f"❌ Snapshot {manifest.get('version')} inutilisable, build local: {e}")
+            return False
+    
+    def _start_snapshot_watcher(self):
+        settings = get_settings()
+        if not settings.index_snapshot_dir or self.snapshot_watcher is not None:
+            return
+        self.snapshot_watcher = SnapshotWatcher(
+            Path(settings.index_snapshot_dir),
+            lambda manifest: self._activate_snapshot(manifest, replay_changes=True),
+            poll_interval=settings.index_snapshot_poll_seconds,
+            active_version=self.snapshot_status['active_version']
+        )
+        self.snapshot_watcher.start()
+        logger.info(f"👀 Surveillance des snapshots: {settings.index_snapshot_dir}")
     
-    def search_relevant_context(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Recherche contexte via RAG"""
-        if not self.rag_enabled or not self.faiss_index:
-            return self.exercise_database[:top_k]
+    def _activate_snapshot(self, manifest: Dict[str, Any], replay_changes: bool = True) -> bool:
+        """Charge une version publiée en arrière-plan puis bascule atomiquement l'index actif"""
+        settings = get_settings()
+        version = manifest['version']
+        expected_encoder = encoder_id(settings.embedding_model, self.embedding_backend)
+        if manifest.get('embedding_model') != expected_encoder or manifest.get('pca_dim', 0) != self.pca_dim:
+            self.snapshot_status['last_error'] = f"{version}: encodeur {manifest.get('embedding_model')} incompatible"
+            logger.warning(f"⚠️ Snapshot {version} ignoré : encodeur différent de {expected_encoder}")
+            return False
+        
+        directory = snapshot_directory(Path(settings.index_snapshot_dir), version)
+        store = ExerciseStore.open(directory / STORE_SUBDIR)
+        build = IndexStore(directory, expected_encoder, manifest.get('index_type', 'flat'),
+                           pca_dim=self.pca_dim).open_build(directory / INDEX_SUBDIR)
+        if store is None or build is None or store.content_hashes() != list(build.doc_hashes):
+            self.snapshot_status['last_error'] = f"{version}: snapshot illisible ou incohérent"
+            logger.error(f"❌ Snapshot {version} illisible ou incohérent")
+            return False
+        
+        # Tout est construit avant la bascule : les recherches continuent sur la version active
+        metadata_index = MetadataIndex.from_store(store)
+        self._warm_profile_masks(metadata_index)
+        lexical_index = None
+        if settings.rag_cascade:
+            lexical_index = BM25Index.from_store(
+                store, min_coverage=settings.lexical_min_coverage, min_margin=settings.lexical_min_margin
+            )
+        base, sharded_index = build.index, None
+        if settings.rag_shards > 1:
+            sharded_index = ShardedIndex.start(build, settings.rag_shards, manifest.get('index_type', 'flat'),
+                                               self.pca_dim, timeout_ms=settings.rag_shard_timeout_ms)
+            base = sharded_index
+        live_index = LiveIndex(base, len(build.doc_ids), build.embeddings)
         
+        # Modifications à chaud de ce réplica, réappliquées sur la nouvelle version avant qu'elle
+        # soit visible ; celles que le snapshot contient déjà ne sont ni ré-encodées ni gardées
+        changelog_path = Path(settings.corpus_changelog_path)
+        changes, offset = read_changes(changelog_path) if replay_changes else ([], 0)
+        final_state, covered = self._pending_changes(store, changes)
         try:
-            query_embedding = self.embedding_model.encode([query], show_progress_bar=False)
-            faiss.normalize_L2(query_embedding)
+            written, deleted = self._replay_into(store, metadata_index, lexical_index, live_index, final_state, covered)
+        except Exception:
+            if sharded_index is not None:
+                sharded_index.close()
+            raise
+        
+        with self._corpus_lock:
+            if replay_changes:
+                # Écritures reçues pendant la préparation (peu nombreuses) : sous le verrou, rien ne s'intercale
+                tail, _ = read_changes(changelog_path, offset)
+                tail_state, _ = self._pending_changes(store, tail)
+                tail_written, tail_deleted = self._replay_into(store, metadata_index, lexical_index, live_index,
+                                                               tail_state)
+                written, deleted = written + tail_written, deleted + tail_deleted
+                self._compact_changes(changelog_path, len(changes), final_state, covered, offset)
             
-            scores, indices = self.faiss_index.search(
-                query_embedding.astype('float32'), 
-                min(top_k, len(self.exercise_database))
+            previous_shards = self.sharded_index
+            self._swap_generation += 1
+            self.exercise_database = store
+            self.metadata_index = metadata_index
+            self.lexical_index = lexical_index
+            self.index_build = build
+            self.faiss_index = build.index
+            self.document_embeddings = build.embeddings
+            self.sharded_index = sharded_index
+            self.live_index = live_index
+            self.index_version = version
+            self._swap_generation += 1
+            self.retrieval_cache.invalidate()
+            if self.faq_bank is not None:
+                self.faq_bank.revalidate(store)
+            if written or deleted:
+                self.corpus_version += 1
+        
+        if previous_shards is not None:
+            # Laisse finir les recherches en cours sur les anciens shards
+            threading.Timer(30.0, previous_shards.close).start()
+        
+        self.snapshot_status.update({
+            'active_version': version,
+            'loaded_at': datetime.now().isoformat(),
+            'swaps': self.snapshot_status['swaps'] + 1,
+            'last_error': None
+        })
+        logger.info(f"🔄 Snapshot d'index actif: {version} ({store.live_count} documents, "
+                    f"{written + deleted} modifications locales réappliquées, {len(covered)} déjà publiées)")
+        return True
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings normalisés des requêtes (cache, puis micro-batch des requêtes manquantes)"""
+        cached = [self.retrieval_cache.get_embedding(query) for query in queries]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        
+        if missing:
+            vectors = np.ascontiguousarray(
+                self.embedding_batcher.encode_many([queries[i] for i in missing]), dtype=np.float32
             )
+            faiss.normalize_L2(vectors)
+            for row, i in enumerate(missing):
+                self.retrieval_cache.put_embedding(queries[i], vectors[row])
+                cached[i] = vectors[row]
+        
+        return np.ascontiguousarray(np.stack(cached), dtype=np.float32)
+    
+    def search_relevant_context(self, query: Optional[str], top_k: int = 3, nprobe: Optional[int] = None,
+                                ef_search: Optional[int] = None,
+                                filters: Optional[Dict[str, Any]] = None,
+                                profile: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """Recherche contexte via RAG, cohérente avec une bascule de snapshot concurrente
+        
+        Sans verrou : une recherche qui chevauche une bascule d'index est simplement refaite.
+        """
+        for _ in range(3):
+            generation = self._swap_generation
+            if generation % 2 == 0:
+                results = self._search_relevant_context(query, top_k, nprobe, ef_search, filters, profile)
+                if self._swap_generation == generation:
+                    return results
+            time.sleep(0.001)
+        return self._search_relevant_context(query, top_k, nprobe, ef_search, filters, profile)
+    
+    def _search_relevant_context(self, query: Optional[str], top_k: int = 3, nprobe: Optional[int] = None,
+                                 ef_search: Optional[int] = None,
+                                 filters: Optional[Dict[str, Any]] = None,
+                                 profile: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """Recherche contexte via RAG (nprobe / ef_search : réglages de l'index approché)
+        
+        Les filtres (difficulty, muscle_groups, equipment, category) s'appliquent pendant la
+        recherche vectorielle ; sans requête, seuls les filtres sont évalués (pas d'encodage).
+        Les contraintes du profil (voir profile_filters) restreignent en plus les candidats.
+        Les classements sont mis en cache (partagé entre génération et recherche d'exercices).
+        """
+        candidates = self.metadata_index.match(filters)
+        profile_key = ()
+        if profile:
+            candidates, profile_key = self._apply_profile(candidates, profile)
+        if candidates is not None and not candidates.any():
+            return []
+        
+        dense_available = self.rag_enabled and self.live_index is not None and self.live_index.ntotal > 0
+        if not query or (not dense_available and self.lexical_index is None):
+            return self._unranked(candidates, top_k)
+        
+        try:
+            cache_key = self.retrieval_cache.result_key(
+                query, top_k, filters,
+                index_version=f"{self.index_version or '-'}:{self.corpus_version}",
+                nprobe=nprobe, ef_search=ef_search, profile=profile_key
+            )
+            ranked = self.retrieval_cache.get_results(cache_key)
+            
+            if ranked is None:
+                ranked, degraded = self._cascade_rank(query, top_k, candidates, nprobe, ef_search, dense_available)
+                # Un résultat partiel (shard sans réponse) n'est pas mis en cache
+                if not degraded:
+                    self.retrieval_cache.put_results(cache_key, ranked)
             
-            relevant_docs = []
-            for i, idx in enumerate(indices[0]):
-                if idx >= 0 and idx < len(self.exercise_database):
-                    doc = self.exercise_database[idx].copy()
-                    doc['relevance_score'] = float(scores[0][i])
-                    relevant_docs.append(doc)
+            if not ranked and not dense_available:
+                return self._unranked(candidates, top_k)
             
-            return [doc for doc in relevant_docs if doc['relevance_score'] > 0.2]
+            # Vues sur le store : pas de copie des documents
+            return [self.exercise_database[idx].with_values(**self._score_fields(dense, lexical))
+                    for idx, dense, lexical in ranked]
             
         except Exception as e:
             logger.error(f"❌ Erreur recherche: {e}")
-            return self.exercise_database[:top_k]
+            return self._unranked(candidates, top_k)
     
-    def _create_prompt(self, question: str, context_docs: List[Dict], model_type: ModelType) -> str:
-        """Crée prompt optimisé selon le modèle"""
-        # Contexte RAG simplifié
-        context_text = ""
-        if context_docs:
-            # Pour PlayPart, utiliser seulement le meilleur document et le raccourcir
-            if model_type == ModelType.PLAYPART_TRAINER:
-                best_doc = context_docs[0]
-                context_text = f"{best_doc['title']}: {best_doc['content'][:60]}..."
+    def _apply_profile(self, candidates: Optional[np.ndarray],
+                       profile: Dict[str, Any]) -> Tuple[Optional[np.ndarray], Tuple]:
+        """Candidats compatibles avec le profil ; les contraintes sont relâchées si aucun ne l'est
+        
+        Retourne (masque, signature des contraintes retenues pour la clé de cache).
+        """
+        for step, constraints in enumerate(relaxations(profile)):
+            admissible = self.metadata_index.admissible(constraints)
+            if admissible is None:
+                restricted = candidates
+            elif candidates is None:
+                restricted = admissible
             else:
-                context_parts = []
-                for doc in context_docs[:2]:
-                    context_parts.append(f"- {doc['title']}: {doc['content'][:80]}...")
-                context_text = "\n".join(context_parts)
+                # Un ajout concurrent peut agrandir le MetadataIndex entre les deux lectures
+                size = min(len(candidates), len(admissible))
+                restricted = candidates[:size] & admissible[:size]
+            
+            if restricted is None or restricted.any():
+                with self._stats_lock:
+                    decision = 'unconstrained' if not constraints else ('relaxed' if step else 'filtered')
+                    self.profile_stats[decision] += 1
+                return restricted, cache_signature(constraints)
+        return candidates, ()
+    
+    def _warm_profile_masks(self, metadata_index: MetadataIndex):
+        """Précalcule les masques des profils les plus courants (niveau x poids du corps)"""
+        for constraints in common_profiles():
+            metadata_index.admissible(constraints)
+    
+    def get_profile_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            decisions = dict(self.profile_stats)
+        return {'decisions': decisions, 'masks': self.metadata_index.admissible_stats()}
+    
+    def _cascade_rank(self, query: str, top_k: int, candidates: Optional[np.ndarray],
+                      nprobe: Optional[int], ef_search: Optional[int], dense_available: bool) -> Tuple[List[tuple], bool]:
+        """Cascade : BM25 d'abord, recherche dense seulement si le résultat lexical est faible ou ambigu
+        
+        Retourne ([(position, cosinus dense, part de la requête couverte)], dégradé) ; chaque score
+        vaut None quand l'étape correspondante n'a pas tourné. Quand les deux tournent, l'ordre est
+        celui de la fusion par rangs réciproques.
+        """
+        if self.lexical_index is None:
+            dense_ranked, degraded = self._rank(query, top_k, candidates, nprobe, ef_search)
+            return [(position, score, None) for position, score in dense_ranked], degraded
+        
+        lexical = self.lexical_index.search(query, top_k, mask=candidates)
+        lexical_ranked = [(position, lexical['coverages'][position]) for position, _ in lexical['hits']]
+        
+        if lexical['confident'] or not dense_available:
+            self._record_cascade('lexical')
+            return [(position, None, coverage) for position, coverage in lexical_ranked], False
+        
+        dense_ranked, degraded = self._rank(query, top_k, candidates, nprobe, ef_search)
+        if not lexical_ranked:
+            self._record_cascade('dense')
+            return [(position, score, None) for position, score in dense_ranked], degraded
+        
+        self._record_cascade('fusion')
+        dense_scores, coverages = dict(dense_ranked), dict(lexical_ranked)
+        return [
+            (position, dense_scores.get(position), coverages.get(position))
+            for position, _ in reciprocal_rank_fusion([lexical_ranked, dense_ranked], top_k)
+        ], degraded
+    
+    @staticmethod
+    def _score_fields(dense: Optional[float], lexical: Optional[float]) -> Dict[str, float]:
+        """relevance_score : cosinus dense ; lexical_score : part de la requête couverte (BM25)"""
+        fields = {}
+        if dense is not None:
+            fields['relevance_score'] = dense
+        if lexical is not None:
+            fields['lexical_score'] = lexical
+        return fields
+    
+    def _record_cascade(self, decision: str):
+        with self._stats_lock:
+            self.cascade_stats[decision] += 1
+    
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        """Décisions de la cascade et part des encodages denses évités"""
+        with self._stats_lock:
+            decisions = dict(self.cascade_stats)
+        total = sum(decisions.values())
+        return {
+            'enabled': self.lexical_index is not None,
+            'decisions': decisions,
+            'dense_calls_avoided': decisions['lexical'],
+            'dense_avoided_ratio': round(decisions['lexical'] / total, 4) if total else 0.0,
+            'lexical_index': self.lexical_index.get_stats() if self.lexical_index else {}
+        }
+    
+    def _unranked(self, candidates: Optional[np.ndarray], top_k: int) -> List[Dict]:
+        """Documents satisfaisant les filtres, dans l'ordre du corpus"""
+        if candidates is None:
+            return list(islice(self.exercise_database, top_k))
+        return [self.exercise_database[idx] for idx in np.flatnonzero(candidates)[:top_k]]
+    
+    def _rank(self, query: str, top_k: int, candidates: Optional[np.ndarray],
+              nprobe: Optional[int], ef_search: Optional[int]) -> Tuple[List[tuple], bool]:
+        """Classement (position, score) des documents, restreint aux candidats filtrés
+        
+        Retourne (classement, dégradé) : dégradé si un shard n'a pas répondu à temps.
+        """
+        query_embedding = self.encode_queries([query])
+        degraded = False
+        
+        if candidates is not None and candidates.sum() <= EXACT_FILTER_MAX_CANDIDATES:
+            # Filtre sélectif : score exact des seuls candidats (embeddings mappés en mémoire)
+            rows = np.flatnonzero(candidates)
+            scores = self.live_index.vectors(rows) @ query_embedding[0]
+            order = np.argsort(-scores)[:top_k]
+            hits = [(int(rows[i]), float(scores[i])) for i in order]
+        else:
+            scores, indices, degraded = self.live_index.search(
+                query_embedding,
+                min(top_k, len(self.exercise_database)),
+                nprobe=nprobe,
+                ef_search=ef_search,
+                mask=candidates,
+                rerank=get_settings().rag_rerank_factor
+            )
+            hits = [
+                (int(idx), float(scores[0][i])) for i, idx in enumerate(indices[0])
+                if idx >= 0 and idx < len(self.exercise_database)
+            ]
+        
+        return [(idx, score) for idx, score in hits if score > 0.2], degraded
+    
+    def search_exercises(self, query: Optional[str], top_k: int = 5, difficulty: Optional[str] = None,
+                         muscle_groups: Optional[List[str]] = None, equipment: Optional[str] = None,
+                         category: Optional[str] = None, nprobe: Optional[int] = None,
+                         ef_search: Optional[int] = None) -> List[Dict]:
+        """Recherche d'exercices avec filtres (requête optionnelle si au moins un filtre)"""
+        filters = {
+            'difficulty': difficulty,
+            'muscle_groups': muscle_groups,
+            'equipment': equipment,
+            'category': category
+        }
+        return self.search_relevant_context(query, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                            filters=filters)
+    
+    def search_exercises_page(self, query: Optional[str], page_size: int = 5, cursor: Optional[str] = None,
+                              difficulty: Optional[str] = None, muscle_groups: Optional[List[str]] = None,
+                              equipment: Optional[str] = None, category: Optional[str] = None,
+                              nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                              lazy: bool = False) -> Dict[str, Any]:
+        """Page de résultats : la première recherche ne classe que page_size + 1 documents et ouvre
+        un curseur ; le classement profond (SEARCH_MAX_CANDIDATES) n'est calculé qu'au premier suivi
+        du curseur, les pages suivantes sont découpées sans relancer la recherche
+        
+        lazy=True : 'exercises' est un itérateur, chaque ligne n'est décodée du store qu'à sa lecture
+        (réponse NDJSON). Lève CursorError si le curseur est inconnu, expiré ou antérieur à une
+        modification de l'index.
+        """
+        store = self.exercise_database
+        version = f"{self.index_version or '-'}:{self.corpus_version}"
+        if cursor:
+            hits, next_cursor, total = self.search_cursors.page(cursor, page_size, version)
+        else:
+            def rank(top_k: int) -> List[tuple]:
+                documents = self.search_exercises(
+                    query, top_k=top_k, difficulty=difficulty, muscle_groups=muscle_groups,
+                    equipment=equipment, category=category, nprobe=nprobe, ef_search=ef_search
+                )
+                return [(document.position, document.get('relevance_score'), document.get('lexical_score'))
+                        for document in documents]
+            
+            hits = rank(page_size + 1)
+            total = len(hits)
+            hits, next_cursor = self.search_cursors.open(
+                hits, page_size, version,
+                expand=lambda: rank(max(page_size + 1, get_settings().search_max_candidates))
+            )
+        
+        exercises = self._iter_exercises(store, hits)
+        return {'exercises': exercises if lazy else list(exercises), 'next_cursor': next_cursor,
+                'total_candidates': total}
+    
+    def _iter_exercises(self, store: ExerciseStore, hits: List[tuple]) -> Iterator[Any]:
+        """Lignes du store (positions classées), avec leurs scores"""
+        for position, dense, lexical in hits:
+            yield store[position].with_values(**self._score_fields(dense, lexical))
+    
+    # === MISE À JOUR DU CORPUS À CHAUD ===
+    
+    def _encode_documents(self, documents: List[Dict], live_index: Optional[LiveIndex]) -> Optional[np.ndarray]:
+        """Embeddings normalisés des documents (None si le RAG est inactif)"""
+        if not self.rag_enabled or live_index is None:
+            return None
+        vectors = np.ascontiguousarray(
+            self.embedding_model.encode([document_text(doc) for doc in documents],
+                                        batch_size=64, show_progress_bar=False),
+            dtype=np.float32
+        )
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    def _corpus_changed(self):
+        """Invalide les caches dépendant du corpus (les facettes suivent le MetadataIndex)"""
+        self.corpus_version += 1
+        self.retrieval_cache.invalidate()
+        if self.faq_bank is not None:
+            self.faq_bank.revalidate(self.exercise_database)
+    
+    def upsert_documents(self, raw_documents: List[Dict[str, Any]], log: bool = True,
+                         mode: str = 'upsert') -> Dict[str, Any]:
+        """Ajoute ou remplace des documents ; seuls leurs vecteurs sont (ré)encodés
+        
+        Lève CorpusValidationError si un document est invalide, DocumentConflictError si
+        mode='add' et qu'un document existe déjà (ou mode='update' et qu'il est absent) ;
+        dans les deux cas rien n'est appliqué.
+        """
+        documents = [validate_document(raw, f"document {i + 1}") for i, raw in enumerate(raw_documents)]
+        # Dernière version de chaque id dans le lot
+        documents = list({doc['id']: doc for doc in documents}.values())
+        vectors = self._encode_documents(documents, self.live_index)
+        
+        with self._corpus_lock:
+            # Vérifié sous le verrou : un ajout concurrent du même id ne peut pas s'intercaler
+            for document in documents:
+                exists = self.exercise_database.position(document['id']) is not None
+                if mode == 'add' and exists:
+                    raise DocumentConflictError(f"Document déjà présent: {document['id']}")
+                if mode == 'update' and not exists:
+                    raise DocumentConflictError(f"Document introuvable: {document['id']}")
+            
+            added, updated = self._apply_upserts(self.exercise_database, self.metadata_index, self.lexical_index,
+                                                 self.live_index, documents, vectors)
+            if log:
+                append_changes(get_settings().corpus_changelog_path,
+                               [{'op': 'upsert', 'document': doc} for doc in documents])
+            self._corpus_changed()
+        
+        return {'added': added, 'updated': updated, 'corpus_version': self.corpus_version}
+    
+    def delete_documents(self, doc_ids: List[Any], log: bool = True) -> Dict[str, Any]:
+        """Supprime des documents (vecteurs masqués, facettes décrémentées)"""
+        with self._corpus_lock:
+            deleted, missing = self._apply_deletions(self.exercise_database, self.metadata_index, self.lexical_index,
+                                                     self.live_index, doc_ids)
+            if deleted:
+                if log:
+                    append_changes(get_settings().corpus_changelog_path,
+                                   [{'op': 'delete', 'id': doc_id} for doc_id in deleted])
+                self._corpus_changed()
+        
+        return {'deleted': deleted, 'missing': missing, 'corpus_version': self.corpus_version}
+    
+    def resolve_document_id(self, raw_id: str) -> Any:
+        """Identifiant de document depuis un chemin d'URL (les ids peuvent être entiers)"""
+        if self.exercise_database.position(raw_id) is None and raw_id.lstrip('-').isdigit():
+            return int(raw_id)
+        return raw_id
+    
+    @staticmethod
+    def _apply_upserts(store: ExerciseStore, metadata_index: MetadataIndex, lexical_index: Optional[BM25Index],
+                       live_index: Optional[LiveIndex], documents: List[Dict[str, Any]],
+                       vectors: Optional[np.ndarray]) -> Tuple[List[Any], List[Any]]:
+        """Écrit des documents validés dans un état du corpus (actif, ou snapshot en préparation)
+        ; retourne (ids ajoutés, ids modifiés)"""
+        added, updated = [], []
+        positions, previous_versions = [], []
+        for document in documents:
+            position = store.position(document['id'])
+            if position is None:
+                position = store.append(document)
+                previous_versions.append(None)
+                added.append(document['id'])
+            else:
+                previous_versions.append(dict(store[position]))
+                store.replace(position, document)
+                updated.append(document['id'])
+            positions.append(position)
+        
+        # Vecteurs avant facettes : un filtre ne retient jamais une position sans vecteur
+        if vectors is not None:
+            live_index.upsert(positions, vectors)
+        for position, previous, document in zip(positions, previous_versions, documents):
+            if previous is None:
+                metadata_index.add(position, document)
+            else:
+                metadata_index.update(position, previous, document)
+            if lexical_index is not None:
+                lexical_index.add(position, document)
+        return added, updated
+    
+    @staticmethod
+    def _apply_deletions(store: ExerciseStore, metadata_index: MetadataIndex, lexical_index: Optional[BM25Index],
+                         live_index: Optional[LiveIndex], doc_ids: List[Any]) -> Tuple[List[Any], List[Any]]:
+        """Retire des documents d'un état du corpus ; retourne (ids supprimés, ids absents)"""
+        deleted, missing, positions = [], [], []
+        for doc_id in doc_ids:
+            position = store.position(doc_id)
+            if position is None:
+                missing.append(doc_id)
+                continue
+            metadata_index.remove(position, dict(store[position]))
+            if lexical_index is not None:
+                lexical_index.remove(position)
+            store.delete(position)
+            positions.append(position)
+            deleted.append(doc_id)
+        if positions and live_index is not None:
+            live_index.delete(positions)
+        return deleted, missing
+    
+    @staticmethod
+    def _pending_changes(store: ExerciseStore, changes: List[Dict[str, Any]]):
+        """État final de chaque document modifié (None = supprimé) et ids dont le store
+        contient déjà cet état (modification reprise par le corpus publié)"""
+        final_state: Dict[Any, Optional[Dict[str, Any]]] = {}
+        for change in changes:
+            if change.get('op') == 'upsert':
+                final_state[change['document']['id']] = change['document']
+            elif change.get('op') == 'delete':
+                final_state[change['id']] = None
+        
+        covered = set()
+        for doc_id, document in final_state.items():
+            position = store.position(doc_id)
+            if document is None:
+                if position is None:
+                    covered.add(doc_id)
+            elif position is not None and store.content_hash_at(position) == content_hash(document):
+                covered.add(doc_id)
+        return final_state, covered
+    
+    def _replay_into(self, store: ExerciseStore, metadata_index: MetadataIndex, lexical_index: Optional[BM25Index],
+                     live_index: Optional[LiveIndex], final_state: Dict[Any, Optional[Dict[str, Any]]],
+                     covered=()) -> Tuple[int, int]:
+        """Applique les modifications non couvertes ; retourne (documents écrits, supprimés)"""
+        upserts = [doc for doc_id, doc in final_state.items() if doc is not None and doc_id not in covered]
+        deletions = [doc_id for doc_id, doc in final_state.items() if doc is None and doc_id not in covered]
+        for batch in iter_batches(upserts, get_settings().rag_batch_size):
+            self._apply_upserts(store, metadata_index, lexical_index, live_index, batch,
+                                self._encode_documents(batch, live_index))
+        if deletions:
+            self._apply_deletions(store, metadata_index, lexical_index, live_index, deletions)
+        return len(upserts), len(deletions)
+    
+    @staticmethod
+    def _compact_changes(path: Path, read_count: int, final_state: Dict[Any, Optional[Dict[str, Any]]], covered,
+                         offset: int):
+        """Réécrit le journal : état final des modifications lues (read_count opérations jusqu'à
+        offset) moins celles couvertes par le corpus chargé, puis les opérations écrites depuis
+        (appelé sous _corpus_lock : aucune écriture ne s'intercale)"""
+        kept = [{'op': 'upsert', 'document': doc} if doc is not None else {'op': 'delete', 'id': doc_id}
+                for doc_id, doc in final_state.items() if doc_id not in covered]
+        if len(kept) == read_count:
+            return
+        tail, _ = read_changes(path, offset)
+        rewrite_changes(path, kept + tail)
+    
+    def _replay_corpus_changes(self):
+        """Réapplique le journal des modifications à chaud sur le corpus chargé (démarrage)"""
+        path = Path(get_settings().corpus_changelog_path)
+        with self._corpus_lock:
+            changes, offset = read_changes(path)
+            if not changes:
+                return
+            final_state, covered = self._pending_changes(self.exercise_database, changes)
+            written, deleted = self._replay_into(self.exercise_database, self.metadata_index, self.lexical_index,
+                                                 self.live_index, final_state, covered)
+            if written or deleted:
+                self._corpus_changed()
+            self._compact_changes(path, len(changes), final_state, covered, offset)
+        
+        logger.info(f"📝 Journal du corpus rejoué: {written} documents écrits, {deleted} supprimés "
+                    f"({len(covered)} déjà dans le corpus chargé, retirés du journal)")
+    
+    def _context_prefix(self, doc: Dict, model_type: ModelType) -> str:
+        return f"{doc['title']}: " if model_type == ModelType.PLAYPART_TRAINER else f"- {doc['title']}: "
+    
+    def _pack_context(self, question: str, context_docs: List[Dict], model_type: ModelType, tokenizer) -> List[Dict]:
+        """Documents entiers les mieux classés tenant dans le budget de tokens du modèle"""
+        if not context_docs:
+            return []
+        
+        def count_tokens(text: str) -> int:
+            return len(tokenizer.encode(text, add_special_tokens=False))
+        
+        # Budget restant une fois le gabarit et la question comptés (séparateur de contexte compris)
+        base_tokens = count_tokens(self._create_prompt(question, [], model_type)) + 2
+        budget = self.generation_configs[model_type]['prompt_tokens'] - base_tokens
+        serving_tokenizer = tokenizer_id(getattr(tokenizer, 'name_or_path', None))
+        packed, used = pack_context(
+            context_docs, budget,
+            lambda doc: document_cost(doc, self._context_prefix(doc, model_type), count_tokens, serving_tokenizer)
+        )
+        logger.debug(f"📦 Contexte: {len(packed)}/{len(context_docs)} documents, {used}/{max(budget, 0)} tokens")
+        return packed
+    
+    def _create_prompt(self, question: str, context_docs: List[Dict], model_type: ModelType) -> str:
+        """Crée prompt optimisé selon le modèle (documents déjà sélectionnés par _pack_context)"""
+        context_text = "\n".join(
+            f"{self._context_prefix(doc, model_type)}{doc['content']}" for doc in context_docs
+        )
         
         # Prompts spécifiques par modèle
         if model_type == ModelType.LOCAL_DISTILGPT2:
@@ -562,87 +1343,268 @@ Answer:"""
         
         return "Focus on progressive training with proper form. Start with basic exercises and gradually increase intensity."
     
-    def generate_advice(self, question: str, user_profile: Optional[Dict] = None, model_type: Optional[ModelType] = None) -> Dict[str, Any]:
-        """Génère conseil avec le modèle sélectionné"""
-        start_time = datetime.now()
-        self.stats['total_requests'] += 1
+    def plan_request(self, question: str, model_type: Optional[ModelType] = None, session_id: Optional[str] = None,
+                     auto_route: bool = False):
+        """Résout le modèle cible d'une requête ; retourne (modèle, décision de routage)"""
+        routing = None
+        if auto_route:
+            routing = self.route_model(question)
+            model_type = ModelType(routing['selected_model'])
+        return self.resolve_model(model_type, session_id), routing
+    
+    def estimate_request_tokens(self, question: str, model_type: ModelType) -> Tuple[int, int]:
+        """Estimation rapide (tokens de la question, tokens du prompt) : le contexte remplit le
+        budget du modèle, dépassé seulement par une question plus longue que lui
         
-        # Utiliser le modèle spécifié ou le modèle actuel
-        target_model = model_type or self.current_model
+        Seule la taille de la question varie d'une requête à l'autre : c'est elle qui sert à
+        prédire la longueur générée, celle du prompt au coût du pré-remplissage.
+        """
+        overhead = 40 if model_type == ModelType.PLAYPART_TRAINER else 90
+        budget = self.generation_configs[model_type]['prompt_tokens']
+        try:
+            with self.model_registry.acquire(model_type.value) as handle:
+                question_tokens = len(handle.tokenizer.encode(question))
+        except KeyError:
+            question_tokens = len(question.split()) * 2
+        return question_tokens, max(budget, question_tokens + overhead)
+    
+    def submit_advice(self, question: str, user_profile: Optional[Dict] = None, model_type: Optional[ModelType] = None,
+                      auto_route: bool = False, session_id: Optional[str] = None,
+                      conversation: bool = False) -> Future:
+        """Met la génération en file (ordonnancement par coût attendu) ; retourne un Future"""
+        target_model, routing = self.plan_request(question, model_type, session_id, auto_route)
+        
+        # Question fréquente : réponse de la banque, sans passer par la file de génération. En
+        # conversation, seulement au premier tour (les suivants dépendent de l'historique) ; une
+        # réponse de la banque n'entre pas dans la session, le tour suivant repart d'un prompt complet
+        turn = self.conversations.turn_count(session_id) if conversation else 0
+        answer = self.answer_from_faq(question, target_model, user_profile) if turn == 0 else None
+        # Chaque question est journalisée, servie ou non : le journal alimente la reconstruction de la banque
+        self.scheduler.log(self.question_log, QuestionLog.entry(
+            question, target_model.value, answer['faq_cluster'] if answer else None, turn=turn
+        ))
+        if answer is not None:
+            answer['routing'] = routing
+            future = Future()
+            future.set_result(answer)
+            return future
+        
+        question_tokens, prompt_tokens = self.estimate_request_tokens(question, target_model)
+        
+        def _run():
+            result = self.generate_advice(question, user_profile, target_model,
+                                          session_id=session_id, conversation=conversation)
+            result['routing'] = routing
+            return result
+        
+        return self.scheduler.submit(_run, target_model.value, question_tokens, prompt_tokens)
+    
+    def answer_from_faq(self, question: str, target_model: ModelType,
+                        user_profile: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """Réponse précalculée de la question fréquente la plus proche, ou None
+        
+        Une réponse n'est servie que si ses documents sources restent compatibles
+        avec le profil de l'utilisateur.
+        """
+        timings = StageTimings()
+        entry = None
+        bank = self.faq_bank.current(self.exercise_database) if self.faq_bank and self.rag_enabled else None
+        if bank is not None:
+            try:
+                constraints = profile_constraints(user_profile)
+                admissible_mask = self.metadata_index.admissible(constraints)
+                
+                def admissible(candidate: Dict[str, Any]) -> bool:
+                    if admissible_mask is None:
+                        return True
+                    for doc_id, _ in candidate['sources']:
+                        position = self.exercise_database.position(doc_id)
+                        if position is None or position >= len(admissible_mask) or not admissible_mask[position]:
+                            return False
+                    return True
+                
+                with timings.stage('faq_lookup'):
+                    found = bank.lookup(self.encode_queries([question])[0], target_model.value,
+                                        self.faq_bank.min_similarity, admissible)
+                if found is not None:
+                    entry = found[0]
+            except Exception as e:
+                logger.error(f"❌ Erreur banque FAQ: {e}")
+            self.faq_bank.record(target_model.value, entry is not None)
+        
+        if entry is None:
+            return None
+        
+        answer = entry['answers'][target_model.value]
+        with self._stats_lock:
+            self.stats['total_requests'] += 1
+            self.stats['faq_answers'] += 1
+        self.metrics.record_request(target_model.value, timings, 'faq')
+        return {
+            'response': answer['response'],
+            'sources': answer['source_titles'],
+            'context_used': bool(answer['source_titles']),
+            'model_used': target_model.value,
+            'model_name': self.model_configs[target_model]["name"],
+            'response_time': time.perf_counter() - timings.start,
+            'confidence': 'high' if answer['source_titles'] else 'medium',
+            'rag_enabled': self.rag_enabled,
+            'model_version': answer.get('model_version'),
+            'faq_cluster': entry['cluster']
+        }
+    
+    def route_model(self, question: str) -> Dict[str, Any]:
+        """Choisit automatiquement le modèle adapté le moins coûteux"""
+        loaded = [m.value for m, config in self.model_configs.items() if config["loaded"]]
+        return self.model_router.route(question, loaded or [self.current_model.value])
+    
+    def generate_advice(self, question: str, user_profile: Optional[Dict] = None, model_type: Optional[ModelType] = None,
+                        auto_route: bool = False, session_id: Optional[str] = None,
+                        conversation: bool = False) -> Dict[str, Any]:
+        """Génère conseil avec le modèle sélectionné (ou routé automatiquement)
+
+        Avec conversation=True et un session_id, les tours précédents de la session
+        sont conservés côté serveur (cache KV compris).
+        """
+        # Utiliser le modèle spécifié (ou routé), celui de la session ou le modèle par défaut
+        target_model, routing = self.plan_request(question, model_type, session_id, auto_route)
+        
+        self.model_router.request_started(target_model.value)
+        timings = StageTimings()
+        result = None
+        try:
+            result = self._generate_advice(question, user_profile, target_model, timings,
+                                           session_id=session_id if conversation else None)
+            return result
+        finally:
+            latency = result['response_time'] if result and not result['model_used'].startswith('fallback_') else None
+            self.model_router.request_finished(target_model.value, latency)
+            self._record_metrics(target_model, timings, result)
+            if result is not None:
+                result['routing'] = routing
+    
+    def _register_metrics(self):
+        """Compteurs et jauges lus à chaque exposition /metrics (aucun coût sur le chemin des requêtes)"""
+        models = [model.value for model in ModelType]
+        
+        def stat_counter(key: str):
+            return lambda: [({}, self.stats[key])]
+        
+        self.metrics.register('coach_requests_total', 'counter', "Requêtes de conseil reçues",
+                              stat_counter('total_requests'))
+        self.metrics.register('coach_fallback_requests_total', 'counter', "Requêtes servies par une réponse de secours",
+                              stat_counter('fallback_requests'))
+        self.metrics.register('coach_faq_answers_total', 'counter', "Requêtes servies par la banque FAQ",
+                              stat_counter('faq_answers'))
+        self.metrics.register('coach_generation_queue_depth', 'gauge', "Générations en attente par modèle",
+                              lambda: [({'model': model}, self.scheduler.queued_for(model)) for model in models])
+        self.metrics.register('coach_model_loaded', 'gauge', "Modèle chargé (1) ou non (0)",
+                              lambda: [({'model': model.value}, int(config['loaded']))
+                                       for model, config in self.model_configs.items()])
+        
+        def cache_samples():
+            stats = self.retrieval_cache.get_stats()
+            return [({'cache': cache, 'result': result}, stats[cache][result])
+                    for cache in ('embeddings', 'results') for result in ('hits', 'misses')]
+        
+        self.metrics.register('coach_retrieval_cache_lookups_total', 'counter', "Accès aux caches de recherche",
+                              cache_samples)
+    
+    def _record_metrics(self, target_model: ModelType, timings: StageTimings, result: Optional[Dict[str, Any]]):
+        """Étapes de la requête dans les histogrammes /metrics"""
+        if result is None:
+            outcome = 'error'
+        elif result['model_used'].startswith('fallback_'):
+            outcome = 'fallback'
+        else:
+            outcome = 'generated'
+        self.metrics.record_request(target_model.value, timings, outcome,
+                                    result.get('generated_tokens') if result else None)
+    
+    def _generate_advice(self, question: str, user_profile: Optional[Dict], target_model: ModelType,
+                         timings: StageTimings, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Génère conseil avec le modèle donné"""
+        start_time = datetime.now()
+        with self._stats_lock:
+            self.stats['total_requests'] += 1
         
         try:
-            # Recherche contexte RAG (moins pour PlayPart)
-            context_count = 1 if target_model == ModelType.PLAYPART_TRAINER else 2
-            relevant_docs = self.search_relevant_context(question, top_k=context_count)
+            # Candidats de contexte RAG, ensuite sélectionnés selon le budget de tokens du modèle
+            context_count = self.generation_configs[target_model]['context_candidates']
+            with timings.stage('retrieval'):
+                relevant_docs = self.search_relevant_context(question, top_k=context_count,
+                                                             profile=profile_constraints(user_profile))
             
             # Vérifier modèle
-            if not self.model_configs[target_model]["loaded"]:
+            if not self.model_registry.is_loaded(target_model.value):
                 return self._fallback_response(question, relevant_docs, target_model)
             
             # Statistiques modèle
-            self.stats['model_usage'][target_model.value] += 1
-            
-            # Récupérer modèle et tokenizer
-            model = self.models[target_model]
-            tokenizer = self.tokenizers[target_model]
-            config = self.generation_configs[target_model]
-            
-            # Créer prompt
-            prompt = self._create_prompt(question, relevant_docs, target_model)
+            with self._stats_lock:
+                self.stats['model_usage'][target_model.value] += 1
             
-            # Tokeniser avec gestion d'erreurs
+            # Réserver la version active : un rechargement ne la libère qu'après cette requête
             try:
-                max_prompt_length = 200 if target_model == ModelType.PLAYPART_TRAINER else 400
-                inputs = tokenizer.encode(
-                    prompt, 
-                    return_tensors='pt', 
-                    truncation=True, 
-                    max_length=max_prompt_length
-                ).to(self.device)
-            except Exception as e:
-                logger.error(f"❌ Erreur tokenisation: {e}")
+                with self.model_registry.acquire(target_model.value) as handle:
+                    session = None
+                    if session_id:
+                        session = self.conversations.get_or_create(session_id, target_model.value, handle.version)
+                    return self._generate_with_model(question, relevant_docs, target_model, handle, start_time,
+                                                     timings, session)
+            except KeyError:
                 return self._fallback_response(question, relevant_docs, target_model)
             
-            # Créer attention_mask
-            attention_mask = torch.ones_like(inputs)
-            
-            # Générer avec paramètres optimisés
-            with torch.no_grad():
-                try:
-                    outputs = model.generate(
-                        inputs,
-                        attention_mask=attention_mask,
-                        max_length=inputs.shape[1] + config['max_new_tokens'],
-                        temperature=config['temperature'],
-                        do_sample=config['do_sample'],
-                        top_p=config['top_p'],
-                        top_k=config['top_k'],
-                        repetition_penalty=config['repetition_penalty'],
-                        no_repeat_ngram_size=config['no_repeat_ngram_size'],
-                        pad_token_id=config.get('pad_token_id', tokenizer.pad_token_id),
-                        eos_token_id=config.get('eos_token_id', tokenizer.eos_token_id),
-                        early_stopping=config.get('early_stopping', False),
-                        length_penalty=config.get('length_penalty', 1.0)
-                    )
-                except Exception as e:
-                    logger.error(f"❌ Erreur génération: {e}")
-                    return self._fallback_response(question, relevant_docs, target_model)
-            
-            # Décoder et post-traiter
-            try:
-                raw_response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-                generated_text = raw_response[len(prompt):].strip()
+        except Exception as e:
+            logger.error(f"❌ Erreur génération: {e}")
+            with self._stats_lock:
+                self.stats['fallback_requests'] += 1
+            return self._fallback_response(question, relevant_docs if 'relevant_docs' in locals() else [], target_model)
+    
+    def _generation_kwargs(self, config: Dict[str, Any], tokenizer) -> Dict[str, Any]:
+        """Paramètres de génération communs à tous les modes"""
+        return {
+            'temperature': config['temperature'],
+            'do_sample': config['do_sample'],
+            'top_p': config['top_p'],
+            'top_k': config['top_k'],
+            'repetition_penalty': config['repetition_penalty'],
+            'no_repeat_ngram_size': config['no_repeat_ngram_size'],
+            'pad_token_id': config.get('pad_token_id', tokenizer.pad_token_id),
+            'eos_token_id': config.get('eos_token_id', tokenizer.eos_token_id),
+            'early_stopping': config.get('early_stopping', False),
+            'length_penalty': config.get('length_penalty', 1.0)
+        }
+    
+    def _generate_with_model(self, question: str, relevant_docs: List[Dict], target_model: ModelType,
+                             handle: ModelHandle, start_time: datetime, timings: StageTimings,
+                             session: Optional[ConversationSession] = None) -> Dict[str, Any]:
+        """Génération avec une version de modèle réservée"""
+        with timings.stage('prompt_build'):
+            relevant_docs = self._pack_context(question, relevant_docs, target_model, handle.tokenizer)
+        if session is not None:
+            generation = self._generate_in_conversation(question, relevant_docs, target_model, handle, session, timings)
+        else:
+            generation = self._generate_single_turn(question, relevant_docs, target_model, handle, timings)
+        
+        if generation is None:
+            return self._fallback_response(question, relevant_docs, target_model)
+        generated_text, generated_tokens = generation
+        
+        # Post-traiter
+        try:
+            with timings.stage('post_process'):
                 final_response = self._post_process_response(generated_text, target_model)
-            except Exception as e:
-                logger.error(f"❌ Erreur décodage: {e}")
-                return self._fallback_response(question, relevant_docs, target_model)
-            
-            # Vérification finale pour PlayPart
-            if target_model == ModelType.PLAYPART_TRAINER and len(final_response) < 20:
-                final_response = self._get_playpart_fallback(question)
-            
-            # Statistiques
-            response_time = (datetime.now() - start_time).total_seconds()
+        except Exception as e:
+            logger.error(f"❌ Erreur décodage: {e}")
+            return self._fallback_response(question, relevant_docs, target_model)
+        
+        # Vérification finale pour PlayPart
+        if target_model == ModelType.PLAYPART_TRAINER and len(final_response) < 20:
+            final_response = self._get_playpart_fallback(question)
+        
+        # Statistiques
+        response_time = (datetime.now() - start_time).total_seconds()
+        with self._stats_lock:
             self.stats['successful_requests'] += 1
             self.stats['last_request_time'] = datetime.now()
             
@@ -651,22 +1613,159 @@ Answer:"""
                 (self.stats['average_response_time'] * (self.stats['successful_requests'] - 1) + response_time) 
                 / self.stats['successful_requests']
             )
-            
-            return {
-                'response': final_response,
-                'sources': [doc.get('title', 'Document') for doc in relevant_docs],
-                'context_used': len(relevant_docs) > 0,
-                'model_used': target_model.value,
-                'model_name': self.model_configs[target_model]["name"],
-                'response_time': response_time,
-                'confidence': 'high' if len(relevant_docs) > 0 else 'medium',
-                'rag_enabled': self.rag_enabled
-            }
-            
+        
+        return {
+            'response': final_response,
+            'sources': [doc.get('title', 'Document') for doc in relevant_docs],
+            'context_used': len(relevant_docs) > 0,
+            'model_used': target_model.value,
+            'model_name': self.model_configs[target_model]["name"],
+            'response_time': response_time,
+            'confidence': 'high' if len(relevant_docs) > 0 else 'medium',
+            'rag_enabled': self.rag_enabled,
+            'model_version': handle.version,
+            'generated_tokens': generated_tokens
+        }
+    
+    def _generate_single_turn(self, question: str, relevant_docs: List[Dict], target_model: ModelType,
+                              handle: ModelHandle, timings: StageTimings):
+        """Génération sans état : prompt complet à chaque requête ; retourne (texte, nb tokens générés)"""
+        model = handle.model
+        tokenizer = handle.tokenizer
+        config = self.generation_configs[target_model]
+        
+        # Créer prompt
+        with timings.stage('prompt_build'):
+            prompt = self._create_prompt(question, relevant_docs, target_model)
+        
+        # Tokeniser avec gestion d'erreurs (longueur déjà bornée par le budget de contexte)
+        try:
+            with timings.stage('tokenization'):
+                inputs = tokenizer.encode(prompt, return_tensors='pt').to(self.device)
         except Exception as e:
-            logger.error(f"❌ Erreur génération: {e}")
-            self.stats['fallback_requests'] += 1
-            return self._fallback_response(question, relevant_docs if 'relevant_docs' in locals() else [], target_model)
+            logger.error(f"❌ Erreur tokenisation: {e}")
+            return None
+        
+        # Créer attention_mask
+        attention_mask = torch.ones_like(inputs)
+        
+        # Générer avec paramètres optimisés (le streamer sépare pré-remplissage et décodage)
+        streamer = FirstTokenStreamer()
+        with torch.no_grad():
+            try:
+                generation_started = time.perf_counter()
+                outputs = model.generate(
+                    inputs,
+                    attention_mask=attention_mask,
+                    max_length=inputs.shape[1] + config['max_new_tokens'],
+                    streamer=streamer,
+                    **self._generation_kwargs(config, tokenizer)
+                )
+                timings.record_generation(generation_started, streamer.first_token_at, time.perf_counter())
+            except Exception as e:
+                logger.error(f"❌ Erreur génération: {e}")
+                return None
+        
+        # Décoder
+        try:
+            with timings.stage('detokenize'):
+                raw_response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+            return raw_response[len(prompt):].strip(), outputs.shape[1] - inputs.shape[1]
+        except Exception as e:
+            logger.error(f"❌ Erreur décodage: {e}")
+            return None
+    
+    def _create_followup_prompt(self, question: str, context_docs: List[Dict], model_type: ModelType) -> str:
+        """Tour suivant d'une conversation : contexte retrouvé pour ce tour puis la nouvelle question
+        (les tours précédents sont déjà dans le cache KV)"""
+        context_text = "\n".join(
+            f"{self._context_prefix(doc, model_type)}{doc['content']}" for doc in context_docs
+        )
+        if model_type == ModelType.PLAYPART_TRAINER:
+            context_block = f"\n\n{context_text}" if context_text else ""
+            return f"""{context_block}
+
+{question}
+Answer:"""
+        context_block = f"\n\n[CONTEXTE]\n{context_text}" if context_text else ""
+        return f"""{context_block}
+
+Question: {question}
+
+Réponse: """
+    
+    def _generate_in_conversation(self, question: str, relevant_docs: List[Dict], target_model: ModelType,
+                                  handle: ModelHandle, session: ConversationSession, timings: StageTimings):
+        """Génération dans une session : le cache KV des tours précédents est réutilisé,
+        seul le nouveau tour est pré-rempli"""
+        model = handle.model
+        tokenizer = handle.tokenizer
+        config = self.generation_configs[target_model]
+        window = self.conversations.window_tokens
+        
+        with session.lock:
+            # Une génération concurrente sur l'ancien modèle a terminé : la réinitialisation ne l'interrompt pas
+            session.bind(target_model.value, handle.version)
+            try:
+                # Premier tour : prompt complet ; ensuite le contexte du tour et la question seuls
+                with timings.stage('prompt_build'):
+                    turn_prompt = (self._create_followup_prompt(question, relevant_docs, target_model) if session.turns
+                                   else self._create_prompt(question, relevant_docs, target_model))
+                with timings.stage('tokenization'):
+                    turn_ids = tokenizer.encode(turn_prompt)
+                
+                # Fenêtre bornée : on repart des tours les plus récents qui tiennent (cache recalculé)
+                if len(session.token_ids) + len(turn_ids) + config['max_new_tokens'] > window:
+                    session.stats['window_resets'] += 1
+                    session.reset_cache()
+                    kept_ids: List[int] = []
+                    for prompt_text, answer_text in reversed(session.turns):
+                        ids = tokenizer.encode(prompt_text + answer_text)
+                        if len(kept_ids) + len(ids) + len(turn_ids) + config['max_new_tokens'] > window:
+                            break
+                        kept_ids = ids + kept_ids
+                    session.token_ids = kept_ids
+                    if not kept_ids:
+                        turn_prompt = self._create_prompt(question, relevant_docs, target_model)
+                        turn_ids = tokenizer.encode(turn_prompt)[-(window - config['max_new_tokens']):]
+                
+                input_ids = torch.tensor([session.token_ids + turn_ids], device=self.device)
+                reused = session.cached_length()
+                
+                streamer = FirstTokenStreamer()
+                with torch.no_grad():
+                    generation_started = time.perf_counter()
+                    outputs = model.generate(
+                        input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        past_key_values=session.past_key_values,
+                        max_new_tokens=config['max_new_tokens'],
+                        use_cache=True,
+                        return_dict_in_generate=True,
+                        streamer=streamer,
+                        **self._generation_kwargs(config, tokenizer)
+                    )
+                    timings.record_generation(generation_started, streamer.first_token_at, time.perf_counter())
+                
+                sequence = outputs.sequences[0]
+                with timings.stage('detokenize'):
+                    generated_text = tokenizer.decode(sequence[input_ids.shape[1]:], skip_special_tokens=True).strip()
+                
+                # Le cache couvre toute la séquence sauf le dernier token généré
+                session.token_ids = sequence.tolist()
+                session.past_key_values = outputs.past_key_values
+                session.turns.append((turn_prompt, tokenizer.decode(sequence[input_ids.shape[1]:])))
+                session.stats['turns'] += 1
+                session.stats['reused_tokens'] += reused
+                session.stats['prefill_tokens'] += input_ids.shape[1] - reused
+                
+            except Exception as e:
+                logger.error(f"❌ Erreur génération conversation: {e}")
+                session.reset_cache()
+                return None
+        
+        self.conversations.update(session)
+        return generated_text, sequence.shape[0] - input_ids.shape[1]
     
     def _fallback_response(self, question: str, relevant_docs: List[Dict], model_type: ModelType) -> Dict[str, Any]:
         """Réponse de fallback selon le modèle"""
@@ -719,6 +1818,10 @@ Answer:"""
             'rag_enabled': self.rag_enabled
         }
     
+    def reset_conversation(self, session_id: str) -> bool:
+        """Oublie l'historique (et le cache KV) d'une session"""
+        return self.conversations.drop(session_id)
+    
     def get_service_stats(self) -> Dict[str, Any]:
         """Statistiques du service - MÉTHODE MANQUANTE AJOUTÉE"""
         return {
@@ -730,7 +1833,27 @@ Answer:"""
             'initialization_time': self.initialization_time,
             'initialization_error': self.initialization_error,
             'stats': self.stats.copy(),
+            'routing': self.model_router.get_stats(),
+            'registry': self.model_registry.get_stats(),
+            'reloads': dict(self.reload_status),
+            'conversations': self.conversations.get_stats(),
+            'scheduler': self.scheduler.get_stats(),
+            'embedding_batcher': self.embedding_batcher.get_stats() if self.embedding_batcher else {},
+            'retrieval_cache': self.retrieval_cache.get_stats(),
+            'search_cursors': self.search_cursors.get_stats(),
             'exercise_database_size': len(self.exercise_database),
+            'exercise_store': self.exercise_database.get_stats(),
+            'live_index': self.live_index.get_stats() if self.live_index else {},
+            'shards': self.sharded_index.get_stats() if self.sharded_index else {},
+            'index_version': self.index_version,
+            'index_snapshot': {
+                **self.snapshot_status,
+                'watcher': self.snapshot_watcher.get_stats() if self.snapshot_watcher else None
+            },
+            'corpus_version': self.corpus_version,
+            'retrieval_cascade': self.get_cascade_stats(),
+            'profile_filtering': self.get_profile_stats(),
+            'faq_bank': self.faq_bank.get_stats() if self.faq_bank else {},
             'timestamp': datetime.now().isoformat()
         }
 
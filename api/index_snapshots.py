@@ -0,0 +1,139 @@
+# api/index_snapshots.py - Snapshots versionnés de l'index (dossier partagé) et surveillance par les réplicas
+
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pointeur vers la version active, remplacé atomiquement à chaque publication
+CURRENT_FILE = "CURRENT.json"
+VERSIONS_DIR = "versions"
+SNAPSHOT_MANIFEST = "snapshot.json"
+INDEX_SUBDIR = "index"
+STORE_SUBDIR = "store"
+# Les shards se reconstruisent depuis le build : inutile de les publier
+_IGNORED = shutil.ignore_patterns("shards", ".*")
+
+
+def read_current(root: Path) -> Optional[Dict[str, Any]]:
+    """Manifeste de la version publiée, ou None"""
+    try:
+        with open(Path(root) / CURRENT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_directory(root: Path, version: str) -> Path:
+    return Path(root) / VERSIONS_DIR / version
+
+
+def _write_json_atomic(path: Path, payload: Dict[str, Any]):
+    tmp_path = path.parent / f".{path.name}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish_snapshot(root: Path, build, store_dir: Path, keep_versions: int = 3) -> Dict[str, Any]:
+    """Copie un build d'index et le store d'exercices aligné dans une nouvelle version
+
+    La version est écrite entièrement dans un dossier temporaire puis renommée ;
+    CURRENT.json n'est remplacé qu'ensuite. Un réplica ne voit donc jamais une
+    version incomplète.
+    """
+    root = Path(root)
+    (root / VERSIONS_DIR).mkdir(parents=True, exist_ok=True)
+    previous = read_current(root)
+    sequence = (previous or {}).get("sequence", 0) + 1
+    version = f"{sequence:06d}-{build.key}"
+
+    tmp_dir = root / VERSIONS_DIR / f".{version}.tmp-{os.getpid()}"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    shutil.copytree(build.directory, tmp_dir / INDEX_SUBDIR, ignore=_IGNORED)
+    shutil.copytree(store_dir, tmp_dir / STORE_SUBDIR, ignore=_IGNORED)
+
+    manifest = {
+        "version": version,
+        "sequence": sequence,
+        "build_key": build.key,
+        "embedding_model": build.manifest.get("embedding_model"),
+        "index_type": build.manifest.get("index_type"),
+        "pca_dim": build.manifest.get("pca_dim", 0),
+        "count": build.manifest.get("count"),
+        "corpus_hash": build.manifest.get("corpus_hash"),
+        "published_at": datetime.now().isoformat()
+    }
+    _write_json_atomic(tmp_dir / SNAPSHOT_MANIFEST, manifest)
+    os.replace(tmp_dir, snapshot_directory(root, version))
+    _write_json_atomic(root / CURRENT_FILE, manifest)
+    logger.info(f"📦 Snapshot publié: {version}")
+
+    _cleanup(root, keep_versions)
+    return manifest
+
+
+def _cleanup(root: Path, keep_versions: int):
+    """Garde les versions les plus récentes (la précédente peut encore être en cours de chargement)"""
+    versions = sorted(path for path in (root / VERSIONS_DIR).iterdir()
+                      if path.is_dir() and not path.name.startswith("."))
+    for directory in versions[:-keep_versions]:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class SnapshotWatcher:
+    """Surveille CURRENT.json et appelle on_version pour chaque nouvelle version publiée
+
+    Le chargement se fait dans le thread de surveillance : les recherches continuent
+    sur la version active jusqu'à la bascule.
+    """
+
+    def __init__(self, root: Path, on_version: Callable[[Dict[str, Any]], bool], poll_interval: float = 5.0,
+                 active_version: Optional[str] = None):
+        self.root = Path(root)
+        self.on_version = on_version
+        self.poll_interval = poll_interval
+        self.seen_version = active_version
+        self.checks = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="index-snapshot-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.checks += 1
+            manifest = read_current(self.root)
+            if manifest is None or manifest.get("version") == self.seen_version:
+                continue
+            # Version vue une seule fois : un échec n'est pas retenté en boucle
+            self.seen_version = manifest["version"]
+            try:
+                if not self.on_version(manifest):
+                    self.failures += 1
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Chargement du snapshot {manifest['version']}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'root': str(self.root),
+            'poll_interval': self.poll_interval,
+            'latest_seen': self.seen_version,
+            'checks': self.checks,
+            'failures': self.failures
+        }
@@ -0,0 +1,277 @@
+# api/index_store.py - Index FAISS et matrice d'embeddings persistés sur disque (mmap, incrémental)
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+from .corpus import content_hash, document_text
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+DOC_IDS_FILE = "doc_ids.json"
+DOC_HASHES_FILE = "doc_hashes.json"
+INDEX_FILE = "index.faiss"
+REPORT_FILE = "recall_report.json"
+
+
+def corpus_hash(doc_hashes: Sequence[str]) -> str:
+    """Empreinte du corpus entier (ordre des documents compris)"""
+    digest = hashlib.sha256()
+    for doc_hash in doc_hashes:
+        digest.update(doc_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+def build_key(corpus_digest: str, embedding_model: str, index_type: str = "flat", pca_dim: int = 0) -> str:
+    """Clé d'un build : corpus + encodeur + type d'index (+ projection PCA)"""
+    index_spec = f"{index_type}+pca{pca_dim}" if pca_dim else index_type
+    return hashlib.sha256(f"{embedding_model}\n{index_spec}\n{corpus_digest}".encode("utf-8")).hexdigest()[:16]
+
+
+def read_index_mmap(path: Path):
+    """Ouvre un index FAISS en lecture seule, mappé en mémoire quand le type d'index le permet"""
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", getattr(faiss, "IO_FLAG_MMAP", 0)) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+    try:
+        return faiss.read_index(str(path), flags)
+    except Exception:
+        return faiss.read_index(str(path))
+
+
+class IndexBuild:
+    """Build chargé : index FAISS, embeddings (mmap) et identifiants alignés"""
+
+    def __init__(self, directory: Path, manifest: Dict[str, Any], index: Any, embeddings: np.ndarray,
+                 doc_ids: List[Any], doc_hashes: List[str]):
+        self.directory = directory
+        self.manifest = manifest
+        self.index = index
+        self.embeddings = embeddings
+        self.doc_ids = doc_ids
+        self.doc_hashes = doc_hashes
+
+    @property
+    def key(self) -> str:
+        return self.manifest["key"]
+
+
+class IndexStore:
+    """Répertoire de builds d'index, un sous-dossier par (corpus, modèle d'embedding)
+
+    Au démarrage, un build existant est ouvert en mmap (partagé entre workers via le
+    cache de pages) ; sinon les embeddings des documents inchangés sont repris du
+    build précédent et seuls les documents nouveaux ou modifiés sont ré-encodés.
+    """
+
+    def __init__(self, root: Path, embedding_model: str, index_type: str = "flat", keep_builds: int = 2,
+                 pca_dim: int = 0):
+        self.root = Path(root)
+        self.embedding_model = embedding_model
+        self.index_type = index_type
+        self.pca_dim = pca_dim
+        self.keep_builds = keep_builds
+
+    # === LECTURE ===
+
+    def _read_json(self, path: Path) -> Any:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def open_build(self, directory: Path) -> Optional[IndexBuild]:
+        """Ouvre un build existant (embeddings et index mappés en mémoire)"""
+        manifest_path = directory / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        try:
+            manifest = self._read_json(manifest_path)
+            embeddings = np.load(directory / EMBEDDINGS_FILE, mmap_mode="r")
+            doc_ids = self._read_json(directory / DOC_IDS_FILE)
+            doc_hashes = self._read_json(directory / DOC_HASHES_FILE)
+            index = read_index_mmap(directory / manifest.get("index_file", INDEX_FILE))
+            return IndexBuild(directory, manifest, index, embeddings, doc_ids, doc_hashes)
+        except Exception as e:
+            logger.warning(f"⚠️ Build d'index illisible {directory.name}: {e}")
+            return None
+
+    def _latest_build_dir(self) -> Optional[Path]:
+        """Build le plus récent produit avec le même modèle d'embedding"""
+        if not self.root.exists():
+            return None
+        candidates = []
+        for manifest_path in self.root.glob(f"*/{MANIFEST_FILE}"):
+            try:
+                manifest = self._read_json(manifest_path)
+            except Exception:
+                continue
+            if manifest.get("embedding_model") == self.embedding_model:
+                candidates.append((manifest.get("created_at", ""), manifest_path.parent))
+        return max(candidates)[1] if candidates else None
+
+    def latest_build(self) -> Optional[IndexBuild]:
+        """Build le plus récent de l'encodeur, quel que soit le corpus"""
+        directory = self._latest_build_dir()
+        return self.open_build(directory) if directory is not None else None
+
+    # === CONSTRUCTION ===
+
+    def load_or_build(self, documents: Sequence[Dict[str, Any]],
+                      encode_fn: Callable[[List[str]], np.ndarray],
+                      index_factory: Callable[[np.ndarray], Any],
+                      batch_size: int = 256,
+                      report_fn: Optional[Callable[[Any, np.ndarray], Dict[str, Any]]] = None,
+                      doc_hashes: Optional[List[str]] = None) -> IndexBuild:
+        """Build correspondant au corpus ; construit (incrémentalement) s'il n'existe pas"""
+        if doc_hashes is None:
+            doc_hashes = [content_hash(doc) for doc in documents]
+        key = build_key(corpus_hash(doc_hashes), self.embedding_model, self.index_type, self.pca_dim)
+        directory = self.root / key
+
+        build = self.open_build(directory)
+        if build is not None:
+            logger.info(f"📂 Index persistant ouvert en mmap: {key} ({len(build.doc_ids)} documents)")
+            return build
+
+        return self.build(documents, doc_hashes, key, encode_fn, index_factory, batch_size, report_fn)
+
+    def build(self, documents: Sequence[Dict[str, Any]], doc_hashes: List[str], key: str,
+              encode_fn: Callable[[List[str]], np.ndarray],
+              index_factory: Callable[[np.ndarray], Any],
+              batch_size: int = 256,
+              report_fn: Optional[Callable[[Any, np.ndarray], Dict[str, Any]]] = None) -> IndexBuild:
+        """Écrit un nouveau build, en réutilisant les embeddings du build précédent"""
+        previous = None
+        previous_dir = self._latest_build_dir()
+        if previous_dir is not None:
+            previous = self.open_build(previous_dir)
+
+        reusable: Dict[str, int] = {}
+        if previous is not None:
+            reusable = {doc_hash: row for row, doc_hash in enumerate(previous.doc_hashes)}
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.root / f".{key}.tmp-{os.getpid()}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        count = len(documents)
+        dimension = previous.embeddings.shape[1] if previous is not None and len(previous.doc_ids) else None
+        embeddings = None
+        reused = 0
+        to_encode = [row for row, doc_hash in enumerate(doc_hashes) if doc_hash not in reusable]
+
+        def _allocate(dim: int) -> np.ndarray:
+            return np.lib.format.open_memmap(tmp_dir / EMBEDDINGS_FILE, mode="w+", dtype=np.float32,
+                                             shape=(count, dim))
+
+        # Documents inchangés : recopie depuis le build précédent
+        if dimension is not None:
+            embeddings = _allocate(dimension)
+            for row, doc_hash in enumerate(doc_hashes):
+                previous_row = reusable.get(doc_hash)
+                if previous_row is not None:
+                    embeddings[row] = previous.embeddings[previous_row]
+                    reused += 1
+
+        # Documents nouveaux ou modifiés : encodage par lots
+        for start in range(0, len(to_encode), batch_size):
+            rows = to_encode[start:start + batch_size]
+            vectors = np.asarray(encode_fn([document_text(documents[row]) for row in rows]), dtype=np.float32)
+            if embeddings is None:
+                embeddings = _allocate(vectors.shape[1])
+            faiss.normalize_L2(vectors)
+            embeddings[rows] = vectors
+
+        if embeddings is None:
+            raise ValueError("Corpus vide : rien à indexer")
+        embeddings.flush()
+
+        index = index_factory(np.asarray(embeddings))
+        faiss.write_index(index, str(tmp_dir / INDEX_FILE))
+
+        # Rapport rappel@k / latence face à la recherche exacte
+        if report_fn is not None:
+            try:
+                report = report_fn(index, np.asarray(embeddings))
+                with open(tmp_dir / REPORT_FILE, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
+                logger.info(f"📊 Rappel@{report.get('k')}: {report.get('default', {}).get('recall_at_k')}")
+            except Exception as e:
+                logger.warning(f"⚠️ Rapport de rappel non généré: {e}")
+
+        doc_ids = [doc["id"] for doc in documents]
+        with open(tmp_dir / DOC_IDS_FILE, "w", encoding="utf-8") as f:
+            json.dump(doc_ids, f)
+        with open(tmp_dir / DOC_HASHES_FILE, "w", encoding="utf-8") as f:
+            json.dump(doc_hashes, f)
+
+        manifest = {
+            "key": key,
+            "embedding_model": self.embedding_model,
+            "index_type": self.index_type,
+            "pca_dim": self.pca_dim,
+            "corpus_hash": corpus_hash(doc_hashes),
+            "count": count,
+            "dimension": int(embeddings.shape[1]),
+            "index_file": INDEX_FILE,
+            "reused_embeddings": reused,
+            "encoded_embeddings": len(to_encode),
+            "created_at": datetime.now().isoformat()
+        }
+        with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        del embeddings
+        directory = self.root / key
+        if directory.exists() and self.open_build(directory) is None:
+            # Build illisible (écriture interrompue) : écarté par renommage avant remplacement
+            stale_dir = self.root / f".{key}.stale-{os.getpid()}"
+            try:
+                os.replace(directory, stale_dir)
+                shutil.rmtree(stale_dir, ignore_errors=True)
+            except OSError:
+                pass
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Un autre processus a publié ce build entre-temps : on ouvre le sien
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            build = self.open_build(directory)
+            if build is None:
+                raise
+            logger.info(f"💾 Index persistant déjà publié par un autre processus: {key}")
+            return build
+
+        logger.info(f"💾 Index persistant écrit: {key} ({reused} embeddings réutilisés, {len(to_encode)} encodés)")
+        self._cleanup(keep=directory)
+
+        build = self.open_build(directory)
+        if build is None:
+            raise RuntimeError(f"Build d'index illisible après écriture: {directory}")
+        return build
+
+    def _cleanup(self, keep: Path):
+        """Conserve seulement les builds les plus récents"""
+        builds = []
+        for manifest_path in self.root.glob(f"*/{MANIFEST_FILE}"):
+            try:
+                builds.append((self._read_json(manifest_path).get("created_at", ""), manifest_path.parent))
+            except Exception:
+                continue
+        for _, directory in sorted(builds, reverse=True)[self.keep_builds:]:
+            if directory != keep:
+                shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,59 @@
+# api/jsonl_log.py - Journaux JSONL bornés en taille (rotation path -> path.1 -> ... -> path.N)
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class RotatingJsonlLog:
+    """Journal JSONL dont la taille totale est bornée à (backups + 1) × max_bytes
+
+    Quand le fichier courant dépasse max_bytes, il devient path.1 (path.1 devient
+    path.2, ...) et le plus ancien est supprimé.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 50 * 1024 * 1024, backups: int = 3):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            self._size = self.path.stat().st_size
+        except OSError:
+            self._size = 0
+
+    def _backup(self, index: int) -> Path:
+        return self.path.with_name(f"{self.path.name}.{index}")
+
+    def _rotate(self):
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                if self._backup(index).exists():
+                    os.replace(self._backup(index), self._backup(index + 1))
+            os.replace(self.path, self._backup(1))
+        else:
+            os.remove(self.path)
+        self._size = 0
+
+    def write(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            with self._lock:
+                if self._size and self._size + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'ab') as f:
+                    f.write(line)
+                self._size += len(line)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture journal {self.path.name} impossible: {e}")
+
+    def files(self) -> List[Path]:
+        """Fichiers existants, du plus ancien au plus récent"""
+        candidates = [self._backup(index) for index in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in candidates if path.exists()]
@@ -0,0 +1,262 @@
+# api/lexical_index.py - Recherche lexicale BM25 et cascade lexicale -> dense (fusion RRF)
+
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mots-outils ignorés (français + anglais)
+_STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "et", "ou", "est", "pour", "que", "qui",
+    "quoi", "comment", "quel", "quelle", "quels", "quelles", "je", "tu", "il", "nous", "vous",
+    "mon", "ma", "mes", "ton", "votre", "vos", "avec", "sans", "dans", "sur", "par", "pas",
+    "plus", "faire", "faut", "au", "aux", "ce", "cette", "ces", "en", "se", "sa", "son",
+    "the", "a", "an", "and", "or", "is", "are", "for", "what", "which", "who", "how", "i",
+    "you", "we", "my", "your", "with", "without", "in", "on", "by", "not", "do", "does",
+    "should", "can", "to", "of", "this", "that", "it", "be",
+}
+
+# Poids du titre : ses termes comptent comme s'ils apparaissaient plusieurs fois
+TITLE_WEIGHT = 2
+# Constante de la fusion par rangs réciproques
+RRF_K = 60
+# Postings persistés avec le store d'exercices (colonnes "bm25.*") ; à incrémenter si tokenize change
+POSTINGS_FORMAT = 1
+
+
+def _strip_accents(text: str) -> str:
+    return ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes normalisés : minuscules, sans accents ni mots-outils, pluriel simple retiré"""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", _strip_accents(text.lower())):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def build_postings(documents: Iterable[Any]) -> Dict[str, np.ndarray]:
+    """Postings BM25 (CSR) de documents du store, écrits avec ses colonnes à la construction
+
+    documents : RowView (position connue), dans l'ordre des positions.
+    """
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths: List[int] = []
+    for document in documents:
+        terms = BM25Index._document_terms(document)
+        lengths.extend([0] * (document.position - len(lengths)))
+        lengths.append(sum(terms.values()))
+        for term, frequency in terms.items():
+            postings.setdefault(term, []).append((document.position, frequency))
+
+    vocabulary = sorted(postings)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    for i, term in enumerate(vocabulary):
+        offsets[i + 1] = offsets[i] + len(postings[term])
+    entries = [entry for term in vocabulary for entry in postings[term]]
+    return {
+        "bm25.format": np.asarray([POSTINGS_FORMAT], dtype=np.int32),
+        "bm25.terms": np.asarray(vocabulary, dtype=str),
+        "bm25.offsets": offsets,
+        "bm25.positions": np.asarray([position for position, _ in entries], dtype=np.int64),
+        "bm25.frequencies": np.asarray([frequency for _, frequency in entries], dtype=np.int32),
+        "bm25.lengths": np.asarray(lengths, dtype=np.int32)
+    }
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], top_k: int,
+                           k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Fusion RRF de classements (position, score) ; retourne (position, score RRF)"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (position, _) in enumerate(ranking):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+
+
+class BM25Index:
+    """Index inversé BM25 sur titres et contenus, mis à jour document par document
+
+    Les postings du corpus de base sont lus tels quels depuis le store (voir
+    build_postings) ; les documents ajoutés ou modifiés à chaud vivent dans une
+    surcouche, les documents retirés du base sont masqués.
+
+    search() indique aussi si le meilleur résultat est assez net pour se passer
+    de la recherche dense : part de l'IDF de la requête couverte par le document
+    et écart avec le second.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, min_coverage: float = 0.6, min_margin: float = 1.5):
+        self.k1 = k1
+        self.b = b
+        self.min_coverage = min_coverage
+        self.min_margin = min_margin
+        # Surcouche : documents indexés à chaud
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._doc_terms: Dict[int, List[str]] = {}
+        # Base : postings CSR du store (mmap) et positions encore vivantes
+        self._base_terms: Dict[str, int] = {}
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_positions = np.zeros(0, dtype=np.int64)
+        self._base_frequencies = np.zeros(0, dtype=np.int32)
+        self._base_lengths = np.zeros(0, dtype=np.int32)
+        self._base_alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Any], **params) -> "BM25Index":
+        """documents : RowView (position connue) du store"""
+        index = cls(**params)
+        for document in documents:
+            index.add(document.position, document)
+        return index
+
+    @classmethod
+    def from_store(cls, store, **params) -> "BM25Index":
+        """Index du store : postings persistés s'ils sont à jour, sinon tokenisation de chaque document"""
+        arrays = store.arrays
+        if ("bm25.format" not in arrays or int(arrays["bm25.format"][0]) != POSTINGS_FORMAT
+                or len(arrays["bm25.lengths"]) != store.base_count):
+            return cls.from_documents(store, **params)
+
+        index = cls(**params)
+        index._base_terms = {term: i for i, term in enumerate(arrays["bm25.terms"].tolist())}
+        index._base_offsets = arrays["bm25.offsets"]
+        index._base_positions = arrays["bm25.positions"]
+        index._base_frequencies = arrays["bm25.frequencies"]
+        index._base_lengths = arrays["bm25.lengths"]
+        index._base_alive = np.ones(store.base_count, dtype=bool)
+        index._count = store.base_count
+        index._total_length = int(np.sum(index._base_lengths, dtype=np.int64))
+        # Modifications à chaud déjà présentes dans le store
+        for position in store.modified_positions():
+            if store.is_deleted(position):
+                index.remove(position)
+            else:
+                index.add(position, store[position])
+        return index
+
+    @staticmethod
+    def _document_terms(document: Any) -> Counter:
+        terms = Counter(tokenize(document["content"]))
+        for term in tokenize(document["title"]):
+            terms[term] += TITLE_WEIGHT
+        return terms
+
+    def add(self, position: int, document: Any):
+        terms = self._document_terms(document)
+        with self._lock:
+            self.remove(position)
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[position] = frequency
+            length = sum(terms.values())
+            self._lengths[position] = length
+            self._doc_terms[position] = list(terms)
+            self._count += 1
+            self._total_length += length
+
+    def remove(self, position: int):
+        with self._lock:
+            length = self._lengths.pop(position, None)
+            if length is not None:
+                self._count -= 1
+                self._total_length -= length
+                for term in self._doc_terms.pop(position, []):
+                    postings = self._postings[term]
+                    postings.pop(position, None)
+                    if not postings:
+                        del self._postings[term]
+            # Un document du base remplacé ou supprimé n'est plus lu depuis les postings persistés
+            if position < len(self._base_alive) and self._base_alive[position]:
+                self._base_alive[position] = False
+                self._count -= 1
+                self._total_length -= int(self._base_lengths[position])
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(positions, fréquences, longueurs des documents) d'un terme, base vivante puis surcouche"""
+        positions = np.zeros(0, dtype=np.int64)
+        frequencies = np.zeros(0, dtype=np.int32)
+        lengths = np.zeros(0, dtype=np.int32)
+        term_id = self._base_terms.get(term)
+        if term_id is not None:
+            start, end = int(self._base_offsets[term_id]), int(self._base_offsets[term_id + 1])
+            positions = np.asarray(self._base_positions[start:end], dtype=np.int64)
+            alive = self._base_alive[positions]
+            positions, frequencies = positions[alive], np.asarray(self._base_frequencies[start:end])[alive]
+            lengths = np.asarray(self._base_lengths)[positions]
+        overlay = self._postings.get(term)
+        if overlay:
+            positions = np.concatenate([positions, np.fromiter(overlay, dtype=np.int64, count=len(overlay))])
+            frequencies = np.concatenate([frequencies, np.fromiter(overlay.values(), dtype=np.int32, count=len(overlay))])
+            lengths = np.concatenate([lengths, np.fromiter((self._lengths[p] for p in overlay), dtype=np.int32,
+                                                           count=len(overlay))])
+        return positions, frequencies, lengths
+
+    def search(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Meilleurs documents (position, score BM25), part de l'IDF couverte par document et décision"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            if not query_terms or not self._count:
+                return {'hits': [], 'coverages': {}, 'confident': False, 'coverage': 0.0}
+
+            average_length = self._total_length / self._count
+            idf: Dict[str, float] = {}
+            all_positions, all_scores, all_idf = [], [], []
+
+            for term in query_terms:
+                positions, frequencies, lengths = self._term_postings(term)
+                document_frequency = len(positions)
+                idf[term] = math.log(1 + (self._count - document_frequency + 0.5) / (document_frequency + 0.5))
+                if mask is not None:
+                    keep = positions < len(mask)
+                    keep[keep] = mask[positions[keep]]
+                    positions, frequencies, lengths = positions[keep], frequencies[keep], lengths[keep]
+                norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+                all_positions.append(positions)
+                all_scores.append(idf[term] * frequencies * (self.k1 + 1) / (frequencies + norm))
+                all_idf.append(np.full(len(positions), idf[term]))
+
+        positions = np.concatenate(all_positions)
+        if not len(positions):
+            return {'hits': [], 'coverages': {}, 'confident': False, 'coverage': 0.0}
+        unique, inverse = np.unique(positions, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        matched = np.bincount(inverse, weights=np.concatenate(all_idf))
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        hits = [(int(unique[i]), float(scores[i])) for i in order]
+
+        total_idf = sum(idf.values()) or 1.0
+        coverages = {int(unique[i]): round(float(matched[i]) / total_idf, 4) for i in order}
+        coverage = coverages[hits[0][0]]
+        margin = hits[0][1] / hits[1][1] if len(hits) > 1 and hits[1][1] > 0 else math.inf
+        return {
+            'hits': hits,
+            'coverages': coverages,
+            'coverage': coverage,
+            'margin': round(margin, 4) if margin != math.inf else None,
+            'confident': coverage >= self.min_coverage and margin >= self.min_margin
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'documents': self._count,
+                'terms': len(self._base_terms) + sum(1 for term in self._postings if term not in self._base_terms),
+                'persisted_postings': len(self._base_alive) > 0,
+                'average_length': round(self._total_length / self._count, 1) if self._count else 0.0
+            }
@@ -0,0 +1,140 @@
+# api/live_index.py - Index vectoriel modifiable à chaud : build de base (mmap) + delta à identifiants
+
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+from .metadata_index import id_selector
+from .sharded_index import ShardedIndex
+from .vector_index import search as vector_search, search_reranked
+
+
+class LiveIndex:
+    """Index de base en lecture seule + index delta IndexIDMap2 pour les documents modifiés
+
+    Les identifiants sont les positions des documents dans le store. Ajouter ou modifier
+    un document n'écrit que son vecteur dans le delta (l'ancien vecteur de base est
+    masqué) ; supprimer masque le vecteur. Le build de base n'est jamais réécrit.
+    """
+
+    def __init__(self, base: Any = None, base_count: int = 0, base_embeddings: Optional[np.ndarray] = None):
+        self.base = base
+        self.base_count = base_count
+        self.base_embeddings = base_embeddings
+        self.tombstones = np.zeros(base_count, dtype=bool)
+        self.delta = None
+        self.delta_vectors: Dict[int, np.ndarray] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def ntotal(self) -> int:
+        with self._lock:
+            return self.base_count - int(self.tombstones.sum()) + len(self.delta_vectors)
+
+    def _ensure_delta(self, dimension: int):
+        if self.delta is None:
+            self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    def _drop(self, ids: np.ndarray):
+        if self.delta is not None and self.delta.ntotal:
+            self.delta.remove_ids(faiss.IDSelectorBatch(ids))
+        for position in ids:
+            self.delta_vectors.pop(int(position), None)
+            if position < self.base_count:
+                self.tombstones[position] = True
+
+    def upsert(self, positions: Sequence[int], vectors: np.ndarray):
+        """Écrit les vecteurs (normalisés) des documents ajoutés ou modifiés"""
+        ids = np.asarray(positions, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._ensure_delta(vectors.shape[1])
+            self._drop(ids)
+            self.delta.add_with_ids(vectors, ids)
+            for row, position in enumerate(ids):
+                self.delta_vectors[int(position)] = vectors[row]
+
+    def delete(self, positions: Sequence[int]):
+        with self._lock:
+            self._drop(np.asarray(positions, dtype=np.int64))
+
+    def vectors(self, positions: Sequence[int]) -> np.ndarray:
+        """Embeddings des positions demandées (delta en priorité, sinon build de base)"""
+        with self._lock:
+            return np.stack([
+                self.delta_vectors[position] if position in self.delta_vectors
+                else np.asarray(self.base_embeddings[position], dtype=np.float32)
+                for position in (int(p) for p in positions)
+            ])
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               mask: Optional[np.ndarray] = None, rerank: int = 0):
+        """Top-k fusionné base + delta, restreint au masque de positions s'il est fourni
+
+        rerank : la base (compressée) fournit k·rerank candidats re-classés avec les
+        embeddings pleine précision ; le delta est déjà exact.
+        Retourne (scores, positions, dégradé) : dégradé si un shard n'a pas répondu.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        results = []
+        degraded = False
+
+        # La base est en lecture seule : seul l'état des masques est lu sous verrou,
+        # les recherches (shards compris) se font en parallèle
+        with self._lock:
+            allowed = None
+            if self.base is not None and self.base_count:
+                allowed = ~self.tombstones
+                if mask is not None:
+                    allowed &= mask[:self.base_count]
+
+            if self.delta is not None and self.delta.ntotal:
+                params = None
+                if mask is not None:
+                    params = faiss.SearchParameters()
+                    params.sel = id_selector(mask)
+                results.append(self.delta.search(queries, min(k, self.delta.ntotal), params=params))
+
+        if allowed is not None:
+            selector = id_selector(allowed) if not allowed.all() else None
+            if isinstance(self.base, ShardedIndex):
+                # Shards : filtrage et scores exacts faits dans chaque processus
+                scores, indices, missing = self.base.search(queries, min(k, self.base_count), nprobe=nprobe,
+                                                            ef_search=ef_search,
+                                                            mask=None if selector is None else allowed)
+                results.append((scores, indices))
+                degraded = bool(missing)
+            elif selector is None or allowed.any():
+                if rerank > 1 and self.base_embeddings is not None:
+                    results.append(search_reranked(self.base, self.base_embeddings, queries,
+                                                   min(k, self.base_count), rerank,
+                                                   nprobe=nprobe, ef_search=ef_search, selector=selector))
+                else:
+                    results.append(vector_search(self.base, queries, min(k, self.base_count),
+                                                 nprobe=nprobe, ef_search=ef_search, selector=selector))
+
+        if not results:
+            empty = np.full((len(queries), k), -1, dtype=np.int64)
+            return np.full((len(queries), k), -np.inf, dtype=np.float32), empty, degraded
+
+        scores = np.concatenate([found[0] for found in results], axis=1)
+        indices = np.concatenate([found[1] for found in results], axis=1)
+        scores = np.where(indices >= 0, scores, -np.inf)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1), degraded
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'base_vectors': self.base_count,
+                'masked_base_vectors': int(self.tombstones.sum()),
+                'delta_vectors': len(self.delta_vectors),
+                'total': self.base_count - int(self.tombstones.sum()) + len(self.delta_vectors)
+            }
@@ -2,10 +2,14 @@
 
 import os
 import sys
+import json
+import asyncio
+import secrets
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 import logging
 from datetime import datetime
@@ -14,12 +18,17 @@ from typing import Optional, Dict, Any, List
 # Import des modèles et services
 from .models import (
     ChatRequest, FitnessRequest, FitnessResponse, HealthResponse,
-    ExerciseSearchRequest, ExerciseSearchResponse, CategoriesResponse,
-    StatsResponse, FeedbackRequest, ModelSwitchRequest, ModelSwitchResponse,
-    AvailableModelsResponse, ModelType, ModelInfo
+    ExerciseSearchRequest, ExerciseSearchResponse, ExerciseBatchSearchRequest,
+    ExerciseBatchSearchResponse, CategoriesResponse,
+    StatsResponse, FeedbackRequest, ModelSwitchRequest, DefaultModelRequest, ModelSwitchResponse,
+    AvailableModelsResponse, ModelType, ModelInfo, ModelReloadRequest, ModelReloadResponse,
+    DocumentChangeResponse, BulkIngestResponse
 )
 from .config import get_settings
 from .fitness_service import get_fitness_service, ModelType as ServiceModelType
+from .coalescing import SingleFlight, request_key
+from .corpus import CorpusValidationError, DocumentConflictError, validate_document
+from .search_cursors import CursorError, PROJECTABLE_FIELDS, project
 
 # Configuration logging
 logging.basicConfig(
@@ -31,6 +40,9 @@ logger = logging.getLogger(__name__)
 # Instance globale du service
 fitness_service = None
 
+# Regroupement des requêtes identiques en cours de génération
+single_flight = SingleFlight()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestion du cycle de vie de l'application"""
@@ -41,6 +53,11 @@ async def lifespan(app: FastAPI):
     try:
         settings = get_settings()
         fitness_service = get_fitness_service(settings.model_path)
+        # Regroupement des requêtes identiques : tenu par l'API, exposé avec les métriques du service
+        fitness_service.metrics.register(
+            'coach_coalesced_requests_total', 'counter', "Requêtes ayant rejoint une génération identique en cours",
+            lambda: [({}, single_flight.get_stats()['coalesced'])]
+        )
         logger.info("✅ Service fitness multi-modèles initialisé")
         yield
     except Exception as e:
@@ -48,6 +65,10 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         # Shutdown
+        if fitness_service is not None and fitness_service.snapshot_watcher is not None:
+            fitness_service.snapshot_watcher.stop()
+        if fitness_service is not None and fitness_service.sharded_index is not None:
+            fitness_service.sharded_index.close()
         logger.info("🛑 Arrêt API Coach Fitness")
 
 # Création de l'application FastAPI
@@ -69,6 +90,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# === GÉNÉRATION PARTAGÉE ===
+
+async def generate_coalesced(question: str, profile_dict: Optional[Dict], model_type: Optional[ModelType],
+                             session_id: Optional[str], conversation: bool = False) -> Dict[str, Any]:
+    """Génère une réponse ; les doublons en cours rejoignent la même génération"""
+    conversation = conversation and bool(session_id)
+    
+    # Convertir le model_type si spécifié (auto = routage automatique)
+    auto_route = model_type == ModelType.AUTO
+    target_model = None
+    if model_type and not auto_route:
+        target_model = ServiceModelType(model_type.value)
+    
+    # La clé porte sur le modèle effectivement demandé (y compris celui de la session)
+    model_key = "auto" if auto_route else fitness_service.resolve_model(target_model, session_id).value
+    # En conversation, la réponse dépend de l'historique : pas de partage entre sessions
+    key = request_key(question, model_key, profile_dict, session_id if conversation else None)
+    
+    async def _generate():
+        # File ordonnée par coût attendu, servie par les workers de génération ; la mise en file
+        # (routage, recherche dans la banque FAQ, estimation du prompt) encode la question : hors boucle
+        future = await run_in_threadpool(
+            fitness_service.submit_advice,
+            question,
+            user_profile=profile_dict,
+            model_type=target_model,
+            auto_route=auto_route,
+            session_id=session_id,
+            conversation=conversation
+        )
+        return await asyncio.wrap_future(future)
+    
+    result, coalesced = await single_flight.run(key, _generate)
+    
+    result = dict(result)
+    result['coalesced'] = coalesced
+    return result
+
 # === ENDPOINTS PRINCIPAUX ===
 
 @app.get("/", summary="Page d'accueil")
@@ -80,7 +139,7 @@ async def root():
         "status": "running",
         "docs": "/docs",
         "models": ["DistilGPT-2 Fine-tuné Local", "PlayPart AI Personal Trainer"],
-        "features": ["Model Switching", "RAG", "Multi-language Support"],
+        "features": ["Model Switching", "Auto Routing", "RAG", "Multi-language Support"],
         "streamlit_compatible": True
     }
 
@@ -101,7 +160,8 @@ async def health_check():
                 description=config['description'],
                 path=config['path'],
                 is_local=config['is_local'],
-                loaded=config['loaded']
+                loaded=config['loaded'],
+                version=config.get('version')
             )
         
         return HealthResponse(
@@ -114,6 +174,9 @@ async def health_check():
             total_requests=stats['stats']['total_requests'],
             successful_requests=stats['stats']['successful_requests'],
             average_response_time=stats['stats']['average_response_time'],
+            index_version=stats['index_version'],
+            corpus_version=stats['corpus_version'],
+            index_snapshot=stats['index_snapshot'],
             timestamp=stats['timestamp']
         )
         
@@ -122,13 +185,13 @@ async def health_check():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/models", response_model=AvailableModelsResponse, summary="Modèles disponibles")
-async def get_available_models():
-    """Retourne la liste des modèles disponibles"""
+async def get_available_models(session_id: Optional[str] = None):
+    """Retourne la liste des modèles disponibles (et le modèle actif de la session)"""
     try:
         if fitness_service is None:
             raise HTTPException(status_code=503, detail="Service non disponible")
         
-        models_data = fitness_service.get_available_models()
+        models_data = fitness_service.get_available_models(session_id=session_id)
         
         # Convertir les infos modèles
         models_info = {}
@@ -138,7 +201,8 @@ async def get_available_models():
                 description=config['description'],
                 path=config['path'],
                 is_local=config['is_local'],
-                loaded=config['loaded']
+                loaded=config['loaded'],
+                version=config.get('version')
             )
         
         return AvailableModelsResponse(
@@ -153,43 +217,51 @@ async def get_available_models():
         logger.error(f"❌ Erreur récupération modèles: {e}")
         raise HTTPException(status_code=500, detail="Erreur récupération modèles")
 
+def _switch_response(result: Dict[str, Any]) -> ModelSwitchResponse:
+    """Réponse d'un changement de modèle (session ou défaut)"""
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    
+    # Convertir model_info si présent
+    model_info = None
+    if 'model_info' in result and result['model_info']:
+        config = result['model_info']
+        model_info = ModelInfo(
+            name=config['name'],
+            description=config['description'],
+            path=config['path'],
+            is_local=config['is_local'],
+            loaded=config['loaded'],
+            version=config.get('version')
+        )
+    
+    return ModelSwitchResponse(
+        success=result['success'],
+        message=result['message'],
+        old_model=ModelType(result['old_model'].value) if result.get('old_model') else None,
+        current_model=ModelType(result['current_model'].value if hasattr(result['current_model'], 'value') else result['current_model']),
+        model_info=model_info
+    )
+
 @app.post("/models/switch", response_model=ModelSwitchResponse, summary="Changer de modèle")
 async def switch_model(request: ModelSwitchRequest):
-    """Change le modèle actuel"""
+    """Change le modèle de la session (le modèle par défaut se change via /admin/models/default)"""
     try:
         if fitness_service is None:
             raise HTTPException(status_code=503, detail="Service non disponible")
         
         logger.info(f"🔄 Requête changement vers {request.model_type}")
         
+        if request.model_type == ModelType.AUTO:
+            raise HTTPException(status_code=400, detail="Le mode auto se choisit par requête, pas comme modèle actif")
+        
         # Convertir vers le type du service
         service_model_type = ServiceModelType(request.model_type.value)
         
         # Effectuer le changement
-        result = fitness_service.switch_model(service_model_type)
-        
-        if not result['success']:
-            raise HTTPException(status_code=400, detail=result['message'])
-        
-        # Convertir model_info si présent
-        model_info = None
-        if 'model_info' in result and result['model_info']:
-            config = result['model_info']
-            model_info = ModelInfo(
-                name=config['name'],
-                description=config['description'],
-                path=config['path'],
-                is_local=config['is_local'],
-                loaded=config['loaded']
-            )
+        result = fitness_service.switch_model(service_model_type, session_id=request.session_id)
         
-        return ModelSwitchResponse(
-            success=result['success'],
-            message=result['message'],
-            old_model=ModelType(result.get('old_model', '').replace('ModelType.', '')) if result.get('old_model') else None,
-            current_model=ModelType(result['current_model'].value if hasattr(result['current_model'], 'value') else result['current_model']),
-            model_info=model_info
-        )
+        return _switch_response(result)
         
     except HTTPException:
         raise
@@ -211,17 +283,8 @@ async def get_fitness_advice(request: FitnessRequest):
         # Convertir le profil
         profile_dict = request.profile.dict() if request.profile else None
         
-        # Convertir le model_type si spécifié
-        target_model = None
-        if request.model_type:
-            target_model = ServiceModelType(request.model_type.value)
-        
         # Générer la réponse avec le modèle
-        result = fitness_service.generate_advice(
-            question=request.question,
-            user_profile=profile_dict,
-            model_type=target_model
-        )
+        result = await generate_coalesced(request.question, profile_dict, request.model_type, request.session_id)
         
         logger.info(f"✅ Réponse générée en {result['response_time']:.2f}s avec {result['model_name']}")
         
@@ -247,17 +310,9 @@ async def chat_endpoint(request: ChatRequest):
         # Convertir vers format standard
         profile_dict = request.profile.dict() if request.profile else None
         
-        # Convertir le model_type si spécifié
-        target_model = None
-        if request.model_type:
-            target_model = ServiceModelType(request.model_type.value)
-        
         # Générer réponse avec le modèle
-        result = fitness_service.generate_advice(
-            question=request.message,
-            user_profile=profile_dict,
-            model_type=target_model
-        )
+        result = await generate_coalesced(request.message, profile_dict, request.model_type, request.session_id,
+                                          conversation=request.conversation)
         
         return FitnessResponse(**result)
         
@@ -267,6 +322,22 @@ async def chat_endpoint(request: ChatRequest):
         logger.error(f"❌ Erreur chat: {e}")
         raise HTTPException(status_code=500, detail="Erreur chat")
 
+@app.delete("/sessions/{session_id}", summary="Réinitialiser une conversation")
+async def reset_session(session_id: str):
+    """Oublie l'historique et le cache KV d'une session de conversation"""
+    try:
+        if fitness_service is None:
+            raise HTTPException(status_code=503, detail="Service non disponible")
+        
+        removed = fitness_service.reset_conversation(session_id)
+        return {"session_id": session_id, "reset": removed}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur réinitialisation session: {e}")
+        raise HTTPException(status_code=500, detail="Erreur réinitialisation session")
+
 @app.post("/exercises/search", response_model=ExerciseSearchResponse, summary="Recherche d'exercices")
 async def search_exercises(request: ExerciseSearchRequest):
     """
@@ -278,32 +349,32 @@ async def search_exercises(request: ExerciseSearchRequest):
         
         start_time = datetime.now()
         
-        # Recherche sémantique via RAG
-        relevant_docs = fitness_service.search_relevant_context(
-            request.query, 
-            top_k=request.max_results
-        )
-        
-        # Application des filtres
-        filtered_exercises = []
-        for doc in relevant_docs:
-            # Filtre difficulté
-            if request.difficulty and doc.get('difficulty') != request.difficulty:
-                continue
-                
-            # Filtre groupes musculaires
-            if request.muscle_groups:
-                doc_muscles = doc.get('muscle_groups', [])
-                if not any(muscle in doc_muscles for muscle in request.muscle_groups):
-                    continue
-            
-            filtered_exercises.append(doc)
+        # Recherche sémantique via RAG, filtres appliqués (hors boucle d'événements)
+        page = await _run_search(request, lazy=request.stream)
         
         query_time = (datetime.now() - start_time).total_seconds()
         
+        if request.stream:
+            # NDJSON : seul le classement précède la première ligne ; chaque exercice est lu du store,
+            # projeté et écrit à son tour (itérateur parcouru dans le pool de threads), puis le bilan
+            def _lines():
+                total_found = 0
+                for exercise in page['exercises']:
+                    total_found += 1
+                    yield json.dumps(exercise, ensure_ascii=False) + "\n"
+                yield json.dumps({
+                    'total_found': total_found,
+                    'total_candidates': page['total_candidates'],
+                    'next_cursor': page['next_cursor'],
+                    'query_time': (datetime.now() - start_time).total_seconds()
+                }) + "\n"
+            return StreamingResponse(_lines(), media_type="application/x-ndjson")
+        
         return ExerciseSearchResponse(
-            exercises=filtered_exercises,
-            total_found=len(filtered_exercises),
+            exercises=page['exercises'],
+            total_found=len(page['exercises']),
+            total_candidates=page['total_candidates'],
+            next_cursor=page['next_cursor'],
             query_time=query_time
         )
         
@@ -313,36 +384,114 @@ async def search_exercises(request: ExerciseSearchRequest):
         logger.error(f"❌ Erreur recherche exercices: {e}")
         raise HTTPException(status_code=500, detail="Erreur recherche exercices")
 
+@app.post("/exercises/search/batch", response_model=ExerciseBatchSearchResponse, summary="Recherche d'exercices multiple")
+async def search_exercises_batch(request: ExerciseBatchSearchRequest):
+    """
+    Plusieurs recherches d'exercices en parallèle (requêtes encodées dans un même lot)
+    """
+    try:
+        if fitness_service is None:
+            raise HTTPException(status_code=503, detail="Service non disponible")
+        
+        start_time = datetime.now()
+        
+        async def _timed(search: ExerciseSearchRequest) -> ExerciseSearchResponse:
+            search_start = datetime.now()
+            page = await _run_search(search)
+            return ExerciseSearchResponse(
+                exercises=page['exercises'],
+                total_found=len(page['exercises']),
+                total_candidates=page['total_candidates'],
+                next_cursor=page['next_cursor'],
+                query_time=(datetime.now() - search_start).total_seconds()
+            )
+        
+        results = await asyncio.gather(*(_timed(search) for search in request.searches))
+        
+        return ExerciseBatchSearchResponse(
+            results=list(results),
+            query_time=(datetime.now() - start_time).total_seconds()
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur recherche multiple: {e}")
+        raise HTTPException(status_code=500, detail="Erreur recherche exercices")
+
+async def _run_search(request: ExerciseSearchRequest, lazy: bool = False) -> Dict[str, Any]:
+    """Page de recherche filtrée exécutée dans le pool de threads (l'encodeur est micro-batché)
+    
+    lazy=True : les exercices restent un itérateur, projetés ligne par ligne à la lecture.
+    """
+    if not request.cursor and not request.query and not (
+            request.difficulty or request.muscle_groups or request.equipment or request.category):
+        raise HTTPException(status_code=400, detail="Requête, filtre ou curseur requis")
+    unknown = set(request.fields or []) - set(PROJECTABLE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(sorted(unknown))}")
+    
+    try:
+        page = await run_in_threadpool(
+            fitness_service.search_exercises_page,
+            request.query,
+            page_size=request.max_results,
+            cursor=request.cursor,
+            difficulty=request.difficulty,
+            muscle_groups=request.muscle_groups,
+            equipment=request.equipment,
+            category=request.category,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            lazy=lazy
+        )
+    except CursorError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    
+    exercises = (project(exercise, request.fields) for exercise in page['exercises'])
+    page['exercises'] = exercises if lazy else list(exercises)
+    return page
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible (RFC 9110) d'un ETag avec la liste d'entités de If-None-Match"""
+    if not if_none_match or not etag:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
 @app.get("/exercises/categories", response_model=CategoriesResponse, summary="Catégories disponibles")
-async def get_exercise_categories():
-    """Retourne les catégories et filtres disponibles"""
+async def get_exercise_categories(request: Request):
+    """Retourne les catégories et filtres disponibles (index de facettes, ETag pour le cache HTTP)"""
     try:
         if fitness_service is None:
             raise HTTPException(status_code=503, detail="Service non disponible")
         
-        # Analyser la base d'exercices
-        all_muscle_groups = set()
-        all_difficulties = set()
-        all_equipment = set()
-        all_categories = set()
-        
-        for exercise in fitness_service.exercise_database:
-            if 'muscle_groups' in exercise:
-                all_muscle_groups.update(exercise['muscle_groups'])
-            if 'difficulty' in exercise:
-                all_difficulties.add(exercise['difficulty'])
-            if 'equipment' in exercise:
-                all_equipment.add(exercise['equipment'])
-            if 'category' in exercise:
-                all_categories.add(exercise['category'])
-        
-        return CategoriesResponse(
-            muscle_groups=sorted(list(all_muscle_groups)),
-            difficulties=sorted(list(all_difficulties)),
-            equipment=sorted(list(all_equipment)),
-            categories=sorted(list(all_categories)),
-            total_exercises=len(fitness_service.exercise_database)
+        facet_index = fitness_service.metadata_index
+        etag = facet_index.etag
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=60, must-revalidate"}
+        
+        # Le client (ou nginx) a déjà cette version
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        facets = facet_index.facets()
+        categories = CategoriesResponse(
+            muscle_groups=list(facets['muscle_groups']),
+            difficulties=list(facets['difficulty']),
+            equipment=list(facets['equipment']),
+            categories=list(facets['category']),
+            counts=facets,
+            total_exercises=facet_index.total_documents
         )
+        return JSONResponse(content=categories.dict(), headers=headers)
         
     except HTTPException:
         raise
@@ -350,6 +499,209 @@ async def get_exercise_categories():
         logger.error(f"❌ Erreur catégories: {e}")
         raise HTTPException(status_code=500, detail="Erreur récupération catégories")
 
+# === ADMINISTRATION DU CORPUS ===
+
+# Erreurs de validation rapportées dans la réponse d'ingestion
+MAX_REPORTED_ERRORS = 20
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Jeton d'administration exigé ; sans ADMIN_TOKEN les routes /admin sont fermées
+    (sauf ADMIN_AUTH_DISABLED=true, pour le développement local)"""
+    settings = get_settings()
+    if not settings.admin_auth_disabled:
+        if not settings.admin_token:
+            raise HTTPException(status_code=503, detail="Administration désactivée : ADMIN_TOKEN non défini")
+        if not x_admin_token or not secrets.compare_digest(x_admin_token.encode("utf-8"),
+                                                           settings.admin_token.encode("utf-8")):
+            raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+    if fitness_service is None:
+        raise HTTPException(status_code=503, detail="Service non disponible")
+
+@app.post("/admin/exercises", response_model=DocumentChangeResponse, summary="Ajouter un exercice",
+          dependencies=[Depends(require_admin)])
+async def add_exercise(document: Dict[str, Any]):
+    """Ajoute un document au corpus (visible immédiatement dans la recherche)"""
+    try:
+        validated = validate_document(document)
+        result = await run_in_threadpool(fitness_service.upsert_documents, [validated], mode='add')
+        return DocumentChangeResponse(operation="add", ids=result['added'], corpus_version=result['corpus_version'])
+        
+    except DocumentConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except CorpusValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur ajout exercice: {e}")
+        raise HTTPException(status_code=500, detail="Erreur ajout exercice")
+
+@app.put("/admin/exercises/{doc_id}", response_model=DocumentChangeResponse, summary="Modifier un exercice",
+         dependencies=[Depends(require_admin)])
+async def update_exercise(doc_id: str, document: Dict[str, Any]):
+    """Remplace un document existant (seul son vecteur est ré-encodé)"""
+    try:
+        resolved_id = fitness_service.resolve_document_id(doc_id)
+        result = await run_in_threadpool(fitness_service.upsert_documents, [{**document, 'id': resolved_id}],
+                                         mode='update')
+        return DocumentChangeResponse(operation="update", ids=result['updated'], corpus_version=result['corpus_version'])
+        
+    except DocumentConflictError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except CorpusValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur modification exercice: {e}")
+        raise HTTPException(status_code=500, detail="Erreur modification exercice")
+
+@app.delete("/admin/exercises/{doc_id}", response_model=DocumentChangeResponse, summary="Supprimer un exercice",
+            dependencies=[Depends(require_admin)])
+async def delete_exercise(doc_id: str):
+    """Retire un document du corpus, de l'index et des facettes"""
+    try:
+        result = await run_in_threadpool(fitness_service.delete_documents, [fitness_service.resolve_document_id(doc_id)])
+        if not result['deleted']:
+            raise HTTPException(status_code=404, detail=f"Document introuvable: {doc_id}")
+        return DocumentChangeResponse(operation="delete", ids=result['deleted'], corpus_version=result['corpus_version'])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur suppression exercice: {e}")
+        raise HTTPException(status_code=500, detail="Erreur suppression exercice")
+
+@app.post("/admin/exercises/bulk", response_model=BulkIngestResponse, summary="Ingestion NDJSON",
+          dependencies=[Depends(require_admin)])
+async def bulk_ingest_exercises(request: Request):
+    """
+    Ingestion d'un flux NDJSON (un document par ligne), encodé par lots au fil de l'upload.
+    Le corps n'est lu plus avant qu'une fois le lot précédent indexé (contre-pression).
+    
+    Les lots déjà indexés restent appliqués si l'ingestion s'interrompt : la réponse (500)
+    porte alors leurs compteurs, avec completed=False.
+    """
+    start_time = datetime.now()
+    batch_size = get_settings().rag_batch_size
+    counts = {'received': 0, 'added': 0, 'updated': 0, 'invalid': 0, 'batches': 0}
+    errors: List[str] = []
+    batch: List[Dict[str, Any]] = []
+    
+    def _parse(line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        counts['received'] += 1
+        source = f"ligne {counts['received']}"
+        try:
+            batch.append(validate_document(json.loads(line), source))
+        except (ValueError, CorpusValidationError) as e:
+            counts['invalid'] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(str(e) if isinstance(e, CorpusValidationError) else f"{source}: JSON invalide")
+    
+    async def _flush():
+        if not batch:
+            return
+        result = await run_in_threadpool(fitness_service.upsert_documents, list(batch))
+        batch.clear()
+        counts['added'] += len(result['added'])
+        counts['updated'] += len(result['updated'])
+        counts['batches'] += 1
+    
+    try:
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                _parse(line)
+                if len(batch) >= batch_size:
+                    await _flush()
+        _parse(pending)
+        await _flush()
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur ingestion NDJSON après {counts['batches']} lots: {e}")
+        partial = BulkIngestResponse(
+            **counts,
+            errors=errors,
+            completed=False,
+            error=f"Ingestion interrompue après {counts['batches']} lots appliqués",
+            corpus_version=fitness_service.corpus_version,
+            duration=(datetime.now() - start_time).total_seconds()
+        )
+        return JSONResponse(status_code=500, content=partial.dict())
+    
+    logger.info(f"📥 Ingestion NDJSON: {counts['added']} ajoutés, {counts['updated']} modifiés, {counts['invalid']} invalides")
+    
+    return BulkIngestResponse(
+        **counts,
+        errors=errors,
+        corpus_version=fitness_service.corpus_version,
+        duration=(datetime.now() - start_time).total_seconds()
+    )
+
+@app.post("/admin/models/default", response_model=ModelSwitchResponse, summary="Changer le modèle par défaut",
+          dependencies=[Depends(require_admin)])
+async def set_default_model(request: DefaultModelRequest):
+    """Change le modèle des sessions qui n'en ont pas choisi"""
+    try:
+        if request.model_type == ModelType.AUTO:
+            raise HTTPException(status_code=400, detail="Le mode auto se choisit par requête, pas comme modèle actif")
+        
+        logger.info(f"🔄 Modèle par défaut demandé: {request.model_type}")
+        result = await run_in_threadpool(fitness_service.set_default_model, ServiceModelType(request.model_type.value))
+        return _switch_response(result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur changement modèle par défaut: {e}")
+        raise HTTPException(status_code=500, detail="Erreur changement modèle par défaut")
+
+@app.post("/admin/models/reload", response_model=ModelReloadResponse, summary="Recharger une nouvelle version de modèle",
+          dependencies=[Depends(require_admin)])
+async def reload_model(request: ModelReloadRequest):
+    """
+    Charge une nouvelle version en arrière-plan puis l'active atomiquement.
+    Les requêtes en cours terminent sur l'ancienne version avant sa libération.
+    """
+    try:
+        if request.model_type == ModelType.AUTO:
+            raise HTTPException(status_code=400, detail="Le mode auto n'est pas un modèle rechargeable")
+        
+        logger.info(f"🔁 Rechargement demandé: {request.model_type} ({request.version or 'version auto'})")
+        
+        try:
+            result = fitness_service.reload_model(
+                ServiceModelType(request.model_type.value),
+                model_path=request.model_path,
+                version=request.version
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if not result['success']:
+            raise HTTPException(status_code=409, detail=result['message'])
+        
+        return ModelReloadResponse(**result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur rechargement modèle: {e}")
+        raise HTTPException(status_code=500, detail="Erreur rechargement modèle")
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Métriques Prometheus")
+async def metrics_endpoint():
+    """Histogrammes de latence par étape et par modèle, au format texte Prometheus"""
+    if fitness_service is None:
+        raise HTTPException(status_code=503, detail="Service non disponible")
+    
+    return PlainTextResponse(fitness_service.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/stats", response_model=StatsResponse, summary="Statistiques du service")
 async def get_service_stats():
     """Statistiques détaillées du service multi-modèles"""
@@ -367,7 +719,8 @@ async def get_service_stats():
                 description=config['description'],
                 path=config['path'],
                 is_local=config['is_local'],
-                loaded=config['loaded']
+                loaded=config['loaded'],
+                version=config.get('version')
             )
         
         return StatsResponse(
@@ -379,8 +732,24 @@ async def get_service_stats():
             total_requests=stats['stats']['total_requests'],
             successful_requests=stats['stats']['successful_requests'],
             fallback_requests=stats['stats']['fallback_requests'],
+            faq_answers=stats['stats']['faq_answers'],
             average_response_time=stats['stats']['average_response_time'],
             model_usage=stats['stats']['model_usage'],
+            routing=stats['routing'],
+            registry=stats['registry'],
+            coalescing=single_flight.get_stats(),
+            conversations=stats['conversations'],
+            scheduler=stats['scheduler'],
+            embedding_batcher=stats['embedding_batcher'],
+            retrieval_cache=stats['retrieval_cache'],
+            search_cursors=stats['search_cursors'],
+            exercise_store=stats['exercise_store'],
+            live_index=stats['live_index'],
+            shards=stats['shards'],
+            corpus_version=stats['corpus_version'],
+            retrieval_cascade=stats['retrieval_cascade'],
+            profile_filtering=stats['profile_filtering'],
+            faq_bank=stats['faq_bank'],
             exercise_database_size=stats['exercise_database_size'],
             last_request_time=stats['stats']['last_request_time'].isoformat() if stats['stats']['last_request_time'] else None,
             timestamp=stats['timestamp']
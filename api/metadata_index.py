@@ -0,0 +1,237 @@
+# api/metadata_index.py - Index inversés (bitmaps) sur les métadonnées des exercices
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Champs filtrables ; muscle_groups est multi-valué (un document dans plusieurs bitmaps)
+FACET_FIELDS = ("difficulty", "muscle_groups", "equipment", "category")
+# Masques de compatibilité (profils) gardés entre deux modifications du corpus
+ADMISSIBLE_CACHE_SIZE = 256
+
+
+def _field_values(document: Dict[str, Any], field: str) -> List[str]:
+    value = document.get(field)
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def active_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Filtres renseignés, chaque valeur sous forme de liste (OU entre valeurs, ET entre champs)"""
+    active = {}
+    for field, value in (filters or {}).items():
+        if field not in FACET_FIELDS or not value:
+            continue
+        active[field] = list(value) if isinstance(value, (list, tuple, set)) else [value]
+    return active
+
+
+class MetadataIndex:
+    """Bitmap par (champ, valeur) sur les positions des documents du corpus
+
+    La position d'un document est aussi son identifiant dans l'index FAISS, ce qui
+    permet d'appliquer les filtres pendant la recherche vectorielle. Les comptes par
+    valeur (facettes) sont tenus à jour à chaque ajout / modification / suppression.
+    """
+
+    def __init__(self, size: int = 0):
+        self.size = size
+        self._capacity = max(size, 16)
+        self._bitmaps: Dict[str, Dict[str, np.ndarray]] = {field: {} for field in FACET_FIELDS}
+        self._counts: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS}
+        # Positions occupées par un document (les suppressions laissent des trous)
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._admissible: Dict[Tuple, np.ndarray] = {}
+        self.admissible_hits = 0
+        self.admissible_misses = 0
+        self.total_documents = 0
+        self.version = 0
+        self._etag: Optional[str] = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_documents(cls, documents: Sequence[Dict[str, Any]]) -> "MetadataIndex":
+        index = cls(len(documents))
+        for position, document in enumerate(documents):
+            index._index_document(position, document, +1)
+        index._live[:len(documents)] = True
+        index.total_documents = len(documents)
+        return index
+
+    @classmethod
+    def from_store(cls, store) -> "MetadataIndex":
+        """Construction vectorisée depuis les colonnes encodées d'un ExerciseStore"""
+        index = cls(len(store))
+        for field in FACET_FIELDS:
+            for value, rows in store.facet_positions(field).items():
+                if len(rows):
+                    index._bitmap(field, value)[rows] = True
+                    index._counts[field][value] = len(rows)
+        index._live[:len(store)] = True
+        index.total_documents = len(store)
+        return index
+
+    def _bitmap(self, field: str, value: str) -> np.ndarray:
+        bitmap = self._bitmaps[field].get(value)
+        if bitmap is None:
+            bitmap = np.zeros(self._capacity, dtype=bool)
+            self._bitmaps[field][value] = bitmap
+        return bitmap
+
+    def _index_document(self, position: int, document: Dict[str, Any], delta: int):
+        """Ajoute (delta=+1) ou retire (delta=-1) un document des bitmaps et des comptes"""
+        for field in FACET_FIELDS:
+            counts = self._counts[field]
+            for value in set(_field_values(document, field)):
+                self._bitmap(field, value)[position] = delta > 0
+                counts[value] = counts.get(value, 0) + delta
+                if counts[value] <= 0:
+                    del counts[value]
+
+    def _grow(self, size: int):
+        if size > self._capacity:
+            self._capacity = max(size, 2 * self._capacity)
+            for bitmaps in self._bitmaps.values():
+                for value, bitmap in bitmaps.items():
+                    grown = np.zeros(self._capacity, dtype=bool)
+                    grown[:len(bitmap)] = bitmap
+                    bitmaps[value] = grown
+            live = np.zeros(self._capacity, dtype=bool)
+            live[:len(self._live)] = self._live
+            self._live = live
+        self.size = max(self.size, size)
+
+    def _changed(self):
+        self.version += 1
+        self._etag = None
+        self._admissible.clear()
+
+    # === MAINTENANCE INCRÉMENTALE ===
+
+    def add(self, position: int, document: Dict[str, Any]):
+        with self._lock:
+            self._grow(position + 1)
+            self._index_document(position, document, +1)
+            self._live[position] = True
+            self.total_documents += 1
+            self._changed()
+
+    def update(self, position: int, old_document: Dict[str, Any], new_document: Dict[str, Any]):
+        with self._lock:
+            self._index_document(position, old_document, -1)
+            self._index_document(position, new_document, +1)
+            self._changed()
+
+    def remove(self, position: int, document: Dict[str, Any]):
+        with self._lock:
+            self._index_document(position, document, -1)
+            self._live[position] = False
+            self.total_documents -= 1
+            self._changed()
+
+    # === LECTURE ===
+
+    def match(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Masque des documents satisfaisant les filtres, ou None sans filtre"""
+        active = active_filters(filters)
+        if not active:
+            return None
+
+        with self._lock:
+            mask = np.ones(self.size, dtype=bool)
+            for field, values in active.items():
+                field_mask = np.zeros(self.size, dtype=bool)
+                for value in values:
+                    bitmap = self._bitmaps[field].get(str(value))
+                    if bitmap is not None:
+                        field_mask |= bitmap[:self.size]
+                mask &= field_mask
+        return mask
+
+    def admissible(self, constraints: Optional[Dict[str, Sequence[str]]]) -> Optional[np.ndarray]:
+        """Masque des documents compatibles avec des contraintes (profil utilisateur), ou None
+
+        Contrairement à match(), un document sans valeur pour le champ reste admissible
+        (conseils de nutrition ou de récupération sans équipement renseigné). Le masque de
+        chaque combinaison est calculé une fois puis réutilisé jusqu'à la prochaine
+        modification du corpus ; il est en lecture seule.
+        """
+        active = active_filters(constraints)
+        if not active:
+            return None
+        key = tuple(sorted((field, tuple(sorted(set(map(str, values))))) for field, values in active.items()))
+
+        with self._lock:
+            mask = self._admissible.get(key)
+            if mask is not None:
+                self.admissible_hits += 1
+                return mask
+            self.admissible_misses += 1
+
+            mask = self._live[:self.size].copy()
+            for field, values in key:
+                present = np.zeros(self.size, dtype=bool)
+                for bitmap in self._bitmaps[field].values():
+                    present |= bitmap[:self.size]
+                field_mask = ~present
+                for value in values:
+                    bitmap = self._bitmaps[field].get(value)
+                    if bitmap is not None:
+                        field_mask |= bitmap[:self.size]
+                mask &= field_mask
+            mask.setflags(write=False)
+
+            if len(self._admissible) >= ADMISSIBLE_CACHE_SIZE:
+                self._admissible.clear()
+            self._admissible[key] = mask
+        return mask
+
+    def admissible_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'cached_combinations': len(self._admissible),
+                'hits': self.admissible_hits,
+                'misses': self.admissible_misses
+            }
+
+    def values(self, field: str) -> List[str]:
+        with self._lock:
+            return sorted(self._counts[field])
+
+    def facets(self) -> Dict[str, Dict[str, int]]:
+        """Comptes de documents par valeur de chaque champ (O(nombre de valeurs))"""
+        with self._lock:
+            return {field: dict(sorted(counts.items())) for field, counts in self._counts.items()}
+
+    @property
+    def etag(self) -> str:
+        """Empreinte du contenu des facettes : identique entre workers pour un même corpus"""
+        with self._lock:
+            if self._etag is None:
+                payload = json.dumps([self.facets(), self.total_documents], sort_keys=True)
+                self._etag = f'"{hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]}"'
+            return self._etag
+
+
+def id_selector(mask: np.ndarray):
+    """Sélecteur FAISS des positions retenues par le masque"""
+    packed = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+    # Le sélecteur ne copie pas le bitmap : le garder en vie avec lui
+    selector.referenced_objects = [packed]
+    # Part des positions retenues : règle le sur-échantillonnage des index sans sélecteur natif
+    selector.selectivity = float(mask.mean()) if len(mask) else 0.0
+    return selector
+
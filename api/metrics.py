@@ -0,0 +1,181 @@
+# api/metrics.py - Histogrammes de latence par étape de génération, exposés au format texte Prometheus
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bornes fixes (secondes) : de l'encodage d'une requête à une génération longue sur CPU
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+
+# Échantillon d'une métrique simple (compteur / jauge) : (étiquettes, valeur)
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    """Histogramme à bornes fixes, une série par combinaison d'étiquettes
+
+    observe() coûte une recherche dichotomique et trois incréments sous verrou :
+    négligeable devant une génération.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Par série : [compte par intervalle (+Inf en dernier), somme, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in sorted(snapshot):
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class StageTimings:
+    """Durées des étapes d'une requête de génération (perf_counter)"""
+
+    __slots__ = ('start', 'stages', 'first_token_at')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.first_token_at: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_generation(self, started: float, first_token_at: Optional[float], finished: float):
+        """Découpe un appel à model.generate en pré-remplissage (jusqu'au premier token) et décodage"""
+        if first_token_at is None:
+            self.add("prefill", finished - started)
+            return
+        self.first_token_at = first_token_at
+        self.add("prefill", first_token_at - started)
+        self.add("decode", finished - first_token_at)
+
+
+class FirstTokenStreamer:
+    """Streamer minimal pour model.generate : note l'instant du premier token généré
+
+    generate() transmet d'abord le prompt, puis chaque token produit ; seul le
+    premier token généré est horodaté (aucune copie ni décodage).
+    """
+
+    def __init__(self):
+        self.first_token_at: Optional[float] = None
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+        elif self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+class ServiceMetrics:
+    """Histogrammes du service et rendu de l'exposition Prometheus (/metrics)"""
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            "coach_request_duration_seconds", "Durée de traitement d'une requête de conseil (hors file d'attente)",
+            ("model", "outcome")
+        )
+        self.stage_duration = Histogram(
+            "coach_stage_duration_seconds", "Durée de chaque étape de generate_advice", ("model", "stage")
+        )
+        self.time_to_first_token = Histogram(
+            "coach_time_to_first_token_seconds", "Délai entre le début du traitement et le premier token généré",
+            ("model",)
+        )
+        self.tokens_per_second = Histogram(
+            "coach_decode_tokens_per_second", "Débit de décodage (tokens générés après le premier, par seconde)",
+            ("model",), buckets=TOKENS_PER_SECOND_BUCKETS
+        )
+        self.queue_wait = Histogram(
+            "coach_queue_wait_seconds", "Attente dans la file de génération", ("model",)
+        )
+        self._histograms = [self.request_duration, self.stage_duration, self.time_to_first_token,
+                            self.tokens_per_second, self.queue_wait]
+        # Compteurs et jauges lus à la demande : (nom, type, description, fonction d'échantillons)
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def observe_queue_wait(self, model_key: str, seconds: float):
+        self.queue_wait.observe(seconds, model_key)
+
+    def record_request(self, model_key: str, timings: StageTimings, outcome: str,
+                       generated_tokens: Optional[int] = None):
+        """Enregistre les étapes d'une requête terminée (outcome : generated, fallback, faq)"""
+        self.request_duration.observe(time.perf_counter() - timings.start, model_key, outcome)
+        for stage, seconds in timings.stages.items():
+            self.stage_duration.observe(seconds, model_key, stage)
+        if timings.first_token_at is not None:
+            self.time_to_first_token.observe(timings.first_token_at - timings.start, model_key)
+            decode = timings.stages.get("decode", 0.0)
+            if generated_tokens and generated_tokens > 1 and decode > 0:
+                self.tokens_per_second.observe((generated_tokens - 1) / decode, model_key)
+
+    def register(self, name: str, metric_type: str, documentation: str, collect: Callable[[], Iterable[Sample]]):
+        self._collectors.append((name, metric_type, documentation, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        for name, metric_type, documentation, collect in self._collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
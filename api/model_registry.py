@@ -0,0 +1,160 @@
+# api/model_registry.py - Registre de modèles versionnés, thread-safe, avec comptage de références
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHandle:
+    """Version chargée d'un modèle (modèle + tokenizer) partagée entre requêtes"""
+
+    def __init__(self, model_key: str, version: str, model: Any, tokenizer: Any):
+        self.model_key = model_key
+        self.version = version
+        self.model = model
+        self.tokenizer = tokenizer
+        self.loaded_at = datetime.now()
+        self.ref_count = 0
+        self.retired = False
+
+    @property
+    def freed(self) -> bool:
+        return self.model is None
+
+
+class ModelRegistry:
+    """Registre des modèles actifs
+
+    - chaque requête acquiert un handle (comptage de références) et le relâche à la fin ;
+    - publier une nouvelle version remplace atomiquement le handle actif ;
+    - l'ancienne version est libérée quand sa dernière requête en cours se termine ;
+    - le modèle par défaut est choisi par session, sans état global partagé.
+    """
+
+    def __init__(self, on_free: Optional[Callable[[ModelHandle], None]] = None, max_sessions: int = 10000):
+        self._lock = threading.Lock()
+        self._active: Dict[str, ModelHandle] = {}
+        self._retired: Dict[int, ModelHandle] = {}
+        self._session_models: "OrderedDict[str, str]" = OrderedDict()
+        self._max_sessions = max_sessions
+        self._on_free = on_free
+
+    # === VERSIONS ===
+
+    def publish(self, model_key: str, model: Any, tokenizer: Any, version: str) -> ModelHandle:
+        """Active une nouvelle version ; l'ancienne reste servie jusqu'à la fin de ses requêtes"""
+        handle = ModelHandle(model_key, version, model, tokenizer)
+        to_free = None
+
+        with self._lock:
+            old = self._active.get(model_key)
+            self._active[model_key] = handle
+            if old is not None:
+                old.retired = True
+                if old.ref_count == 0:
+                    to_free = old
+                else:
+                    self._retired[id(old)] = old
+
+        if old is not None:
+            logger.info(f"🔁 {model_key}: version {old.version} → {version}")
+        if to_free is not None:
+            self._free(to_free)
+        return handle
+
+    def unload(self, model_key: str):
+        """Retire le modèle actif (libéré dès qu'il n'est plus utilisé)"""
+        to_free = None
+        with self._lock:
+            old = self._active.pop(model_key, None)
+            if old is not None:
+                old.retired = True
+                if old.ref_count == 0:
+                    to_free = old
+                else:
+                    self._retired[id(old)] = old
+        if to_free is not None:
+            self._free(to_free)
+
+    def is_loaded(self, model_key: str) -> bool:
+        with self._lock:
+            return model_key in self._active
+
+    def get_version(self, model_key: str) -> Optional[str]:
+        with self._lock:
+            handle = self._active.get(model_key)
+            return handle.version if handle else None
+
+    @contextmanager
+    def acquire(self, model_key: str) -> Iterator[ModelHandle]:
+        """Réserve la version active d'un modèle pour la durée d'une requête"""
+        with self._lock:
+            handle = self._active.get(model_key)
+            if handle is None:
+                raise KeyError(f"Modèle non chargé: {model_key}")
+            handle.ref_count += 1
+
+        try:
+            yield handle
+        finally:
+            to_free = None
+            with self._lock:
+                handle.ref_count -= 1
+                if handle.retired and handle.ref_count == 0:
+                    self._retired.pop(id(handle), None)
+                    to_free = handle
+            if to_free is not None:
+                self._free(to_free)
+
+    def _free(self, handle: ModelHandle):
+        if handle.freed:
+            return
+        logger.info(f"🧹 Libération {handle.model_key} version {handle.version}")
+        if self._on_free:
+            try:
+                self._on_free(handle)
+            except Exception as e:
+                logger.warning(f"⚠️ Erreur libération modèle: {e}")
+        handle.model = None
+        handle.tokenizer = None
+
+    # === SESSIONS ===
+
+    def set_session_model(self, session_id: str, model_key: str):
+        with self._lock:
+            self._session_models[session_id] = model_key
+            self._session_models.move_to_end(session_id)
+            while len(self._session_models) > self._max_sessions:
+                self._session_models.popitem(last=False)
+
+    def get_session_model(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id:
+            return None
+        with self._lock:
+            model_key = self._session_models.get(session_id)
+            if model_key is not None:
+                self._session_models.move_to_end(session_id)
+            return model_key
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": {
+                    key: {
+                        "version": handle.version,
+                        "in_flight": handle.ref_count,
+                        "loaded_at": handle.loaded_at.isoformat()
+                    }
+                    for key, handle in self._active.items()
+                },
+                "draining": [
+                    {"model": handle.model_key, "version": handle.version, "in_flight": handle.ref_count}
+                    for handle in self._retired.values()
+                ],
+                "sessions": len(self._session_models)
+            }
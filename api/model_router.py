@@ -0,0 +1,206 @@
+# api/model_router.py - Routage automatique vers le modèle adapté le moins coûteux
+
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Any, Iterable
+
+# Langue gérée par chaque modèle (les valeurs correspondent à ModelType.value)
+MODEL_LANGUAGES = {
+    "local_distilgpt2": "fr",
+    "playpart_trainer": "en",
+}
+
+# Intentions bien couvertes par chaque modèle (PlayPart : entraîneur, sans nutrition ni récupération)
+MODEL_INTENTS = {
+    "local_distilgpt2": {"nutrition", "recovery", "cardio", "strength", "general"},
+    "playpart_trainer": {"cardio", "strength", "general"},
+}
+
+# Mots-outils les plus fréquents par langue
+_STOPWORDS = {
+    "fr": {
+        "le", "la", "les", "un", "une", "des", "du", "de", "et", "ou", "est", "pour",
+        "que", "qui", "quoi", "comment", "quel", "quelle", "quels", "quelles", "je",
+        "tu", "il", "nous", "vous", "mon", "ma", "mes", "ton", "votre", "vos", "avec",
+        "sans", "dans", "sur", "par", "pas", "plus", "faire", "faut", "combien", "au",
+        "aux", "ce", "cette", "ces", "suis", "veux", "peux", "dois",
+    },
+    "en": {
+        "the", "a", "an", "and", "or", "is", "are", "for", "what", "which", "who",
+        "how", "i", "you", "he", "we", "my", "your", "with", "without", "in", "on",
+        "by", "not", "more", "do", "does", "should", "can", "much", "many", "to",
+        "of", "this", "that", "these", "am", "want", "best", "good",
+    },
+}
+
+# Trigrammes de caractères caractéristiques de chaque langue
+_TRIGRAMS = {
+    "fr": {
+        " de", "es ", "ent", "de ", " le", "le ", "ion", "tio", " la", "re ", "que",
+        "ou ", " qu", "eme", "men", " co", "ons", "our", "ais", "eur", "aux", " po",
+        "ati", "nt ", "ie ", "er ", "me ", "pom", "omp", "cio", "eux",
+    },
+    "en": {
+        " th", "the", "he ", "ing", "ng ", "and", " an", "nd ", " to", "to ", "ion",
+        "ed ", " of", "of ", "er ", " wh", "wha", "hat", "at ", " ho", "how", "ow ",
+        "st ", "for", "or ", "ght", "ise", "out", " wo", "ork",
+    },
+}
+
+# Caractères accentués typiquement français
+_FRENCH_CHARS = set("éèêàâùûôîïçœ")
+
+# Intentions détectées par mots-clés (français + anglais)
+_INTENT_KEYWORDS = {
+    "nutrition": ["nutrition", "protéine", "proteine", "protein", "manger", "eat", "diet",
+                  "régime", "regime", "repas", "meal", "calorie", "hydrat"],
+    "recovery": ["récupération", "recuperation", "recovery", "sommeil", "sleep", "repos",
+                 "rest", "étirement", "etirement", "stretch", "douleur", "pain"],
+    "cardio": ["cardio", "course", "courir", "running", "run", "vélo", "velo", "bike",
+               "endurance", "marche", "walk"],
+    "strength": ["muscle", "force", "strength", "pompes", "push", "squat", "pull",
+                 "traction", "haut du corps", "upper body", "abdos", "abs", "exercice",
+                 "exercise", "workout", "séance", "seance", "entraînement", "training"],
+}
+
+
+def _strip_accents(text: str) -> str:
+    return ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+
+
+def _char_trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def detect_language(text: str) -> Dict[str, Any]:
+    """Détecte la langue (fr/en) par mots-outils, accents et trigrammes de caractères"""
+    lowered = text.lower()
+    words = re.findall(r"[a-zàâäéèêëîïôöùûüçœ']+", lowered)
+    scores = {"fr": 0.0, "en": 0.0}
+
+    for word in words:
+        for language, stopwords in _STOPWORDS.items():
+            if word in stopwords:
+                scores[language] += 2.0
+
+    scores["fr"] += 3.0 * sum(1 for char in lowered if char in _FRENCH_CHARS)
+
+    trigrams = _char_trigrams(_strip_accents(' '.join(words)))
+    for language, profile in _TRIGRAMS.items():
+        scores[language] += 0.5 * sum(count for gram, count in trigrams.items() if gram in profile)
+
+    total = scores["fr"] + scores["en"]
+    if total == 0:
+        return {"language": "unknown", "confidence": 0.0, "scores": scores}
+
+    language = "fr" if scores["fr"] >= scores["en"] else "en"
+    return {
+        "language": language,
+        "confidence": round(scores[language] / total, 3),
+        "scores": scores
+    }
+
+
+def detect_intent(text: str) -> str:
+    """Détecte l'intention principale de la question"""
+    lowered = text.lower()
+    best_intent, best_hits = "general", 0
+    for intent, keywords in _INTENT_KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if keyword in lowered)
+        if hits > best_hits:
+            best_intent, best_hits = intent, hits
+    return best_intent
+
+
+class ModelRouter:
+    """Choisit le modèle le moins coûteux capable de traiter une requête
+
+    Le coût attendu d'un modèle est sa latence moyenne observée (moyenne mobile
+    exponentielle) multipliée par le nombre de requêtes en cours ou en file plus une.
+    """
+
+    def __init__(self, default_latencies: Optional[Dict[str, float]] = None, alpha: float = 0.2,
+                 queue_depth_fn: Optional[Callable[[str], int]] = None):
+        self.alpha = alpha
+        self.queue_depth_fn = queue_depth_fn
+        self._lock = threading.Lock()
+        self._latency = dict(default_latencies or {})
+        self._in_flight: Dict[str, int] = {}
+        self._decisions: Counter = Counter()
+
+    def request_started(self, model_key: str):
+        with self._lock:
+            self._in_flight[model_key] = self._in_flight.get(model_key, 0) + 1
+
+    def request_finished(self, model_key: str, latency: Optional[float] = None):
+        with self._lock:
+            self._in_flight[model_key] = max(0, self._in_flight.get(model_key, 0) - 1)
+            if latency is not None:
+                previous = self._latency.get(model_key)
+                self._latency[model_key] = latency if previous is None else (
+                    self.alpha * latency + (1 - self.alpha) * previous
+                )
+
+    def expected_cost(self, model_key: str) -> float:
+        queued = self.queue_depth_fn(model_key) if self.queue_depth_fn else 0
+        with self._lock:
+            latency = self._latency.get(model_key, 1.0)
+            return latency * (self._in_flight.get(model_key, 0) + queued + 1)
+
+    def route(self, question: str, available_models: Iterable[str]) -> Dict[str, Any]:
+        """Retourne la décision de routage pour une question"""
+        available = list(available_models)
+        if not available:
+            raise ValueError("Aucun modèle disponible pour le routage")
+
+        language = detect_language(question)
+        intent = detect_intent(question)
+
+        # Modèles capables de répondre dans la langue détectée, puis couvrant l'intention
+        adequate = [m for m in available if MODEL_LANGUAGES.get(m) == language["language"]]
+        pool = adequate or available
+        covering = [m for m in pool if intent in MODEL_INTENTS.get(m, {"general"})]
+        candidates: List[str] = covering or pool
+
+        costs = {model: self.expected_cost(model) for model in candidates}
+        selected = min(candidates, key=lambda model: costs[model])
+
+        if not adequate:
+            reason = f"aucun modèle {language['language']} disponible"
+        elif len(adequate) == 1:
+            reason = f"seul modèle adapté à la langue {language['language']}"
+        else:
+            reason = f"modèle {language['language']}"
+        if not covering:
+            reason += f", aucun ne couvre l'intention {intent} : modèle le moins chargé"
+        elif len(candidates) == 1:
+            reason += f", seul à couvrir l'intention {intent}"
+        else:
+            reason += f", intention {intent}, coût attendu le plus faible"
+
+        with self._lock:
+            self._decisions[selected] += 1
+
+        return {
+            "selected_model": selected,
+            "language": language["language"],
+            "language_confidence": language["confidence"],
+            "intent": intent,
+            "candidates": candidates,
+            "expected_costs": {model: round(cost, 4) for model, cost in costs.items()},
+            "reason": reason
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "latency_ewma": dict(self._latency),
+                "in_flight": dict(self._in_flight),
+                "decisions": dict(self._decisions)
+            }
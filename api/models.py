@@ -11,6 +11,7 @@ class ModelType(str, Enum):
     """Types de modèles disponibles"""
     LOCAL_DISTILGPT2 = "local_distilgpt2"
     PLAYPART_TRAINER = "playpart_trainer"
+    AUTO = "auto"  # Routage automatique selon la langue et la charge
 
 # === MODÈLES DE REQUÊTE ===
 
@@ -28,6 +29,8 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=500)
     profile: Optional[UserProfile] = Field(None)
     model_type: Optional[ModelType] = Field(None, description="Modèle à utiliser (optionnel)")
+    session_id: Optional[str] = Field(None, max_length=100, description="Session client (modèle par défaut propre)")
+    conversation: bool = Field(False, description="Conserver l'historique de la session côté serveur")
 
 class FitnessRequest(BaseModel):
     """Requête fitness détaillée avec sélection de modèle"""
@@ -35,10 +38,22 @@ class FitnessRequest(BaseModel):
     profile: Optional[UserProfile] = Field(None)
     context: Optional[str] = Field(None)
     model_type: Optional[ModelType] = Field(None, description="Modèle à utiliser (optionnel)")
+    session_id: Optional[str] = Field(None, max_length=100, description="Session client (modèle par défaut propre)")
 
 class ModelSwitchRequest(BaseModel):
     """Requête de changement de modèle"""
     model_type: ModelType = Field(..., description="Modèle à activer")
+    session_id: str = Field(..., min_length=1, max_length=100, description="Session concernée")
+
+class DefaultModelRequest(BaseModel):
+    """Requête de changement du modèle par défaut (administration)"""
+    model_type: ModelType = Field(..., description="Modèle par défaut des nouvelles sessions")
+
+class ModelReloadRequest(BaseModel):
+    """Requête de chargement d'une nouvelle version de modèle"""
+    model_type: ModelType = Field(..., description="Modèle à recharger")
+    model_path: Optional[str] = Field(None, description="Chemin de la nouvelle version (modèle local)")
+    version: Optional[str] = Field(None, description="Étiquette de version")
 
 # === MODÈLES DE RÉPONSE ===
 
@@ -52,6 +67,13 @@ class FitnessResponse(BaseModel):
     response_time: float = Field(...)
     confidence: str = Field(...)
     rag_enabled: bool = Field(False)
+    model_version: Optional[str] = Field(None)
+    coalesced: bool = Field(False, description="Réponse partagée avec une requête identique en cours")
+    queue_wait: Optional[float] = Field(None, description="Attente dans la file de génération (s)")
+    predicted_tokens: Optional[float] = Field(None)
+    generated_tokens: Optional[int] = Field(None)
+    routing: Optional[Dict[str, Any]] = Field(None, description="Décision de routage (model_type=auto)")
+    faq_cluster: Optional[int] = Field(None, description="Question fréquente servie depuis la banque de réponses")
 
 class ModelInfo(BaseModel):
     """Informations sur un modèle"""
@@ -60,6 +82,7 @@ class ModelInfo(BaseModel):
     path: str = Field(...)
     is_local: bool = Field(...)
     loaded: bool = Field(...)
+    version: Optional[str] = Field(None)
 
 class AvailableModelsResponse(BaseModel):
     """Réponse avec modèles disponibles"""
@@ -75,6 +98,15 @@ class ModelSwitchResponse(BaseModel):
     current_model: ModelType = Field(...)
     model_info: Optional[ModelInfo] = Field(None)
 
+class ModelReloadResponse(BaseModel):
+    """Réponse de rechargement (asynchrone) d'un modèle"""
+    success: bool = Field(...)
+    message: str = Field(...)
+    state: Optional[str] = Field(None)
+    path: Optional[str] = Field(None)
+    requested_version: Optional[str] = Field(None)
+    active_version: Optional[str] = Field(None)
+
 class HealthResponse(BaseModel):
     """Réponse health check"""
     status: str = Field(...)
@@ -86,27 +118,68 @@ class HealthResponse(BaseModel):
     total_requests: int = Field(0)
     successful_requests: int = Field(0)
     average_response_time: float = Field(0.0)
+    index_version: Optional[str] = Field(None, description="Version d'index active sur ce réplica")
+    corpus_version: int = Field(0, description="Modifications à chaud appliquées sur cette version d'index")
+    index_snapshot: Dict[str, Any] = Field(default_factory=dict)
     timestamp: str = Field(...)
 
 class ExerciseSearchRequest(BaseModel):
     """Recherche d'exercices"""
-    query: str = Field(..., min_length=2)
+    query: Optional[str] = Field(None, min_length=2, description="Optionnelle si au moins un filtre est fourni")
     muscle_groups: Optional[List[str]] = Field(default_factory=list)
     difficulty: Optional[str] = Field(None)
-    max_results: Optional[int] = Field(5, ge=1, le=20)
+    equipment: Optional[str] = Field(None)
+    category: Optional[str] = Field(None)
+    max_results: Optional[int] = Field(5, ge=1, le=100, description="Taille de page")
+    nprobe: Optional[int] = Field(None, ge=1, le=4096, description="Listes IVF explorées (index IVF)")
+    ef_search: Optional[int] = Field(None, ge=1, le=4096, description="Largeur de recherche HNSW")
+    cursor: Optional[str] = Field(None, description="Curseur de la page suivante (next_cursor d'une réponse)")
+    fields: Optional[List[str]] = Field(None, description="Champs renvoyés (ex. ['id', 'title'])")
+    stream: bool = Field(False, description="Réponse en NDJSON : un exercice par ligne, puis le bilan")
 
 class ExerciseSearchResponse(BaseModel):
     """Résultats de recherche"""
     exercises: List[Dict[str, Any]] = Field(default_factory=list)
     total_found: int = Field(...)
+    total_candidates: int = Field(0, description="Candidats classés parcourables par curseur (page_size + 1 au plus sur la première page)")
+    next_cursor: Optional[str] = Field(None)
     query_time: float = Field(...)
 
+class ExerciseBatchSearchRequest(BaseModel):
+    """Plusieurs recherches d'exercices en une requête"""
+    searches: List[ExerciseSearchRequest] = Field(..., min_length=1, max_length=32)
+
+class ExerciseBatchSearchResponse(BaseModel):
+    """Résultats d'une recherche multiple (dans l'ordre des recherches)"""
+    results: List[ExerciseSearchResponse] = Field(default_factory=list)
+    query_time: float = Field(...)
+
+class DocumentChangeResponse(BaseModel):
+    """Résultat d'une modification du corpus à chaud"""
+    operation: str = Field(..., description="add, update ou delete")
+    ids: List[Any] = Field(default_factory=list)
+    corpus_version: int = Field(...)
+
+class BulkIngestResponse(BaseModel):
+    """Bilan d'une ingestion NDJSON"""
+    received: int = Field(...)
+    added: int = Field(0)
+    updated: int = Field(0)
+    invalid: int = Field(0)
+    batches: int = Field(0)
+    errors: List[str] = Field(default_factory=list, description="Premières erreurs de validation")
+    completed: bool = Field(True, description="False si l'ingestion s'est interrompue : seuls les lots comptés sont appliqués")
+    error: Optional[str] = Field(None, description="Cause de l'interruption")
+    corpus_version: int = Field(...)
+    duration: float = Field(...)
+
 class CategoriesResponse(BaseModel):
     """Catégories disponibles"""
     muscle_groups: List[str] = Field(default_factory=list)
     difficulties: List[str] = Field(default_factory=list)
     equipment: List[str] = Field(default_factory=list)
     categories: List[str] = Field(default_factory=list)
+    counts: Dict[str, Dict[str, int]] = Field(default_factory=dict, description="Nombre d'exercices par valeur de filtre")
     total_exercises: int = Field(...)
 
 class StatsResponse(BaseModel):
@@ -119,8 +192,24 @@ class StatsResponse(BaseModel):
     total_requests: int = Field(...)
     successful_requests: int = Field(...)
     fallback_requests: int = Field(...)
+    faq_answers: int = Field(0)
     average_response_time: float = Field(...)
     model_usage: Dict[str, int] = Field(default_factory=dict)
+    routing: Dict[str, Any] = Field(default_factory=dict)
+    registry: Dict[str, Any] = Field(default_factory=dict)
+    coalescing: Dict[str, Any] = Field(default_factory=dict)
+    conversations: Dict[str, Any] = Field(default_factory=dict)
+    scheduler: Dict[str, Any] = Field(default_factory=dict)
+    embedding_batcher: Dict[str, Any] = Field(default_factory=dict)
+    retrieval_cache: Dict[str, Any] = Field(default_factory=dict)
+    search_cursors: Dict[str, Any] = Field(default_factory=dict)
+    exercise_store: Dict[str, Any] = Field(default_factory=dict)
+    live_index: Dict[str, Any] = Field(default_factory=dict)
+    shards: Dict[str, Any] = Field(default_factory=dict)
+    corpus_version: int = Field(0)
+    retrieval_cascade: Dict[str, Any] = Field(default_factory=dict)
+    profile_filtering: Dict[str, Any] = Field(default_factory=dict)
+    faq_bank: Dict[str, Any] = Field(default_factory=dict)
     exercise_database_size: int = Field(...)
     last_request_time: Optional[str] = Field(None)
     timestamp: str = Field(...)
@@ -0,0 +1,79 @@
+# api/profile_filters.py - Contraintes de recherche dérivées du profil utilisateur
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Niveaux de difficulté accessibles à chaque niveau de fitness (None = aucun plafond)
+FITNESS_LEVELS: Dict[str, Optional[Tuple[str, ...]]] = {
+    "débutant": ("beginner",),
+    "intermédiaire": ("beginner", "intermediate"),
+    "avancé": None,
+    "beginner": ("beginner",),
+    "intermediate": ("beginner", "intermediate"),
+    "advanced": None
+}
+
+# Équipement du profil (libellés de l'interface) -> valeurs du corpus
+EQUIPMENT_ALIASES = {
+    "aucun": "none",
+    "poids du corps": "none",
+    "haltères": "dumbbells",
+    "élastiques": "resistance bands",
+    "tapis": "mat",
+    "ballon": "ball",
+    "barre de traction": "pull-up bar",
+    "kettlebell": "kettlebell"
+}
+# Les exercices au poids du corps restent toujours accessibles
+BODYWEIGHT = "none"
+
+
+def profile_constraints(user_profile: Optional[Dict[str, Any]]) -> Dict[str, Tuple[str, ...]]:
+    """Contraintes (difficulty, equipment) d'un profil ; {} si le profil ne restreint rien
+
+    Une liste d'équipement vide signifie « non renseigné » : seul un équipement déclaré
+    restreint la recherche. L'objectif et le temps disponible n'ont pas de colonne
+    indexée dans le corpus : ils ne filtrent pas.
+    """
+    if not user_profile:
+        return {}
+
+    constraints = {}
+    level = str(user_profile.get("fitness_level") or "").strip().lower()
+    difficulties = FITNESS_LEVELS.get(level)
+    if difficulties:
+        constraints["difficulty"] = difficulties
+
+    equipment = user_profile.get("equipment") or []
+    if equipment:
+        values = {EQUIPMENT_ALIASES.get(str(item).strip().lower(), str(item).strip().lower()) for item in equipment}
+        values.add(BODYWEIGHT)
+        constraints["equipment"] = tuple(sorted(values))
+    return constraints
+
+
+def relaxations(constraints: Dict[str, Tuple[str, ...]]) -> Iterator[Dict[str, Tuple[str, ...]]]:
+    """Contraintes de plus en plus larges, essayées tant qu'aucun document n'est admissible
+
+    Le niveau est relâché avant l'équipement (on ne propose pas un matériel absent),
+    puis la recherche se fait sans contrainte.
+    """
+    yield constraints
+    if "difficulty" in constraints and "equipment" in constraints:
+        yield {"equipment": constraints["equipment"]}
+    if constraints:
+        yield {}
+
+
+def common_profiles() -> List[Dict[str, Tuple[str, ...]]]:
+    """Combinaisons précalculées au chargement : chaque niveau, avec ou sans équipement"""
+    profiles = []
+    for difficulties in sorted({levels for levels in FITNESS_LEVELS.values() if levels}):
+        profiles.append({"difficulty": difficulties})
+        profiles.append({"difficulty": difficulties, "equipment": (BODYWEIGHT,)})
+    profiles.append({"equipment": (BODYWEIGHT,)})
+    return profiles
+
+
+def cache_signature(constraints: Dict[str, Tuple[str, ...]]) -> Tuple:
+    """Partie de la clé du cache de résultats propre au profil"""
+    return tuple(sorted((field, tuple(sorted(values))) for field, values in constraints.items()))
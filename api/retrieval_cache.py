@@ -0,0 +1,119 @@
+# api/retrieval_cache.py - Cache LRU des embeddings de requêtes et des résultats de recherche
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Forme canonique d'une requête (casse, espaces, Unicode)"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", query)).strip().lower()
+
+
+class LRUCache:
+    """Cache LRU borné et thread-safe avec compteurs de succès"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class RetrievalCache:
+    """Cache à deux niveaux pour la recherche RAG
+
+    1. requête normalisée -> embedding normalisé
+    2. (requête, top_k, filtres, réglages, build d'index) -> documents classés (position, cosinus, score lexical)
+
+    Les résultats sont vidés à chaque changement d'index, les embeddings quand le
+    modèle d'embedding change.
+    """
+
+    def __init__(self, max_embeddings: int = 4096, max_results: int = 8192):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query: str, vector: np.ndarray):
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        self.embeddings.put(normalize_query(query), vector)
+
+    @staticmethod
+    def result_key(query: str, top_k: int, filters: Optional[Dict[str, Any]] = None,
+                   index_version: Optional[str] = None, **knobs) -> Tuple:
+        """Clé d'un résultat : les listes de filtres sont triées, l'ordre n'a pas d'importance"""
+        normalized_filters = tuple(sorted(
+            (name, tuple(sorted(value)) if isinstance(value, (list, tuple, set)) else value)
+            for name, value in (filters or {}).items() if value
+        ))
+        return (normalize_query(query), top_k, normalized_filters, tuple(sorted(knobs.items())), index_version)
+
+    def get_results(self, key: Tuple) -> Optional[List[Tuple]]:
+        return self.results.get(key)
+
+    def put_results(self, key: Tuple, ranked: List[Tuple]):
+        self.results.put(key, tuple(ranked))
+
+    def invalidate(self, embeddings: bool = False):
+        """Vide les résultats (et les embeddings si le modèle d'embedding a changé)"""
+        self.results.clear()
+        if embeddings:
+            self.embeddings.clear()
+        with self._lock:
+            self._invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            invalidations = self._invalidations
+        return {
+            'embeddings': self.embeddings.get_stats(),
+            'results': self.results.get_stats(),
+            'invalidations': invalidations
+        }
@@ -0,0 +1,292 @@
+# api/scheduler.py - Ordonnancement des générations par coût attendu (plus court d'abord, avec vieillissement)
+
+import heapq
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional, Sequence
+
+from .jsonl_log import RotatingJsonlLog
+
+logger = logging.getLogger(__name__)
+
+# Un token de prompt (pré-remplissage parallèle) coûte bien moins qu'un token généré
+PREFILL_TOKEN_WEIGHT = 0.1
+
+
+class OutputLengthPredictor:
+    """Régression linéaire en ligne : tokens générés ≈ a + b × tokens de la question, par modèle
+
+    La taille du prompt est presque toujours le budget fixe du modèle (le contexte le
+    remplit) : elle ne sert qu'au coût du pré-remplissage, pas à la régression. Les
+    sommes sont amorties (facteur decay par observation, soit ~1 / (1 - decay)
+    générations utiles) pour suivre les changements de trafic ou de modèle.
+    Avant observation, la prédiction est le max_new_tokens du modèle.
+    """
+
+    def __init__(self, max_new_tokens: Dict[str, int], alpha: float = 0.1, decay: float = 0.995):
+        self.max_new_tokens = max_new_tokens
+        self.alpha = alpha
+        self.decay = decay
+        self._lock = threading.Lock()
+        self._sums: Dict[str, Dict[str, float]] = {}
+        self._seconds_per_unit: Dict[str, float] = {}
+
+    def observe(self, model_key: str, question_tokens: int, prompt_tokens: int, output_tokens: int,
+                duration: Optional[float] = None):
+        with self._lock:
+            sums = self._sums.setdefault(model_key, {'n': 0.0, 'sx': 0.0, 'sy': 0.0, 'sxx': 0.0, 'sxy': 0.0})
+            for name in sums:
+                sums[name] *= self.decay
+            sums['n'] += 1
+            sums['sx'] += question_tokens
+            sums['sy'] += output_tokens
+            sums['sxx'] += question_tokens * question_tokens
+            sums['sxy'] += question_tokens * output_tokens
+
+            if duration is not None:
+                units = output_tokens + PREFILL_TOKEN_WEIGHT * prompt_tokens
+                if units > 0:
+                    rate = duration / units
+                    previous = self._seconds_per_unit.get(model_key)
+                    self._seconds_per_unit[model_key] = rate if previous is None else (
+                        self.alpha * rate + (1 - self.alpha) * previous
+                    )
+
+    def predict_tokens(self, model_key: str, question_tokens: int) -> float:
+        max_tokens = self.max_new_tokens.get(model_key, 150)
+        with self._lock:
+            sums = self._sums.get(model_key)
+            if not sums or sums['n'] < 2:
+                return float(max_tokens) if not sums else min(max_tokens, sums['sy'] / sums['n'])
+
+            n = sums['n']
+            # Variance (pondérée) des tailles de question : sous un token², pente non identifiable
+            variance = sums['sxx'] - sums['sx'] * sums['sx'] / n
+            if variance <= n:
+                prediction = sums['sy'] / n
+            else:
+                slope = (sums['sxy'] - sums['sx'] * sums['sy'] / n) / variance
+                intercept = (sums['sy'] - slope * sums['sx']) / n
+                prediction = intercept + slope * question_tokens
+
+        return float(min(max(prediction, 1.0), max_tokens))
+
+    def predict_seconds(self, model_key: str, question_tokens: int, prompt_tokens: int) -> float:
+        units = self.predict_tokens(model_key, question_tokens) + PREFILL_TOKEN_WEIGHT * prompt_tokens
+        with self._lock:
+            # Sans mesure, on suppose ~20 ms par token généré
+            return units * self._seconds_per_unit.get(model_key, 0.02)
+
+    def warm_start(self, log_paths: Sequence[Path], max_lines: int = 50000) -> int:
+        """Réapprend à partir du journal des générations (JSONL, fichiers du plus ancien au plus récent)"""
+        if not log_paths:
+            return 0
+        count = 0
+        try:
+            lines: Deque[str] = deque(maxlen=max_lines)
+            for log_path in log_paths:
+                with open(log_path, 'r', encoding='utf-8') as f:
+                    lines.extend(f)
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                    # Entrées antérieures à question_tokens : rien à apprendre pour la régression
+                    self.observe(entry['model'], int(entry['question_tokens']), int(entry['prompt_tokens']),
+                                 int(entry['output_tokens']), entry.get('duration'))
+                    count += 1
+                except (ValueError, KeyError, TypeError):
+                    continue
+        except Exception as e:
+            logger.warning(f"⚠️ Journal des générations illisible: {e}")
+        return count
+
+
+class _Job:
+    __slots__ = ('fn', 'future', 'model_key', 'question_tokens', 'prompt_tokens', 'predicted_tokens',
+                 'predicted_seconds', 'submitted_at', 'metadata')
+
+    def __init__(self, fn, model_key, question_tokens, prompt_tokens, predicted_tokens, predicted_seconds, metadata):
+        self.fn = fn
+        self.future: Future = Future()
+        self.model_key = model_key
+        self.question_tokens = question_tokens
+        self.prompt_tokens = prompt_tokens
+        self.predicted_tokens = predicted_tokens
+        self.predicted_seconds = predicted_seconds
+        self.submitted_at = time.monotonic()
+        self.metadata = metadata
+
+
+class GenerationScheduler:
+    """File de générations ordonnée par coût attendu, servie par des workers
+
+    Priorité = instant d'arrivée + cost_weight × coût prédit (en secondes) : les
+    travaux courts passent devant, mais un travail long finit toujours par passer
+    dès que son attente dépasse le surcoût prédit (pas de famine).
+    """
+
+    def __init__(self, predictor: OutputLengthPredictor, workers: int = 2, cost_weight: float = 1.0,
+                 log: Optional[RotatingJsonlLog] = None, history: int = 1000):
+        self.predictor = predictor
+        self.cost_weight = cost_weight
+        self.generation_log = log
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        # Écritures de journaux faites par un thread dédié, hors des workers et des requêtes
+        self._log_queue: "queue.Queue" = queue.Queue()
+        self._queued: Dict[str, int] = {}
+        self._waits: Dict[str, Deque[float]] = {}
+        self._errors: Dict[str, Deque[float]] = {}
+        self._errors_seconds: Dict[str, Deque[float]] = {}
+        self._history = history
+        # Observateur de l'attente en file (histogrammes /metrics), branché par le service
+        self.wait_observer: Optional[Callable[[str, float], None]] = None
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0
+        }
+
+        threading.Thread(target=self._log_loop, name="generation-log", daemon=True).start()
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"generation-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable[[], Dict[str, Any]], model_key: str, question_tokens: int, prompt_tokens: int,
+               metadata: Optional[Dict[str, Any]] = None) -> Future:
+        """Met une génération en file ; fn() doit retourner le dict de réponse du service"""
+        predicted_tokens = self.predictor.predict_tokens(model_key, question_tokens)
+        predicted_seconds = self.predictor.predict_seconds(model_key, question_tokens, prompt_tokens)
+        job = _Job(fn, model_key, question_tokens, prompt_tokens, predicted_tokens, predicted_seconds,
+                   metadata or {})
+
+        priority = job.submitted_at + self.cost_weight * predicted_seconds
+        with self._condition:
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._queued[model_key] = self._queued.get(model_key, 0) + 1
+            self.stats['submitted'] += 1
+            self._condition.notify()
+        return job.future
+
+    def log(self, target: RotatingJsonlLog, entry: Dict[str, Any]):
+        """Ajoute une entrée à un journal depuis le thread d'écriture"""
+        self._log_queue.put((target, entry))
+
+    def _log_loop(self):
+        while True:
+            target, entry = self._log_queue.get()
+            target.write(entry)
+
+    def queued_for(self, model_key: str) -> int:
+        with self._condition:
+            return self._queued.get(model_key, 0)
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self._queued[job.model_key] -= 1
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            started = time.monotonic()
+            wait = started - job.submitted_at
+            if self.wait_observer is not None:
+                self.wait_observer(job.model_key, wait)
+            try:
+                result = job.fn()
+            except BaseException as e:
+                with self._condition:
+                    self.stats['failed'] += 1
+                job.future.set_exception(e)
+                continue
+
+            duration = time.monotonic() - started
+            self._record(job, result, wait, duration)
+            job.future.set_result(result)
+
+    def _record(self, job: _Job, result: Dict[str, Any], wait: float, duration: float):
+        output_tokens = result.get('generated_tokens') if isinstance(result, dict) else None
+        model_key = result.get('model_used', job.model_key) if isinstance(result, dict) else job.model_key
+
+        with self._condition:
+            self.stats['completed'] += 1
+            self._waits.setdefault(job.model_key, deque(maxlen=self._history)).append(wait)
+            if output_tokens is not None:
+                self._errors.setdefault(job.model_key, deque(maxlen=self._history)).append(
+                    output_tokens - job.predicted_tokens
+                )
+                self._errors_seconds.setdefault(job.model_key, deque(maxlen=self._history)).append(
+                    duration - job.predicted_seconds
+                )
+
+        if isinstance(result, dict):
+            result['queue_wait'] = round(wait, 4)
+            result['predicted_tokens'] = round(job.predicted_tokens, 1)
+
+        # Les réponses de secours ne disent rien de la longueur de génération
+        if output_tokens is None or model_key.startswith('fallback_'):
+            return
+
+        self.predictor.observe(job.model_key, job.question_tokens, job.prompt_tokens, output_tokens, duration)
+
+        if self.generation_log is not None:
+            entry = {
+                'timestamp': datetime.now().isoformat(),
+                'model': job.model_key,
+                'question_tokens': job.question_tokens,
+                'prompt_tokens': job.prompt_tokens,
+                'output_tokens': output_tokens,
+                'predicted_tokens': round(job.predicted_tokens, 1),
+                'duration': round(duration, 4),
+                'queue_wait': round(wait, 4),
+                **job.metadata
+            }
+            self.log(self.generation_log, entry)
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            classes = {}
+            for model_key in set(self._waits) | set(self._queued):
+                waits = list(self._waits.get(model_key, []))
+                errors = list(self._errors.get(model_key, []))
+                errors_seconds = list(self._errors_seconds.get(model_key, []))
+                classes[model_key] = {
+                    'queued': self._queued.get(model_key, 0),
+                    'wait_avg': round(sum(waits) / len(waits), 4) if waits else 0.0,
+                    'wait_p50': round(self._percentile(waits, 0.5), 4),
+                    'wait_p95': round(self._percentile(waits, 0.95), 4),
+                    'prediction_mae_tokens': round(sum(abs(e) for e in errors) / len(errors), 2) if errors else None,
+                    'prediction_bias_tokens': round(sum(errors) / len(errors), 2) if errors else None,
+                    'prediction_mae_seconds': (round(sum(abs(e) for e in errors_seconds) / len(errors_seconds), 4)
+                                               if errors_seconds else None)
+                }
+            return {
+                **self.stats,
+                'workers': len(self._workers),
+                'queue_depth': len(self._heap),
+                'classes': classes
+            }
@@ -0,0 +1,95 @@
+# api/search_cursors.py - Curseurs de pagination : candidats d'une recherche gardés peu de temps
+
+import base64
+import secrets
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .retrieval_cache import LRUCache
+
+# Candidat classé : (position, cosinus, score lexical)
+Hit = Tuple[int, Optional[float], Optional[float]]
+
+# Champs projetables dans les réponses de recherche
+PROJECTABLE_FIELDS = (
+    "id", "title", "content", "muscle_groups", "difficulty", "equipment", "category", "importance",
+    "parent_id", "chunk_index", "token_length", "relevance_score", "lexical_score"
+)
+
+
+class CursorError(ValueError):
+    """Curseur invalide, expiré ou antérieur à une modification de l'index"""
+
+
+def project(document: Any, fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Sous-ensemble des champs d'un document (RowView : seules ces colonnes sont décodées)"""
+    if not fields:
+        return dict(document)
+    return {field: document[field] for field in fields if field in document}
+
+
+class SearchCursorCache:
+    """Candidats classés (position, cosinus, score lexical) d'une recherche, parcourus page par page
+
+    La première page ne classe que page_size + 1 documents ; le classement profond n'est
+    calculé qu'au premier suivi du curseur, puis les pages suivantes ne font que le découper.
+    Un curseur est lié à la version de l'index et du corpus : après une modification il est
+    refusé plutôt que de renvoyer des pages incohérentes.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self._entries = LRUCache(max_entries)
+        self.expired = 0
+
+    @staticmethod
+    def _encode(cursor_id: str, offset: int) -> str:
+        return base64.urlsafe_b64encode(f"{cursor_id}.{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode(cursor: str) -> Tuple[str, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+            cursor_id, offset = raw.rsplit(".", 1)
+            offset = int(offset)
+        except Exception:
+            raise CursorError("Curseur invalide")
+        if offset < 0:
+            raise CursorError("Curseur invalide")
+        return cursor_id, offset
+
+    def open(self, hits: List[Hit], page_size: int, version: str, expand: Callable[[], List[Hit]]):
+        """Enregistre la première page ; retourne (première page, curseur suivant ou None)
+
+        hits contient au plus page_size + 1 candidats : un candidat de plus que la page
+        suffit à savoir s'il faut un curseur. expand() calcule le classement profond.
+        """
+        if len(hits) <= page_size:
+            return hits, None
+        cursor_id = secrets.token_urlsafe(12)
+        self._entries.put(cursor_id, (hits[:page_size], version, time.monotonic() + self.ttl_seconds, expand))
+        return hits[:page_size], self._encode(cursor_id, page_size)
+
+    def page(self, cursor: str, page_size: int, version: str):
+        """Page suivante d'un curseur ; retourne (page, curseur suivant ou None, total)"""
+        cursor_id, offset = self._decode(cursor)
+        entry = self._entries.get(cursor_id)
+        if entry is None:
+            raise CursorError("Curseur inconnu ou expiré")
+        hits, entry_version, expires_at, expand = entry
+        if time.monotonic() > expires_at or entry_version != version:
+            self.expired += 1
+            raise CursorError("Curseur expiré (délai dépassé ou index modifié)")
+
+        if expand is not None:
+            # Premier suivi : classement profond, sans répéter les candidats déjà servis
+            served = {position for position, _, _ in hits}
+            hits = hits + [hit for hit in expand() if hit[0] not in served]
+            self._entries.put(cursor_id, (hits, entry_version, expires_at, None))
+
+        end = offset + page_size
+        next_cursor = self._encode(cursor_id, end) if end < len(hits) else None
+        return hits[offset:end], next_cursor, len(hits)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._entries.get_stats(), 'ttl_seconds': self.ttl_seconds, 'expired': self.expired}
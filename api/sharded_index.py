@@ -0,0 +1,279 @@
+# api/sharded_index.py - Recherche répartie sur des shards servis par des processus locaux (scatter-gather)
+
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+from .index_store import EMBEDDINGS_FILE, INDEX_FILE, read_index_mmap
+from .metadata_index import id_selector
+from .vector_index import auto_build_params, create_index, exact_rescore, search as vector_search
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = "shards"
+POSITIONS_FILE = "positions.npy"
+# Identifiant du message envoyé par un shard une fois son index chargé (les requêtes comptent depuis 0)
+READY = -1
+
+
+def shard_directory(build_dir: Path, num_shards: int, shard: int) -> Path:
+    return Path(build_dir) / SHARDS_DIR / f"{num_shards}-{shard}"
+
+
+def build_shards(build_dir: Path, embeddings: np.ndarray, num_shards: int, index_type: str, pca_dim: int = 0):
+    """Découpe un build en shards (répartition circulaire des positions), un index par shard
+
+    Les shards sont écrits une fois dans le dossier du build et réutilisés ensuite.
+    """
+    count, dimension = embeddings.shape
+    for shard in range(num_shards):
+        directory = shard_directory(build_dir, num_shards, shard)
+        if (directory / INDEX_FILE).exists():
+            continue
+        positions = np.arange(shard, count, num_shards, dtype=np.int64)
+        vectors = np.asarray(embeddings[positions], dtype=np.float32)
+        index = create_index(vectors, auto_build_params(index_type, len(positions), dimension, pca_dim=pca_dim))
+
+        tmp_dir = directory.parent / f".{directory.name}.tmp-{os.getpid()}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        faiss.write_index(index, str(tmp_dir / INDEX_FILE))
+        np.save(tmp_dir / POSITIONS_FILE, positions)
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Dossier partagé (snapshots) : un autre processus a écrit ce shard entre-temps
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not (directory / INDEX_FILE).exists():
+                raise
+            continue
+        logger.info(f"🧩 Shard {shard + 1}/{num_shards} écrit: {len(positions)} vecteurs")
+
+
+def _shard_worker(shard: int, directory: str, embeddings_path: str, requests, responses):
+    """Processus d'un shard : index et embeddings mappés en mémoire, requêtes servies en boucle"""
+    directory = Path(directory)
+    try:
+        index = read_index_mmap(directory / INDEX_FILE)
+        positions = np.load(directory / POSITIONS_FILE, mmap_mode="r")
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+    except Exception as e:
+        responses.put((READY, shard, None, repr(e)))
+        return
+    responses.put((READY, shard, None, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, queries, k, nprobe, ef_search, packed_mask, size = message
+        try:
+            selector = None
+            if packed_mask is not None:
+                mask = np.unpackbits(packed_mask, count=size, bitorder="little").astype(bool)[positions]
+                if not mask.any():
+                    empty = np.full((len(queries), 0), -1, dtype=np.int64)
+                    responses.put((request_id, shard, empty.astype(np.float32), empty))
+                    continue
+                selector = id_selector(mask) if not mask.all() else None
+
+            _, local = vector_search(index, queries, min(k, len(positions)), nprobe=nprobe,
+                                     ef_search=ef_search, selector=selector)
+            ids = np.where(local >= 0, np.asarray(positions)[np.maximum(local, 0)], -1)
+            # Scores exacts : comparables d'un shard à l'autre quel que soit le type d'index
+            responses.put((request_id, shard, exact_rescore(embeddings, queries, ids), ids))
+        except Exception as e:
+            responses.put((request_id, shard, None, repr(e)))
+
+
+class ShardedIndex:
+    """Index de base réparti entre des processus locaux, interrogés en parallèle
+
+    Chaque shard renvoie ses meilleurs candidats avec leur score exact (embeddings
+    pleine précision) ; les résultats sont fusionnés en top-k global. Un shard qui
+    ne répond pas avant le délai est ignoré : le résultat est marqué dégradé.
+    """
+
+    def __init__(self, build_dir: Path, count: int, num_shards: int, timeout_ms: float = 200,
+                 startup_timeout: float = 120):
+        self.build_dir = Path(build_dir)
+        self.count = count
+        self.num_shards = num_shards
+        self.timeout = timeout_ms / 1000.0
+        self._context = multiprocessing.get_context("spawn")
+        self._responses = self._context.Queue()
+        self._requests: List[Any] = [None] * num_shards
+        self._processes: List[Any] = [None] * num_shards
+        self._pending: Dict[Tuple[int, int], Future] = {}
+        # Chargement de chaque shard : résultat None (prêt) ou message d'erreur
+        self._ready: List[Future] = [Future() for _ in range(num_shards)]
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {
+            'searches': 0,
+            'degraded_searches': 0,
+            'shard_timeouts': [0] * num_shards,
+            'shard_errors': [0] * num_shards,
+            'restarts': 0,
+            'total_latency_ms': 0.0
+        }
+
+        for shard in range(num_shards):
+            self._start(shard)
+        self._collector = threading.Thread(target=self._collect, daemon=True, name="shard-collector")
+        self._collector.start()
+        self._wait_ready(startup_timeout)
+
+    def _wait_ready(self, timeout: float):
+        """Attend que chaque shard ait chargé son index ; sinon arrête les shards et lève RuntimeError"""
+        wait(self._ready, timeout=timeout)
+        failures = []
+        for shard, ready in enumerate(self._ready):
+            if not ready.done():
+                failures.append(f"shard {shard}: pas prêt après {timeout:.0f}s")
+            elif ready.result() is not None:
+                failures.append(f"shard {shard}: {ready.result()}")
+        if failures:
+            self.close()
+            raise RuntimeError(f"Démarrage des shards impossible ({'; '.join(failures)})")
+        logger.info(f"🧩 {self.num_shards} shards prêts ({self.count} vecteurs)")
+
+    @classmethod
+    def start(cls, build, num_shards: int, index_type: str, pca_dim: int = 0,
+              timeout_ms: float = 200) -> "ShardedIndex":
+        """Écrit les shards manquants puis lance les processus ; retourne une fois tous les shards chargés"""
+        build_shards(build.directory, build.embeddings, num_shards, index_type, pca_dim)
+        return cls(build.directory, len(build.doc_ids), num_shards, timeout_ms)
+
+    @property
+    def ntotal(self) -> int:
+        return self.count
+
+    def _start(self, shard: int):
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_shard_worker,
+            args=(shard, str(shard_directory(self.build_dir, self.num_shards, shard)),
+                  str(self.build_dir / EMBEDDINGS_FILE), requests, self._responses),
+            daemon=True,
+            name=f"rag-shard-{shard}"
+        )
+        process.start()
+        self._requests[shard] = requests
+        self._processes[shard] = process
+
+    def _collect(self):
+        """Distribue les réponses des shards ; les réponses arrivées après le délai sont ignorées"""
+        while not self._closed:
+            try:
+                message = self._responses.get(timeout=0.5)
+            except Exception:
+                continue
+            request_id, shard, scores, ids = message
+            if request_id == READY:
+                ready = self._ready[shard]
+                if not ready.done():
+                    ready.set_result(ids)
+                elif ids is not None:
+                    logger.error(f"❌ Redémarrage du shard {shard} impossible: {ids}")
+                continue
+            with self._lock:
+                future = self._pending.pop((request_id, shard), None)
+            if future is not None and not future.done():
+                if scores is None:
+                    future.set_exception(RuntimeError(ids))
+                else:
+                    future.set_result((scores, ids))
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               mask: Optional[np.ndarray] = None):
+        """Top-k global (scores exacts) ; retourne (scores, positions, shards sans réponse)"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        request_id = next(self._ids)
+        packed = np.packbits(mask[:self.count], bitorder="little") if mask is not None else None
+        start = time.perf_counter()
+
+        futures = []
+        with self._lock:
+            for shard in range(self.num_shards):
+                if not self._processes[shard].is_alive():
+                    # Pas d'attente ici : tant qu'il charge, le shard manque au résultat (dégradé)
+                    logger.warning(f"⚠️ Shard {shard} arrêté : redémarrage")
+                    self.stats['restarts'] += 1
+                    self._start(shard)
+                future = Future()
+                self._pending[(request_id, shard)] = future
+                futures.append(future)
+        for shard in range(self.num_shards):
+            self._requests[shard].put((request_id, queries, k, nprobe, ef_search, packed, self.count))
+
+        wait(futures, timeout=self.timeout)
+
+        results, missing = [], []
+        with self._lock:
+            for shard, future in enumerate(futures):
+                if future.done() and future.exception() is None:
+                    results.append(future.result())
+                    continue
+                missing.append(shard)
+                if future.done():
+                    self.stats['shard_errors'][shard] += 1
+                    logger.warning(f"⚠️ Shard {shard} en erreur: {future.exception()}")
+                else:
+                    self.stats['shard_timeouts'][shard] += 1
+                    self._pending.pop((request_id, shard), None)
+
+            self.stats['searches'] += 1
+            self.stats['total_latency_ms'] += (time.perf_counter() - start) * 1000
+            if missing:
+                self.stats['degraded_searches'] += 1
+
+        if not results:
+            empty = np.full((len(queries), k), -1, dtype=np.int64)
+            return np.full((len(queries), k), -np.inf, dtype=np.float32), empty, missing
+
+        scores = np.concatenate([found[0] for found in results], axis=1)
+        indices = np.concatenate([found[1] for found in results], axis=1)
+        scores = np.where(indices >= 0, scores, -np.inf)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1), missing
+
+    def close(self):
+        self._closed = True
+        for shard, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                self._requests[shard].put(None)
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        searches = self.stats['searches']
+        return {
+            'shards': self.num_shards,
+            'alive': sum(1 for process in self._processes if process is not None and process.is_alive()),
+            'timeout_ms': round(self.timeout * 1000, 1),
+            'searches': searches,
+            'degraded_searches': self.stats['degraded_searches'],
+            'shard_timeouts': list(self.stats['shard_timeouts']),
+            'shard_errors': list(self.stats['shard_errors']),
+            'restarts': self.stats['restarts'],
+            'avg_latency_ms': round(self.stats['total_latency_ms'] / searches, 3) if searches else 0.0
+        }
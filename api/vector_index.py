@@ -0,0 +1,327 @@
+# api/vector_index.py - Types d'index vectoriels (exact / compressés / IVF / PQ / HNSW) et rapport rappel-latence
+
+import logging
+import math
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "sq_fp16", "pq", "opq", "ivf_flat", "ivf_pq", "hnsw")
+# Index à vecteurs compressés : candidats re-classés depuis les embeddings pleine précision (mmap)
+COMPRESSED_INDEX_TYPES = ("sq_fp16", "pq", "opq", "ivf_pq")
+RERANK_FACTORS = (2, 4, 8)
+# Sur-échantillonnage avant filtrage pour les index sans sélecteur d'ids (IndexPQ) : membres du
+# sélecteur attendus parmi les candidats, rapportés à k (divisé par la part de positions retenues)
+SELECTOR_OVERSAMPLING = 8
+
+# En dessous, un index approché n'apporte rien et s'entraîne mal
+MIN_ANN_CORPUS_SIZE = 1000
+# FAISS recommande au moins ~39 points d'entraînement par centroïde
+TRAINING_POINTS_PER_CENTROID = 39
+# Points d'entraînement minimum par composante retenue pour la PCA
+TRAINING_POINTS_PER_COMPONENT = 2
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Plus grand diviseur de la dimension donnant des sous-vecteurs d'au moins 8 composantes"""
+    for m in range(dimension // 8, 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def _pq_nbits(count: int) -> int:
+    """8 bits par sous-quantificateur si assez de points pour entraîner 256 centroïdes"""
+    if count >= 256 * TRAINING_POINTS_PER_CENTROID:
+        return 8
+    return max(4, int(math.log2(max(16, count // TRAINING_POINTS_PER_CENTROID))))
+
+
+def auto_build_params(index_type: str, count: int, dimension: int, pca_dim: int = 0) -> Dict[str, Any]:
+    """Paramètres de construction choisis selon la taille du corpus (PCA optionnelle en amont)"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu: {index_type} (attendu: {', '.join(INDEX_TYPES)})")
+
+    if pca_dim and pca_dim < dimension:
+        if count >= TRAINING_POINTS_PER_COMPONENT * pca_dim:
+            params = auto_build_params(index_type, count, pca_dim)
+            params["pca_dim"] = pca_dim
+            return params
+        logger.info(f"ℹ️ Corpus de {count} documents : PCA {dimension}→{pca_dim} ignorée (entraînement insuffisant)")
+
+    # float16 : simple demi-précision, valable quelle que soit la taille du corpus
+    if index_type == "sq_fp16":
+        return {"index_type": "sq_fp16"}
+
+    if index_type != "flat" and count < MIN_ANN_CORPUS_SIZE:
+        logger.info(f"ℹ️ Corpus de {count} documents : index exact au lieu de {index_type}")
+        return {"index_type": "flat"}
+
+    if index_type == "flat":
+        return {"index_type": "flat"}
+
+    if index_type == "hnsw":
+        m = 16 if count < 100_000 else 32
+        return {
+            "index_type": "hnsw",
+            "M": m,
+            "ef_construction": 2 * m * 4,
+            "ef_search": 64
+        }
+
+    if index_type in ("pq", "opq"):
+        return {"index_type": index_type, "m": _pq_subquantizers(dimension), "nbits": _pq_nbits(count)}
+
+    # IVF : ~4·√n listes, bornées par la quantité de données d'entraînement
+    nlist = int(4 * math.sqrt(count))
+    nlist = max(1, min(nlist, count // TRAINING_POINTS_PER_CENTROID))
+    params = {
+        "index_type": index_type,
+        "nlist": nlist,
+        "nprobe": max(1, min(nlist, int(math.sqrt(nlist))))
+    }
+    if index_type == "ivf_pq":
+        params["m"] = _pq_subquantizers(dimension)
+        params["nbits"] = _pq_nbits(count)
+    return params
+
+
+def create_index(embeddings: np.ndarray, params: Dict[str, Any]):
+    """Construit l'index décrit par params (produit scalaire sur vecteurs normalisés)
+
+    Avec pca_dim, l'index stocke des vecteurs projetés puis renormalisés ; la projection
+    fait partie de l'index (IndexPreTransform) et s'applique aussi aux requêtes.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    pca_dim = params.get("pca_dim")
+    if pca_dim:
+        pca = faiss.PCAMatrix(dimension, pca_dim)
+        pca.train(vectors)
+        reduced = pca.apply(vectors)
+        faiss.normalize_L2(reduced)
+        base = create_index(reduced, {key: value for key, value in params.items() if key != "pca_dim"})
+        index = faiss.IndexPreTransform(faiss.NormalizationTransform(pca_dim, 2.0), base)
+        index.prepend_transform(pca)
+        return index
+
+    index_type = params["index_type"]
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+
+    elif index_type == "sq_fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, metric)
+
+    elif index_type in ("pq", "opq"):
+        index = faiss.IndexPQ(dimension, params["m"], params["nbits"], metric)
+        if index_type == "opq":
+            # Rotation apprise avant PQ : répartit la variance entre sous-vecteurs
+            index = faiss.IndexPreTransform(faiss.OPQMatrix(dimension, params["m"]), index)
+        sample_size = min(count, (1 << params["nbits"]) * 256)
+        index.train(vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)])
+
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["M"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["m"], params["nbits"], metric)
+        # Entraînement sur un échantillon borné
+        sample_size = min(count, params["nlist"] * 256)
+        sample = vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)]
+        index.train(sample)
+        index.nprobe = params["nprobe"]
+
+    else:
+        raise ValueError(f"Type d'index inconnu: {index_type}")
+
+    index.add(vectors)
+    return index
+
+
+def index_builders(index_type: str, pca_dim: int = 0):
+    """Fabrique d'index et générateur de rapport pour IndexStore"""
+    def factory(embeddings: np.ndarray):
+        return create_index(embeddings, auto_build_params(index_type, *embeddings.shape, pca_dim=pca_dim))
+
+    def report(index, embeddings: np.ndarray) -> Dict[str, Any]:
+        params = auto_build_params(index_type, *embeddings.shape, pca_dim=pca_dim)
+        rerank = RERANK_FACTORS if params["index_type"] in COMPRESSED_INDEX_TYPES else ()
+        return recall_report(index, embeddings, params, rerank_factors=rerank)
+
+    return factory, report
+
+
+def _extract_ivf(index):
+    """Partie IVF de l'index, ou None"""
+    try:
+        return faiss.extract_index_ivf(index)
+    except Exception:
+        return None
+
+
+def search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """Paramètres de recherche par requête (nprobe pour IVF, efSearch pour HNSW, sélecteur d'ids)"""
+    if isinstance(index, faiss.IndexPreTransform):
+        inner = search_params(faiss.downcast_index(index.index), nprobe, ef_search, selector)
+        if inner is None:
+            return None
+        params = faiss.SearchParametersPreTransform(index_params=inner)
+        params.referenced_objects = [inner]
+        return params
+
+    params = None
+    ivf = _extract_ivf(index) if nprobe is not None or selector is not None else None
+    if ivf is not None:
+        probes = ivf.nprobe if nprobe is None else min(nprobe, ivf.nlist)
+        params = faiss.SearchParametersIVF(nprobe=int(probes))
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or index.hnsw.efSearch))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+
+    if params is not None and selector is not None:
+        params.sel = selector
+        params.referenced_objects = [selector]
+    return params
+
+
+def _supports_selector(index) -> bool:
+    """IndexPQ n'accepte pas de sélecteur d'ids dans ses paramètres de recherche"""
+    while isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return not isinstance(index, faiss.IndexPQ)
+
+
+def _filtered_search(index, queries: np.ndarray, k: int, selector):
+    """Sélecteur appliqué après coup sur un top-k sur-échantillonné
+
+    Le sur-échantillonnage suit la sélectivité du filtre (voir metadata_index.id_selector) :
+    un filtre qui ne garde que 1 % des positions demande 100 fois plus de candidats,
+    jusqu'à parcourir tout l'index.
+    """
+    selectivity = getattr(selector, "selectivity", None) or 1.0
+    fetch = math.ceil(k * SELECTOR_OVERSAMPLING / max(selectivity, 1.0 / max(index.ntotal, 1)))
+    scores, ids = index.search(queries, min(index.ntotal, fetch))
+    out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row in range(len(queries)):
+        kept = [col for col, doc_id in enumerate(ids[row]) if doc_id >= 0 and selector.is_member(int(doc_id))][:k]
+        out_scores[row, :len(kept)] = scores[row, kept]
+        out_ids[row, :len(kept)] = ids[row, kept]
+    return out_scores, out_ids
+
+
+def search(index, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+           selector=None):
+    """Recherche top-k avec réglages optionnels par requête, restreinte aux ids du sélecteur"""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if selector is not None and not _supports_selector(index):
+        return _filtered_search(index, queries, k, selector)
+    params = search_params(index, nprobe, ef_search, selector)
+    if params is not None:
+        return index.search(queries, k, params=params)
+    return index.search(queries, k)
+
+
+def exact_rescore(embeddings: np.ndarray, queries: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Produit scalaire pleine précision des candidats (-inf pour les ids absents)"""
+    scores = np.full(ids.shape, -np.inf, dtype=np.float32)
+    for row in range(len(queries)):
+        valid = ids[row] >= 0
+        if valid.any():
+            vectors = np.asarray(embeddings[ids[row][valid]], dtype=np.float32)
+            scores[row, valid] = vectors @ queries[row]
+    return scores
+
+
+def search_reranked(index, embeddings: np.ndarray, queries: np.ndarray, k: int, factor: int,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """Top-(k·factor) sur l'index compressé, re-classé exactement avec les embeddings (mmap)"""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    _, ids = search(index, queries, min(index.ntotal, k * factor), nprobe=nprobe, ef_search=ef_search,
+                    selector=selector)
+    scores = exact_rescore(embeddings, queries, ids)
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def index_nbytes(index) -> int:
+    """Taille sérialisée de l'index (vecteurs, codes et structures)"""
+    return int(faiss.serialize_index(index).size)
+
+
+def recall_report(index, embeddings: np.ndarray, params: Dict[str, Any], k: int = 10,
+                  sample_size: int = 200, rerank_factors: Sequence[int] = ()) -> Dict[str, Any]:
+    """Rappel@k, latence et mémoire de l'index comparés à la recherche exacte
+
+    rerank_factors : mesure aussi le re-classement exact de k·facteur candidats.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    count = vectors.shape[0]
+    k = min(k, count)
+    rng = np.random.default_rng(42)
+    queries = vectors[rng.choice(count, min(sample_size, count), replace=False)]
+    # Requêtes légèrement bruitées : ne pas retrouver trivialement le document lui-même
+    queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    baseline = faiss.IndexFlatIP(vectors.shape[1])
+    baseline.add(vectors)
+    start = time.perf_counter()
+    _, truth = baseline.search(queries, k)
+    flat_latency = (time.perf_counter() - start) / len(queries)
+
+    def _measure(rerank: int = 0, **knobs) -> Dict[str, Any]:
+        start = time.perf_counter()
+        if rerank:
+            _, found = search_reranked(index, vectors, queries, k, rerank, **knobs)
+            knobs["rerank"] = rerank
+        else:
+            _, found = search(index, queries, k, **knobs)
+        latency = (time.perf_counter() - start) / len(queries)
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+        return {
+            **knobs,
+            "recall_at_k": round(hits / (len(queries) * k), 4),
+            "latency_ms": round(latency * 1000, 4)
+        }
+
+    nbytes = index_nbytes(index)
+    report = {
+        "index_params": params,
+        "bytes_per_vector": round(nbytes / count, 1),
+        "memory_per_million_mb": round(nbytes / count * 1e6 / 2**20, 1),
+        "k": k,
+        "queries": len(queries),
+        "flat_latency_ms": round(flat_latency * 1000, 4),
+        "default": _measure()
+    }
+
+    # Balayage des réglages de recherche
+    if params["index_type"] in ("ivf_flat", "ivf_pq"):
+        nlist = params["nlist"]
+        report["sweep"] = [_measure(nprobe=n) for n in sorted({1, 4, 16, 64, nlist}) if n <= nlist]
+    elif params["index_type"] == "hnsw":
+        report["sweep"] = [_measure(ef_search=ef) for ef in (16, 32, 64, 128, 256)]
+    if rerank_factors:
+        report["rerank"] = [_measure(rerank=factor) for factor in rerank_factors]
+
+    return report
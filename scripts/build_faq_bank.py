@@ -0,0 +1,163 @@
+# scripts/build_faq_bank.py - Construction hors ligne de la banque de réponses aux questions fréquentes
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# Accès au package api depuis la racine du projet
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    """Regroupe les questions journalisées, génère une réponse vérifiée par cluster et par modèle
+    puis publie la banque lue par l'API (à relancer périodiquement, par exemple via cron)"""
+    from api.config import get_settings
+    from api.embedding_backend import encoder_id
+    from api.faq_bank import (SAMPLE_QUESTIONS, QuestionLog, cluster_questions, iter_logged_questions,
+                              mine_questions, save_bank, vet_answer)
+
+    settings = get_settings()
+    # Journal courant et ses rotations, du plus ancien au plus récent
+    question_logs = QuestionLog(Path(settings.question_log_path), backups=settings.log_backups).files()
+
+    parser = argparse.ArgumentParser(description="Construit la banque de réponses aux questions fréquentes")
+    parser.add_argument("--logs", nargs="+", default=[str(path) for path in question_logs] or [settings.question_log_path],
+                        help="Journaux des questions (JSONL, rotations comprises par défaut)")
+    parser.add_argument("--days", type=int, default=30, help="Fenêtre de trafic analysée (0 = tout le journal)")
+    parser.add_argument("--min-count", type=int, default=3, help="Occurrences minimales d'un cluster")
+    parser.add_argument("--max-clusters", type=int, default=300)
+    parser.add_argument("--threshold", type=float, default=settings.faq_cluster_similarity,
+                        help="Similarité cosinus minimale pour rejoindre un cluster")
+    parser.add_argument("--output", default=settings.faq_bank_path)
+    parser.add_argument("--review", help="Fichier JSONL des réponses générées et de leur vérification")
+    parser.add_argument("--dry-run", action="store_true", help="Clusters et couverture seulement, sans génération")
+    args = parser.parse_args()
+
+    print("💡 CONSTRUCTION DE LA BANQUE FAQ")
+    print("=" * 40)
+
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    mined = mine_questions(iter_logged_questions([Path(path) for path in args.logs], since=since))
+    if not mined['total']:
+        print(f"❌ Aucune question journalisée dans {', '.join(args.logs)}")
+        sys.exit(1)
+    print(f"📜 {mined['total']} questions ({len(mined['counts'])} distinctes), "
+          f"{mined['served'] / mined['total']:.1%} servies par la banque actuelle")
+
+    from api.fitness_service import FitnessCoachService
+    service = FitnessCoachService(settings.model_path)
+    if not service.rag_enabled:
+        print("❌ Encodeur indisponible : impossible de regrouper les questions")
+        sys.exit(1)
+
+    keys = list(mined['counts'])
+    weights = [mined['counts'][key] for key in keys]
+    embeddings = np.concatenate([
+        service.encode_queries([mined['phrasings'][key] for key in keys[start:start + settings.rag_batch_size]])
+        for start in range(0, len(keys), settings.rag_batch_size)
+    ])
+    clusters = cluster_questions(embeddings, weights, args.threshold)
+    clusters = sorted(clusters, key=lambda members: -sum(weights[i] for i in members))
+    clusters = [members for members in clusters if sum(weights[i] for i in members) >= args.min_count]
+    clusters = clusters[:args.max_clusters]
+    covered = sum(weights[i] for members in clusters for i in members)
+    print(f"🧩 {len(clusters)} clusters retenus : {covered / mined['total']:.1%} du trafic analysé")
+
+    if args.dry_run:
+        for members in clusters[:20]:
+            print(f"   {sum(weights[i] for i in members):>5}  {mined['phrasings'][keys[members[0]]]}")
+        return
+
+    # Générations en lot dans la file du service (ordonnancement par coût attendu)
+    loaded = {model.value: model for model, config in service.model_configs.items() if config['loaded']}
+    start = time.time()
+    jobs = []
+    for cluster, members in enumerate(clusters):
+        question = mined['phrasings'][keys[members[0]]]
+        models = set()
+        for i in members:
+            models.update(mined['models'].get(keys[i], {}))
+        for model_key in sorted(models & set(loaded)):
+            model = loaded[model_key]
+            documents = service.search_relevant_context(
+                question, top_k=service.generation_configs[model]['context_candidates']
+            )
+            future = service.scheduler.submit(
+                lambda question=question, model=model: service.generate_advice(question, model_type=model),
+                model_key, *service.estimate_request_tokens(question, model)
+            )
+            jobs.append((cluster, model_key, question, documents, future))
+
+    entries = {}
+    rejected = 0
+    review = open(args.review, "w", encoding="utf-8") if args.review else None
+    for cluster, model_key, question, documents, future in jobs:
+        result = future.result()
+        reason = vet_answer(result)
+        if review:
+            review.write(json.dumps({'cluster': cluster, 'model': model_key, 'question': question,
+                                     'response': result.get('response'), 'rejected': reason},
+                                    ensure_ascii=False) + "\n")
+        if reason:
+            rejected += 1
+            continue
+
+        members = clusters[cluster]
+        entry = entries.setdefault(cluster, {
+            'question': question,
+            'questions': [mined['phrasings'][keys[i]] for i in members[:SAMPLE_QUESTIONS]],
+            'weight': sum(weights[i] for i in members),
+            'sources': {},
+            'answers': {}
+        })
+        for document in documents:
+            entry['sources'][document['id']] = service.exercise_database.content_hash_at(document.position)
+        entry['answers'][model_key] = {
+            'response': result['response'],
+            'source_titles': [document.get('title', 'Document') for document in documents],
+            'model_version': result.get('model_version'),
+            'generated_tokens': result.get('generated_tokens')
+        }
+    if review:
+        review.close()
+
+    # Centre de chaque cluster retenu : moyenne pondérée des questions, normalisée
+    published, centroids = [], []
+    for cluster in sorted(entries):
+        members = clusters[cluster]
+        center = np.sum([weights[i] * embeddings[i] for i in members], axis=0)
+        centroids.append(center / max(np.linalg.norm(center), 1e-12))
+        entry = entries[cluster]
+        entry['cluster'] = len(published)
+        entry['sources'] = [[doc_id, digest] for doc_id, digest in entry['sources'].items()]
+        published.append(entry)
+
+    coverage = sum(entry['weight'] for entry in published) / mined['total']
+    save_bank(
+        Path(args.output),
+        np.asarray(centroids, dtype=np.float32).reshape(len(published), embeddings.shape[1]),
+        published,
+        {
+            'encoder': encoder_id(settings.embedding_model, service.embedding_backend, service.pca_dim),
+            'built_at': datetime.now().isoformat(),
+            'window_days': args.days,
+            'questions_analyzed': mined['total'],
+            'coverage': round(coverage, 4),
+            'served_coverage': round(mined['served'] / mined['total'], 4),
+            'cluster_similarity': args.threshold
+        }
+    )
+
+    print(f"✅ {len(published)} entrées ({rejected} réponses rejetées) en {time.time() - start:.1f}s")
+    print(f"   📈 Couverture estimée: {coverage:.1%} du trafic")
+    print(f"   📂 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# scripts/build_index.py - Construction hors ligne de l'index persistant du corpus
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Accès au package api depuis la racine du projet
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    """Encode le corpus et écrit l'index + les embeddings au format lu par l'API"""
+    from api.config import get_settings
+    from api.corpus import iter_corpus, resolve_corpus_paths
+    from api.index_store import IndexStore, REPORT_FILE
+    from api.embedding_backend import EMBEDDING_BACKENDS, encoder_id, load_encoder, parity_passed
+    from api.vector_index import INDEX_TYPES, index_builders
+    
+    settings = get_settings()
+    
+    parser = argparse.ArgumentParser(description="Construit l'index FAISS persistant du corpus")
+    parser.add_argument("--corpus", default=settings.corpus_path, help="Fichier ou dossier du corpus")
+    parser.add_argument("--index-dir", default=settings.index_dir, help="Dossier des builds d'index")
+    parser.add_argument("--batch-size", type=int, default=settings.rag_batch_size)
+    parser.add_argument("--index-type", default=settings.rag_index_type, choices=INDEX_TYPES)
+    parser.add_argument("--backend", default=settings.embedding_backend, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--pca-dim", type=int, default=settings.rag_pca_dim, help="Dimension après PCA (0 = aucune)")
+    parser.add_argument("--publish", nargs="?", const=settings.index_snapshot_dir or None, default=None,
+                        metavar="DIR", help="Publie le build comme snapshot (défaut: INDEX_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+    
+    print("🏗️ CONSTRUCTION DE L'INDEX")
+    print("=" * 40)
+    
+    paths = resolve_corpus_paths(args.corpus)
+    if not paths:
+        print(f"❌ Aucun fichier de corpus dans {args.corpus}")
+        sys.exit(1)
+    
+    corpus_stats = {}
+    documents = list(iter_corpus(paths, batch_size=args.batch_size, stats=corpus_stats))
+    print(f"📚 {corpus_stats['valid']} documents valides ({corpus_stats['invalid']} invalides, {corpus_stats['duplicates']} doublons)")
+    
+    if (args.backend != "torch" or args.pca_dim) and not parity_passed(
+            Path(args.index_dir), encoder_id(settings.embedding_model, args.backend, args.pca_dim)):
+        print("⚠️ Encodeur sans parité validée : l'API ne l'utilisera pas (scripts/check_encoder_parity.py)")
+    
+    start = time.time()
+    encoder = load_encoder(settings.embedding_model, args.backend, onnx_path=settings.embedding_onnx_path,
+                           threads=settings.embedding_threads)
+    store = IndexStore(Path(args.index_dir), encoder_id(settings.embedding_model, args.backend),
+                       args.index_type, pca_dim=args.pca_dim)
+    index_factory, report_fn = index_builders(args.index_type, args.pca_dim)
+    build = store.load_or_build(
+        documents,
+        encode_fn=lambda texts: encoder.encode(texts, batch_size=64, show_progress_bar=False),
+        index_factory=index_factory,
+        batch_size=args.batch_size,
+        report_fn=report_fn
+    )
+    
+    print(f"✅ Build {build.key} prêt en {time.time() - start:.1f}s")
+    print(f"   📂 {build.directory}")
+    print(f"   ♻️ Réutilisés: {build.manifest.get('reused_embeddings', 0)} - Encodés: {build.manifest.get('encoded_embeddings', 0)}")
+    
+    if args.publish:
+        from api.exercise_store import ExerciseStore
+        from api.index_snapshots import publish_snapshot
+        
+        # Store aligné sur le build : mêmes documents, mêmes positions
+        exercise_store = ExerciseStore.load_or_build(
+            Path(settings.exercise_store_dir), paths,
+            lambda: iter_corpus(paths, batch_size=args.batch_size)
+        )
+        if exercise_store.content_hashes() != list(build.doc_hashes):
+            print("❌ Store d'exercices et build désalignés : snapshot non publié")
+            sys.exit(1)
+        manifest = publish_snapshot(Path(args.publish), build, exercise_store.directory)
+        print(f"📦 Snapshot publié: {manifest['version']} ({args.publish})")
+    
+    report_path = build.directory / REPORT_FILE
+    if report_path.exists():
+        import json
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+        print(f"\n📊 Rappel@{report['k']} vs recherche exacte ({report['queries']} requêtes)")
+        print(f"   Exact: {report['flat_latency_ms']:.3f} ms/requête")
+        if 'memory_per_million_mb' in report:
+            print(f"   Mémoire: {report['memory_per_million_mb']:.1f} Mo / million de vecteurs ({report['bytes_per_vector']:.0f} o/vecteur)")
+        for row in [report['default']] + report.get('sweep', []) + report.get('rerank', []):
+            knobs = ', '.join(f"{k}={v}" for k, v in row.items() if k not in ('recall_at_k', 'latency_ms')) or 'défaut'
+            print(f"   {knobs:<16} rappel={row['recall_at_k']:.3f}  {row['latency_ms']:.3f} ms/requête")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# scripts/check_encoder_parity.py - Contrôle de parité de rappel d'un encodeur accéléré (int8 / ONNX, PCA)
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Accès au package api depuis la racine du projet
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    """Compare l'encodeur candidat à l'encodeur d'origine sur les requêtes étiquetées"""
+    from api.config import get_settings
+    from api.corpus import iter_corpus, resolve_corpus_paths
+    from api.embedding_backend import (
+        EMBEDDING_BACKENDS, encoder_id, evaluate_retrieval, export_onnx,
+        load_encoder, load_eval_queries, parity_report_path
+    )
+    from api.vector_index import index_builders
+
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Valide un encodeur accéléré avant activation")
+    parser.add_argument("--backend", default=settings.embedding_backend, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--pca-dim", type=int, default=settings.rag_pca_dim, help="Dimension après PCA (0 = aucune)")
+    parser.add_argument("--corpus", default=settings.corpus_path, help="Fichier ou dossier du corpus")
+    parser.add_argument("--queries", default=settings.eval_queries_path, help="Requêtes étiquetées (JSONL)")
+    parser.add_argument("--index-dir", default=settings.index_dir, help="Dossier des builds d'index")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-drop", type=float, default=0.02, help="Perte de rappel@k tolérée")
+    parser.add_argument("--export-onnx", action="store_true", help="Exporte d'abord le modèle ONNX (int8)")
+    args = parser.parse_args()
+
+    print("🔬 PARITÉ DE L'ENCODEUR")
+    print("=" * 40)
+
+    if args.backend == "onnx" and (args.export_onnx or not Path(settings.embedding_onnx_path).exists()):
+        print(f"📦 Export ONNX vers {settings.embedding_onnx_path}...")
+        export_onnx(settings.embedding_model, Path(settings.embedding_onnx_path))
+
+    documents = list(iter_corpus(resolve_corpus_paths(args.corpus)))
+    queries = load_eval_queries(Path(args.queries))
+    print(f"📚 {len(documents)} documents - 🔎 {len(queries)} requêtes étiquetées")
+
+    def _evaluate(backend: str, pca_dim: int):
+        encoder = load_encoder(settings.embedding_model, backend, onnx_path=settings.embedding_onnx_path,
+                               threads=settings.embedding_threads)
+        index_factory, _ = index_builders("flat", pca_dim)
+        return evaluate_retrieval(
+            lambda texts: encoder.encode(texts, batch_size=64, show_progress_bar=False),
+            documents, queries, index_factory, k=args.k
+        )
+
+    baseline = _evaluate("torch", 0)
+    candidate = _evaluate(args.backend, args.pca_dim)
+
+    encoder_key = encoder_id(settings.embedding_model, args.backend, args.pca_dim)
+    recall_drop = round(baseline["recall_at_k"] - candidate["recall_at_k"], 4)
+    passed = recall_drop <= args.max_drop
+
+    report = {
+        "encoder": encoder_key,
+        "backend": args.backend,
+        "pca_dim": args.pca_dim,
+        "baseline": baseline,
+        "candidate": candidate,
+        "recall_drop": recall_drop,
+        "max_drop": args.max_drop,
+        "speedup": round(baseline["encode_latency_ms_p50"] / max(candidate["encode_latency_ms_p50"], 1e-6), 2),
+        "passed": passed,
+        "created_at": datetime.now().isoformat()
+    }
+
+    report_path = parity_report_path(Path(args.index_dir), encoder_key)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"\n{'Encodeur':<12} {'rappel@' + str(baseline['k']):>10} {'MRR':>8} {'p50 ms':>8}")
+    for name, metrics in (("origine", baseline), (args.backend, candidate)):
+        print(f"{name:<12} {metrics['recall_at_k']:>10.3f} {metrics['mrr']:>8.3f} {metrics['encode_latency_ms_p50']:>8.2f}")
+    print(f"\n⚡ Accélération: x{report['speedup']} - Perte de rappel: {recall_drop:+.3f} (tolérance {args.max_drop})")
+    print(f"📄 Rapport: {report_path}")
+
+    if passed:
+        print(f"✅ Parité validée : EMBEDDING_BACKEND={args.backend} RAG_PCA_DIM={args.pca_dim} peut être activé")
+    else:
+        print("❌ Parité non atteinte : l'API conservera l'encodeur d'origine")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# scripts/compare_index_types.py - Mémoire, rappel et latence de chaque stockage vectoriel sur le corpus indexé
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# Accès au package api depuis la racine du projet
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    """Construit chaque type d'index sur les embeddings du dernier build et compare les options"""
+    from api.config import get_settings
+    from api.embedding_backend import EMBEDDING_BACKENDS, encoder_id
+    from api.index_store import IndexStore
+    from api.vector_index import (COMPRESSED_INDEX_TYPES, INDEX_TYPES, RERANK_FACTORS, auto_build_params,
+                                  create_index, recall_report)
+
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Compare les stockages vectoriels (float32 / float16 / PQ / OPQ)")
+    parser.add_argument("--index-dir", default=settings.index_dir, help="Dossier des builds d'index")
+    parser.add_argument("--backend", default=settings.embedding_backend, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--types", nargs="+", default=["flat", "sq_fp16", "pq", "opq", "ivf_pq"], choices=INDEX_TYPES)
+    parser.add_argument("--pca-dim", type=int, default=0, help="Dimension après PCA (0 = aucune)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="Requêtes d'évaluation échantillonnées")
+    parser.add_argument("--output", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    print("🗜️ COMPARAISON DES STOCKAGES VECTORIELS")
+    print("=" * 40)
+
+    build = IndexStore(Path(args.index_dir), encoder_id(settings.embedding_model, args.backend)).latest_build()
+    if build is None:
+        print(f"❌ Aucun build d'index dans {args.index_dir} (scripts/build_index.py)")
+        sys.exit(1)
+
+    embeddings = np.asarray(build.embeddings, dtype=np.float32)
+    print(f"📂 Build {build.key}: {embeddings.shape[0]} vecteurs de dimension {embeddings.shape[1]}")
+    print(f"   Pleine précision (mmap, re-classement): {embeddings.nbytes / embeddings.shape[0] * 1e6 / 2**20:.1f} Mo / million")
+
+    reports = {}
+    for index_type in args.types:
+        params = auto_build_params(index_type, *embeddings.shape, pca_dim=args.pca_dim)
+        start = time.time()
+        index = create_index(embeddings, params)
+        build_seconds = time.time() - start
+        rerank = RERANK_FACTORS if params["index_type"] in COMPRESSED_INDEX_TYPES else ()
+        report = recall_report(index, embeddings, params, k=args.k, sample_size=args.queries, rerank_factors=rerank)
+        report["build_seconds"] = round(build_seconds, 2)
+        reports[index_type] = report
+
+        print(f"\n📊 {index_type} ({params['index_type']}) - construit en {build_seconds:.1f}s")
+        print(f"   Mémoire: {report['memory_per_million_mb']:.1f} Mo / million ({report['bytes_per_vector']:.0f} o/vecteur)")
+        for row in [report['default']] + report.get('sweep', []) + report.get('rerank', []):
+            knobs = ', '.join(f"{k}={v}" for k, v in row.items() if k not in ('recall_at_k', 'latency_ms')) or 'défaut'
+            print(f"   {knobs:<16} rappel@{report['k']}={row['recall_at_k']:.3f}  {row['latency_ms']:.3f} ms/requête")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"build": build.key, "reports": reports}, f, indent=2)
+        print(f"\n💾 Rapport écrit: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -95,6 +95,7 @@ STREAMLIT_PORT=8501
 
 # Modèle Configuration
 MODEL_PATH=/app/models/coach-sportif-french
+MODELS_DIR=/app/models
 MODEL_DEVICE=auto
 ENABLE_RAG=true
 
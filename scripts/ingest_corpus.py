@@ -0,0 +1,280 @@
+# scripts/ingest_corpus.py - Ingestion hors ligne : découpage en chunks et encodage parallèle du corpus
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# Accès au package api depuis la racine du projet (aussi dans les processus workers)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+CHUNKS_FILE = "chunks.jsonl"
+STATE_FILE = ".ingest_state.json"
+CHECKPOINT_DIR = ".ingest-checkpoint"
+# Documents envoyés par tâche de découpage, textes minimum par tâche d'encodage
+CHUNK_TASK_SIZE = 64
+MIN_ENCODE_TASK = 64
+
+# === WORKERS : tokenizer et encodeur chargés une fois par processus, à la demande ===
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(config: Dict[str, Any]):
+    _worker.clear()
+    _worker.update(config)
+
+
+def _count_tokens(text: str) -> int:
+    if "tokenizer_obj" not in _worker:
+        from transformers import AutoTokenizer
+        _worker["tokenizer_obj"] = AutoTokenizer.from_pretrained(_worker["tokenizer"])
+    return len(_worker["tokenizer_obj"].encode(text, add_special_tokens=False))
+
+
+def _chunk_batch(documents: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    from api.chunking import chunk_document
+    from api.context_packing import tokenizer_id
+    from api.corpus import validate_document
+    return [
+        [validate_document(chunk) for chunk in chunk_document(document, _count_tokens, _worker["max_tokens"],
+                                                               tokenizer=tokenizer_id(_worker["tokenizer"]))]
+        for document in documents
+    ]
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    if "encoder" not in _worker:
+        from api.embedding_backend import load_encoder
+        _worker["encoder"] = load_encoder(_worker["model"], _worker["backend"],
+                                          onnx_path=_worker["onnx_path"], threads=_worker["threads"])
+    return np.asarray(_worker["encoder"].encode(texts, batch_size=64, show_progress_bar=False), dtype=np.float32)
+
+
+# === REPRISE ===
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest().encode("ascii")
+
+
+def _source_key(doc_id: Any) -> str:
+    return json.dumps(doc_id)
+
+
+class EmbeddingCheckpoint:
+    """Vecteurs déjà encodés par un run interrompu (shards .npz indexés par empreinte du texte)"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.vectors: Dict[bytes, np.ndarray] = {}
+        self.shards = 0
+        for shard in sorted(directory.glob("shard-*.npz")):
+            try:
+                with np.load(shard) as data:
+                    self.vectors.update(zip(data["hashes"].tolist(), data["vectors"]))
+                self.shards += 1
+            except Exception:
+                print(f"⚠️ Shard de reprise illisible ignoré: {shard.name}")
+
+    def save(self, digests: List[bytes], vectors: np.ndarray):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"shard-{self.shards:06d}.npz"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=np.asarray(digests, dtype="S40"), vectors=vectors)
+        os.replace(tmp_path, path)
+        self.shards += 1
+        self.vectors.update(zip(digests, vectors))
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ParallelEncoder:
+    """encode_fn d'IndexStore : chaque gros lot est réparti entre les processus du pool"""
+
+    def __init__(self, pool: ProcessPoolExecutor, workers: int, checkpoint: EmbeddingCheckpoint):
+        self.pool = pool
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.encoded = 0
+        self.resumed = 0
+        self.seconds = 0.0
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        digests = [_text_hash(text) for text in texts]
+        missing = [row for row, digest in enumerate(digests) if digest not in self.checkpoint.vectors]
+        self.resumed += len(texts) - len(missing)
+
+        if missing:
+            start = time.time()
+            task_size = max(MIN_ENCODE_TASK, -(-len(missing) // self.workers))
+            tasks = [missing[i:i + task_size] for i in range(0, len(missing), task_size)]
+            vectors = np.concatenate(list(self.pool.map(_encode_batch, [[texts[row] for row in task] for task in tasks])))
+            self.checkpoint.save([digests[row] for row in missing], vectors)
+            self.encoded += len(missing)
+            self.seconds += time.time() - start
+
+        return np.stack([self.checkpoint.vectors[digest] for digest in digests])
+
+
+def _read_state(output_dir: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((output_dir / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_chunks(path: Path, chunks: List[Dict[str, Any]]):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def main():
+    """Découpe les documents sources, encode les chunks en parallèle et écrit store + index au format de l'API"""
+    from api.config import get_settings
+    from api.corpus import content_hash, iter_batches, iter_corpus, resolve_corpus_paths
+    from api.embedding_backend import EMBEDDING_BACKENDS, encoder_id, parity_passed
+    from api.exercise_store import ExerciseStore
+    from api.index_store import IndexStore
+    from api.vector_index import INDEX_TYPES, index_builders
+
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Ingestion hors ligne du corpus (chunks + index FAISS)")
+    parser.add_argument("--sources", default=settings.corpus_source_path, help="Fichier ou dossier des documents sources")
+    parser.add_argument("--output", default=settings.corpus_path, help="Dossier du corpus découpé (CORPUS_PATH de l'API)")
+    parser.add_argument("--store-dir", default=settings.exercise_store_dir)
+    parser.add_argument("--index-dir", default=settings.index_dir)
+    parser.add_argument("--tokenizer", default=settings.model_path, help="Tokenizer du modèle de génération")
+    parser.add_argument("--max-tokens", type=int, default=settings.chunk_max_tokens, help="Taille maximale d'un chunk")
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers, help="Processus (0 = nombre de CPU)")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Chunks par lot d'encodage")
+    parser.add_argument("--index-type", default=settings.rag_index_type, choices=INDEX_TYPES)
+    parser.add_argument("--backend", default=settings.embedding_backend, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--pca-dim", type=int, default=settings.rag_pca_dim, help="Dimension après PCA (0 = aucune)")
+    args = parser.parse_args()
+
+    print("🏭 INGESTION DU CORPUS")
+    print("=" * 40)
+
+    paths = resolve_corpus_paths(args.sources)
+    if not paths:
+        print(f"❌ Aucun document source dans {args.sources}")
+        sys.exit(1)
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    chunks_path = output_dir / CHUNKS_FILE
+    others = [path for path in resolve_corpus_paths(output_dir) if path != chunks_path]
+    if others:
+        print(f"⚠️ {len(others)} autre(s) fichier(s) dans {output_dir} : l'API les chargera avec les chunks")
+
+    workers = args.workers or os.cpu_count() or 1
+    config = {
+        "tokenizer": args.tokenizer,
+        "max_tokens": args.max_tokens,
+        "model": settings.embedding_model,
+        "backend": args.backend,
+        "onnx_path": settings.embedding_onnx_path,
+        "threads": max(1, (os.cpu_count() or 1) // workers)
+    }
+    total_start = time.time()
+
+    # === 1. Découpage (incrémental : seuls les documents sources modifiés sont redécoupés) ===
+    corpus_stats = {}
+    sources = list(iter_corpus(paths, stats=corpus_stats))
+    print(f"📚 {corpus_stats['valid']} documents sources ({corpus_stats['invalid']} invalides, {corpus_stats['duplicates']} doublons)")
+
+    state = _read_state(output_dir)
+    same_params = state.get("tokenizer") == args.tokenizer and state.get("max_tokens") == args.max_tokens
+    previous_hashes: Dict[str, str] = state.get("sources", {}) if same_params and chunks_path.exists() else {}
+    previous_chunks: Dict[str, List[Dict[str, Any]]] = {}
+    if previous_hashes:
+        for chunk in iter_corpus([chunks_path]):
+            previous_chunks.setdefault(_source_key(chunk.get("parent_id", chunk["id"])), []).append(chunk)
+
+    source_hashes = {_source_key(document["id"]): content_hash(document) for document in sources}
+    to_chunk = [
+        document for document in sources
+        if previous_hashes.get(_source_key(document["id"])) != source_hashes[_source_key(document["id"])]
+        or _source_key(document["id"]) not in previous_chunks
+    ]
+    removed = set(previous_hashes) - set(source_hashes)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(config,)) as pool:
+        chunk_start = time.time()
+        chunked: Dict[str, List[Dict[str, Any]]] = {}
+        for batch, results in zip(iter_batches(to_chunk, CHUNK_TASK_SIZE),
+                                  pool.map(_chunk_batch, iter_batches(to_chunk, CHUNK_TASK_SIZE))):
+            for document, chunks in zip(batch, results):
+                chunked[_source_key(document["id"])] = chunks
+        chunk_seconds = time.time() - chunk_start
+
+        chunks = []
+        for document in sources:
+            key = _source_key(document["id"])
+            chunks.extend(chunked.get(key) or previous_chunks[key])
+
+        if to_chunk or removed or not chunks_path.exists():
+            _write_chunks(chunks_path, chunks)
+            with open(output_dir / STATE_FILE, "w", encoding="utf-8") as f:
+                json.dump({"tokenizer": args.tokenizer, "max_tokens": args.max_tokens, "sources": source_hashes}, f)
+
+        new_chunks = sum(len(items) for items in chunked.values())
+        print(f"✂️ {len(to_chunk)} documents découpés en {new_chunks} chunks "
+              f"({len(sources) - len(to_chunk)} inchangés, {len(removed)} retirés) - "
+              f"{len(to_chunk) / chunk_seconds if chunk_seconds and to_chunk else 0:.1f} docs/s")
+
+        # === 2. Store colonnaire (même empreinte de fichiers que celle calculée par l'API) ===
+        store = ExerciseStore.load_or_build(Path(args.store_dir), [chunks_path], lambda: iter_corpus([chunks_path]))
+        print(f"🗂️ Store: {store.live_count} chunks ({store.nbytes() / 1e6:.1f} Mo)")
+
+        # === 3. Encodage parallèle (embeddings réutilisés par empreinte, reprise après interruption) ===
+        if (args.backend != "torch" or args.pca_dim) and not parity_passed(
+                Path(args.index_dir), encoder_id(settings.embedding_model, args.backend, args.pca_dim)):
+            print("⚠️ Encodeur sans parité validée : l'API ne l'utilisera pas (scripts/check_encoder_parity.py)")
+
+        checkpoint = EmbeddingCheckpoint(Path(args.index_dir) / CHECKPOINT_DIR / encoder_id(settings.embedding_model, args.backend))
+        if checkpoint.vectors:
+            print(f"⏯️ Reprise: {len(checkpoint.vectors)} embeddings d'un run interrompu")
+        encoder = ParallelEncoder(pool, workers, checkpoint)
+
+        index_store = IndexStore(Path(args.index_dir), encoder_id(settings.embedding_model, args.backend),
+                                 args.index_type, pca_dim=args.pca_dim)
+        index_factory, report_fn = index_builders(args.index_type, args.pca_dim)
+        build = index_store.load_or_build(
+            store,
+            encode_fn=encoder,
+            index_factory=index_factory,
+            batch_size=args.batch_size,
+            report_fn=report_fn,
+            doc_hashes=store.content_hashes()
+        )
+        checkpoint.clear()
+
+    print(f"🧮 {encoder.encoded} chunks encodés sur {workers} processus - "
+          f"{encoder.encoded / encoder.seconds if encoder.seconds else 0:.1f} chunks/s")
+    print(f"   ♻️ Réutilisés: {build.manifest.get('reused_embeddings', 0)} - Repris: {encoder.resumed}")
+    print(f"✅ Build {build.key} prêt en {time.time() - total_start:.1f}s")
+    print(f"   📂 {build.directory}")
+
+
+if __name__ == "__main__":
+    main()
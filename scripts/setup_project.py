@@ -66,6 +66,7 @@ STREAMLIT_PORT=8501
 
 # Modèle Configuration
 MODEL_PATH=./models/coach-sportif-french
+MODELS_DIR=./models
 MODEL_DEVICE=auto
 
 # Cache Configuration
@@ -7,6 +7,7 @@ import time
 import os
 import urllib.parse
 import urllib.request
+import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional
 import logging
@@ -144,6 +145,8 @@ class FitnessAPI:
         self.base_url = base_url
         self.session = requests.Session()
         self.session.timeout = TIMEOUT
+        # Identifiant de session : le choix du modèle reste propre à cet utilisateur
+        self.session_id = uuid.uuid4().hex
     
     def health_check(self) -> Dict[str, Any]:
         """Vérification de l'état de l'API"""
@@ -158,7 +161,7 @@ class FitnessAPI:
     def get_available_models(self) -> Dict[str, Any]:
         """Récupère la liste des modèles disponibles"""
         try:
-            response = self.session.get(f"{self.base_url}/models")
+            response = self.session.get(f"{self.base_url}/models", params={"session_id": self.session_id})
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -168,7 +171,7 @@ class FitnessAPI:
     def switch_model(self, model_type: str) -> Dict[str, Any]:
         """Change le modèle actuel"""
         try:
-            payload = {"model_type": model_type}
+            payload = {"model_type": model_type, "session_id": self.session_id}
             response = self.session.post(
                 f"{self.base_url}/models/switch",
                 json=payload,
@@ -180,10 +183,19 @@ class FitnessAPI:
             st.error(f"❌ Erreur changement modèle: {e}")
             return {"success": False, "message": str(e)}
     
+    def reset_conversation(self) -> bool:
+        """Oublie l'historique de conversation côté serveur"""
+        try:
+            response = self.session.delete(f"{self.base_url}/sessions/{self.session_id}")
+            response.raise_for_status()
+            return response.json().get("reset", False)
+        except Exception:
+            return False
+    
     def chat(self, message: str, profile: Optional[Dict] = None, model_type: Optional[str] = None) -> Dict[str, Any]:
         """Envoie un message au chatbot"""
         try:
-            payload = {"message": message}
+            payload = {"message": message, "session_id": self.session_id, "conversation": True}
             if profile:
                 payload["profile"] = profile
             if model_type:
@@ -567,6 +579,7 @@ def display_sidebar():
         st.markdown("---")
         if st.button("Nouveau Départ"):
             st.session_state.messages = []
+            st.session_state.api_client.reset_conversation()
             st.rerun()
 
 def display_youtube_video(title: str, url: str):
@@ -0,0 +1,101 @@
+# tests/test_sharded_index.py - Recherche répartie : fusion des shards et résultat dégradé
+
+import hashlib
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from api.index_store import IndexStore
+from api.live_index import LiveIndex
+from api.sharded_index import ShardedIndex
+
+DIMENSION = 16
+DOCUMENTS = 64
+
+
+def _encode(texts):
+    """Vecteurs déterministes dérivés du texte (pas de modèle d'embedding)"""
+    return np.stack([
+        np.random.default_rng(int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)).normal(size=DIMENSION)
+        for text in texts
+    ]).astype(np.float32)
+
+
+def _flat_index(embeddings):
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    return index
+
+
+@pytest.fixture(scope="module")
+def build(tmp_path_factory):
+    documents = [{"id": i, "title": f"Exercice {i}", "content": f"Description de l'exercice {i}"}
+                 for i in range(DOCUMENTS)]
+    store = IndexStore(tmp_path_factory.mktemp("indexes"), "test-encoder", "flat")
+    return store.load_or_build(documents, _encode, _flat_index)
+
+
+@pytest.fixture(scope="module")
+def sharded(build):
+    index = ShardedIndex.start(build, 2, "flat", timeout_ms=5000)
+    yield index
+    index.close()
+
+
+def _queries(count=4):
+    queries = np.random.default_rng(0).normal(size=(count, DIMENSION)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def test_start_waits_for_every_shard(sharded):
+    assert sharded.get_stats()['alive'] == 2
+    assert all(ready.done() and ready.result() is None for ready in sharded._ready)
+
+
+def test_merged_top_k_matches_single_index(build, sharded):
+    queries = _queries()
+    expected_scores, expected_ids = build.index.search(queries, 5)
+
+    scores, ids, missing = sharded.search(queries, 5)
+
+    assert missing == []
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_mask_restricts_every_shard(build, sharded):
+    queries = _queries()
+    mask = np.zeros(DOCUMENTS, dtype=bool)
+    mask[::3] = True
+
+    _, ids, missing = sharded.search(queries, 5, mask=mask)
+
+    assert missing == []
+    assert mask[ids[ids >= 0]].all()
+
+
+def test_timeout_marks_live_search_degraded(build, sharded):
+    live = LiveIndex(sharded, DOCUMENTS, build.embeddings)
+    queries = _queries(1)
+
+    _, ids, degraded = live.search(queries, 5)
+    assert not degraded
+    assert (ids >= 0).all()
+
+    timeout = sharded.timeout
+    sharded.timeout = 0.0
+    try:
+        _, ids, degraded = live.search(queries, 5)
+    finally:
+        sharded.timeout = timeout
+    assert degraded
+    assert (ids < 0).all()
+    assert sharded.get_stats()['degraded_searches'] >= 1
+
+    # Les réponses arrivées après le délai sont ignorées : la recherche suivante est complète
+    _, ids, degraded = live.search(queries, 5)
+    assert not degraded
+    assert (ids >= 0).all()